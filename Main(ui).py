@@ -28,296 +28,5565 @@ import sys
 #
 import time
 # The 'time' module provides time-related functions, used here to
-# simulate file processing for a smoother progress bar update.
+# pace progress updates, back off between retries and enforce rate limits.
 #
-from datetime import datetime
+import errno
+# The 'errno' module names operating system error codes, used to tell
+# transient failures (like a locked file) apart from permanent ones.
+#
+from datetime import datetime, timedelta
 # The 'datetime' module is used to get the current date and time
-# for creating unique, timestamped backup file names.
+# for creating unique, timestamped backup file names, and to work out
+# when scheduled runs are next due.
+#
+import zipfile
+# The 'zipfile' module is used to create compressed ZIP archive backups
+# of the selected folders or files.
+#
+import zlib
+# The 'zlib' module compresses a small sample of a file to measure how well it compresses.
+#
+import tarfile
+# The 'tarfile' module builds the headers for streaming tar backups.
+import gzip
+# The 'gzip' module compresses tar backups into .tar.gz.
+import lzma
+# The 'lzma' module compresses tar backups into .tar.xz.
+import stat
+# The 'stat' module extracts permission bits for tar headers.
+import hashlib
+# The 'hashlib' module names chunks in the incremental backup store by their SHA-256.
+#
+import queue
+# The 'queue' module provides a thread-safe queue, used here as a pool of
+# reusable read buffers shared by the file type sniffer threads.
+#
+import threading
+# The 'threading' module provides locks that protect caches shared between threads.
+#
+from concurrent.futures import ThreadPoolExecutor
+# ThreadPoolExecutor runs small blocking reads in parallel worker threads.
+from concurrent.futures import ProcessPoolExecutor
+# ProcessPoolExecutor spreads the work on one huge folder over several processes.
+import multiprocessing
+# The 'multiprocessing' module shares a progress queue and a cancel flag with those processes.
+#
+import platform
+# The 'platform' module identifies the CPU architecture, needed to find the
+# right system call number for lowering the worker's I/O priority.
+#
+import subprocess
+# The 'subprocess' module runs the 'ionice' tool when the system call is unavailable.
+#
+import shlex
+# The 'shlex' module splits a backup command into its arguments without a shell.
+#
+import ctypes
+# The 'ctypes' module calls operating system functions that Python does not wrap,
+# such as Linux's ioprio_set and Windows' background thread mode.
+#
+import json
+# The 'json' module reads and writes the manifest that describes a linked view.
+#
+import struct
+# The 'struct' module packs and unpacks the binary FIEMAP request used to find
+# where a file's data sits on disk.
+#
+import random
+# The 'random' module generates the synthetic files used by the ordering benchmark.
+#
+import re
+# The 're' module compiles include/exclude patterns into regular expressions.
+#
+import fnmatch
+# The 'fnmatch' module translates glob patterns like '*.tmp' into regular expressions.
+#
+import bisect
+# The 'bisect' module finds the histogram bucket a file's size or age falls into.
+#
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+# The 'http.server' module serves the metrics endpoint for monitoring.
+#
+import sqlite3
+# The 'sqlite3' module keeps plans too large for the memory budget on disk.
+#
+import tempfile
+# The 'tempfile' module creates the files plans spill into.
+#
+import itertools
+# The 'itertools' module takes spilled moves a batch at a time.
+#
+import builtins
+# The 'builtins' module lets the fault injection harness wrap open().
+#
+import socket
+# The 'socket' module connects the coordinator and its distributed workers.
+#
+import hmac
+# The 'hmac' module compares worker tokens in constant time.
+#
+import secrets
+# The 'secrets' module makes the token for locally started workers.
+#
+import http.client
+# The 'http.client' module keeps connections to object stores open between requests.
+#
+import urllib.parse
+# The 'urllib.parse' module escapes object keys and signed query strings.
+#
+import base64
+# The 'base64' module encodes the MD5 checksums uploads are checked with.
+#
+from xml.etree import ElementTree
+# The 'ElementTree' module reads the object store's XML responses.
+#
+from concurrent.futures import wait, FIRST_COMPLETED
+# Multipart uploads start a new part as soon as any running one finishes.
+#
+import argparse
+# The 'argparse' module reads the commands that run without the GUI.
+#
+try:
+    import fcntl
+    # The 'fcntl' module issues the FIEMAP ioctl on Linux and takes the scheduler's folder locks.
+except ImportError:
+    fcntl = None
+    # Not available on Windows, where files are ordered by inode number only.
+try:
+    import resource
+    # The 'resource' module reads the process's peak memory use on Unix.
+except ImportError:
+    resource = None
+    # Windows asks the process API instead.
+#
+#
+#
+#
+#
+# Import specific widgets and classes from PyQt5 for the graphical user interface.
+# Only the GUI needs Qt: the commands (e.g. 'schedule' or 'worker'), shard
+# processes and imports of this file run without loading or even installing PyQt5.
+GUI_MODE = (__name__ == "__main__" and (len(sys.argv) < 2 or sys.argv[1].startswith("-"))
+            and not {"-h", "--help"} & set(sys.argv[1:]))
+# Started without a command (the GUI takes only options like --profile).
+#
+if GUI_MODE:
+    from PyQt5.QtWidgets import (
+        QApplication,
+        # QApplication is the main class for any PyQt5 application,
+        # responsible for the event loop.
+        QMainWindow,
+        # QMainWindow provides a main application window with a status bar,
+        # menu bar, and other features.
+        QWidget,
+        # QWidget is the base class for all user interface objects in PyQt5.
+        QVBoxLayout,
+        # QVBoxLayout arranges widgets vertically in a layout.
+        QHBoxLayout,
+        # QHBoxLayout arranges widgets horizontally in a layout.
+        QGridLayout,
+        # QGridLayout arranges widgets in a grid.
+        QLabel,
+        # QLabel is used to display text or images in the GUI.
+        QPushButton,
+        # QPushButton is a clickable button widget.
+        QLineEdit,
+        # QLineEdit provides a single-line text input field.
+        QTextEdit,
+        # QTextEdit provides a multi-line rich text editor.
+        QProgressBar,
+        # QProgressBar displays a horizontal or vertical progress bar.
+        QFileDialog,
+        # QFileDialog is a dialog box for selecting files or folders.
+        QMessageBox,
+        # QMessageBox provides modal dialogs for displaying messages.
+        QGroupBox,
+        # QGroupBox provides a titled frame to group other widgets.
+        QCheckBox,
+        # QCheckBox is a checkbox widget that can be checked or unchecked.
+        QSpinBox,
+        # QSpinBox allows the user to select an integer value.
+        QComboBox,
+        # QComboBox is a drop-down list for choosing one of several options.
+        QMenuBar,
+        # QMenuBar provides a menu bar at the top of the window.
+        QAction,
+        # QAction is an abstract class for commands that can be added to menus.
+        QStatusBar,
+        # QStatusBar provides a horizontal bar at the bottom of a window for status messages.
+        QTabWidget,
+        # QTabWidget shows the preview and the statistics on separate tabs.
+    )
+    #
+    #
+    from PyQt5.QtCore import (
+        QThread,
+        # QThread provides a way to run code in a separate thread,
+        # preventing the GUI from freezing.
+        pyqtSignal,
+        # pyqtSignal is a signal for inter-thread communication.
+        Qt,
+        # Qt provides an enumeration of constants, such as alignment options.
+        QSettings
+        # QSettings is used for persistent application settings, like window geometry.
+    )
+    #
+    #
+    from PyQt5 import QtGui
+    # The 'QtGui' module provides classes for window icons and other graphical elements.
+else:
+    class QThread:
+        # Stands in for the base class of the GUI's worker thread.
+        pass
+    #
+    class QMainWindow:
+        # Stands in for the base class of the main window.
+        pass
+    #
+    pyqtSignal = lambda *types: None
+    # The worker's signals are only created by Qt.
+#
+#
+#
+#
+# Magic-byte signatures used to recognise a file's real type from its first bytes.
+# Each entry is (offset, signature, extension).
+MAGIC_SIGNATURES = [
+    (0, b"%PDF-", "pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"II*\x00", "tif"),
+    (0, b"MM\x00*", "tif"),
+    (0, b"\x00\x00\x01\x00", "ico"),
+    (0, b"Rar!\x1a\x07", "rar"),
+    (0, b"7z\xbc\xaf\x27\x1c", "7z"),
+    (0, b"\x1f\x8b\x08", "gz"),
+    (0, b"BZh", "bz2"),
+    (0, b"\xfd7zXZ\x00", "xz"),
+    (0, b"\x28\xb5\x2f\xfd", "zst"),
+    (0, b"ID3", "mp3"),
+    (0, b"fLaC", "flac"),
+    (0, b"OggS", "ogg"),
+    (0, b"\x1a\x45\xdf\xa3", "mkv"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "doc"),
+    (0, b"{\\rtf", "rtf"),
+    (0, b"%!PS", "ps"),
+    (0, b"SQLite format 3\x00", "sqlite"),
+    (0, b"wOFF", "woff"),
+    (0, b"wOF2", "woff2"),
+    (0, b"\x7fELF", "elf"),
+    (0, b"MZ", "exe"),
+    (257, b"ustar", "tar"),
+]
+#
+# Extensions that legitimately share a detected type, e.g. a '.docx' file is a ZIP
+# container and a '.jpeg' file is a JPG. A file whose name matches its detected
+# family keeps its own extension.
+EXTENSION_FAMILIES = {}
+for _family in (
+    {"jpg", "jpeg", "jpe", "jfif"},
+    {"tif", "tiff", "dng", "nef", "cr2", "arw", "orf", "rw2"},
+    {"zip", "docx", "docm", "xlsx", "xlsm", "pptx", "pptm", "odt", "ods", "odp",
+     "epub", "jar", "apk", "whl", "xpi", "cbz", "vsix", "nupkg", "kmz", "3mf"},
+    {"doc", "xls", "ppt", "msi", "msg", "dot", "xlt", "pot"},
+    {"gz", "tgz"},
+    {"bz2", "tbz", "tbz2"},
+    {"xz", "txz"},
+    {"zst", "tzst"},
+    {"mp4", "m4v", "mov", "m4a", "m4b", "3gp", "heic", "heif", "avif", "f4v"},
+    {"mkv", "webm", "mka"},
+    {"ogg", "oga", "ogv", "opus"},
+    {"exe", "dll", "sys", "scr", "com", "efi", "ocx", "cpl"},
+    {"elf", "so", "o", "ko", "bin", "out"},
+    {"pdf", "ai"},
+    {"ps", "eps"},
+    {"sqlite", "sqlite3", "db", "db3"},
+    {"rar", "cbr"},
+    {"ico", "cur"},
+):
+    for _extension in _family:
+        EXTENSION_FAMILIES[_extension] = _family
+#
+# Detected types that are only a guess and never override an existing extension.
+WEAK_TYPES = {"txt"}
+#
+#
+def get_extension(filename):
+    # Return the lowercase extension taken from a file name, or '' if it has none.
+    #
+    file_extension = filename.split('.')[-1].lower()
+    # Take the text after the last dot, as the organizer always has.
+    if file_extension and '.' in filename:
+        # Only names that actually contain a dot have an extension.
+        return file_extension
+    return ''
+#
+#
+def is_extension_folder(name):
+    # Whether a folder name is one the organizer creates for a file type, like
+    # 'PDF Files': an upper-case extension followed by ' Files'.
+    #
+    extension = name[:-len(" Files")] if name.endswith(" Files") else ""
+    return bool(extension) and extension == extension.upper() and extension.strip() == extension
+#
+#
+def choose_extension(name_extension, detected_extension):
+    # Decide which extension to organize a file under, given the extension from its
+    # name and the type detected from its content.
+    #
+    if not detected_extension:
+        # Nothing was detected, so trust the name.
+        return name_extension
+    if not name_extension:
+        # The file has no extension, so use whatever was detected.
+        return detected_extension
+    if detected_extension in WEAK_TYPES:
+        # A weak guess (like plain text) never overrides a real extension.
+        return name_extension
+    if name_extension in EXTENSION_FAMILIES.get(detected_extension, {detected_extension}):
+        # The name agrees with the content, so keep the more specific name extension.
+        return name_extension
+    return detected_extension
+    # The name disagrees with the content, so the content wins.
+#
+#
+def match_signature(buffer, length):
+    # Match the first 'length' bytes of 'buffer' against the known signatures.
+    #
+    if length <= 0:
+        # Empty files have no type.
+        return None
+    if buffer.startswith(b"RIFF", 0, length) and length >= 12:
+        # RIFF containers carry their real type at offset 8.
+        riff_types = {b"WEBP": "webp", b"WAVE": "wav", b"AVI ": "avi"}
+        return riff_types.get(bytes(buffer[8:12]))
+    if buffer.startswith(b"ftyp", 4, length) and length >= 12:
+        # ISO media files (MP4, MOV, HEIC...) name their brand at offset 8.
+        brand = bytes(buffer[8:12])
+        ftyp_types = {b"qt  ": "mov", b"M4A ": "m4a", b"heic": "heic", b"heix": "heic",
+                      b"mif1": "heic", b"avif": "avif", b"3gp4": "3gp", b"3gp5": "3gp"}
+        return ftyp_types.get(brand, "mp4")
+    if buffer.startswith(b"PK\x03\x04", 0, length) or buffer.startswith(b"PK\x05\x06", 0, length):
+        # ZIP containers are told apart by the member names near the start.
+        zip_markers = [
+            (b"mimetypeapplication/epub+zip", "epub"),
+            (b"mimetypeapplication/vnd.oasis.opendocument.text", "odt"),
+            (b"mimetypeapplication/vnd.oasis.opendocument.spreadsheet", "ods"),
+            (b"mimetypeapplication/vnd.oasis.opendocument.presentation", "odp"),
+            (b"word/", "docx"),
+            (b"xl/", "xlsx"),
+            (b"ppt/", "pptx"),
+            (b"AndroidManifest.xml", "apk"),
+            (b"META-INF/MANIFEST.MF", "jar"),
+        ]
+        for marker, zip_extension in zip_markers:
+            # Look for each marker inside the bytes that were read.
+            if buffer.find(marker, 0, length) != -1:
+                return zip_extension
+        return "zip"
+    for offset, signature, signature_extension in MAGIC_SIGNATURES:
+        # Check each fixed signature at its offset.
+        if buffer.startswith(signature, offset, length):
+            return signature_extension
+    sample = bytes(buffer[:length])
+    # Copy the sample once for the plain-text check below.
+    if b"\x00" not in sample:
+        # Binary formats almost always contain NUL bytes; text never does.
+        try:
+            sample.decode("utf-8")
+            return "txt"
+        except UnicodeDecodeError as e:
+            if e.start >= length - 3:
+                # The read may have cut a multi-byte character in half.
+                return "txt"
+    return None
+#
+#
+class FileTypeSniffer:
+    # Detects a file's real type from its leading bytes instead of trusting its name.
+    #
+    # Reads are bounded to SNIFF_BYTES per file and go through a shared pool of
+    # preallocated buffers, so sniffing a large folder does not allocate per file.
+    # Results are cached by (device, inode, size, mtime) and the cache is saved
+    # in ~/.file-organizer, so files that have not changed are never read again,
+    # in this session or on later runs.
+    #
+    SNIFF_BYTES = 4096
+    # The maximum number of bytes read from any one file.
+    MAX_CACHE_ENTRIES = 200000
+    # Bound the cache so very long sessions cannot grow it forever.
+    CACHE_PATH = os.path.join(os.path.expanduser("~"), ".file-organizer", "sniff-cache.json")
+    # Where the cache is kept between runs.
+    _cache = {}
+    # The cache of detected types, shared by every sniffer in the process.
+    _cache_lock = threading.Lock()
+    # Protects the cache, which is used from several threads at once.
+    _cache_loaded = False
+    _cache_dirty = False
+    # Whether the saved cache has been read, and whether it has changed since.
+    _save_lock = threading.Lock()
+    # One save at a time in this process; other processes are kept out by a lock file.
+    #
+    #
+    def __init__(self, max_workers=None):
+        # Create the buffer pool, one buffer per worker thread.
+        #
+        self.max_workers = max_workers or min(16, (os.cpu_count() or 1) * 2)
+        # Header reads are I/O bound, so use a few more threads than cores.
+        self._buffers = queue.Queue()
+        # The pool of reusable read buffers.
+        for _ in range(self.max_workers):
+            self._buffers.put(bytearray(self.SNIFF_BYTES))
+            # Each thread takes a buffer, reads into it and gives it back.
+        self.load_cache()
+        # Pick up the types detected by earlier runs.
+    #
+    #
+    @classmethod
+    def load_cache(cls):
+        # Read the saved cache, once per process.
+        #
+        with cls._cache_lock:
+            if cls._cache_loaded:
+                return
+            cls._cache_loaded = True
+            try:
+                with open(cls.CACHE_PATH, encoding="utf-8") as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                return
+                # No saved cache yet, or an unreadable one: start empty.
+            for dev, ino, size, mtime_ns, extension in rows[-cls.MAX_CACHE_ENTRIES:]:
+                cls._cache.setdefault((dev, ino, size, mtime_ns), extension)
+    #
+    #
+    @classmethod
+    def save_cache(cls):
+        # Save the cache if it has changed, merged with whatever other processes
+        # (shards, a scheduler, another window) saved since it was loaded. Runs
+        # call this once, when they end.
+        #
+        with cls._save_lock:
+            with cls._cache_lock:
+                if not cls._cache_dirty:
+                    return
+                rows = [[*key, extension] for key, extension in cls._cache.items()]
+                cls._cache_dirty = False
+            folder_path = os.path.dirname(cls.CACHE_PATH)
+            lock_file = None
+            try:
+                os.makedirs(folder_path, exist_ok=True)
+                if fcntl is not None:
+                    lock_file = open(cls.CACHE_PATH + ".lock", "w")
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    # Hold other processes off between reading the file and replacing it.
+                merged = {}
+                try:
+                    with open(cls.CACHE_PATH, encoding="utf-8") as f:
+                        for dev, ino, size, mtime_ns, extension in json.load(f):
+                            merged[(dev, ino, size, mtime_ns)] = extension
+                except (OSError, ValueError, TypeError):
+                    pass
+                    # Nothing saved yet, or an unreadable file: ours replaces it.
+                merged.update((tuple(row[:4]), row[4]) for row in rows)
+                rows = [[*key, extension] for key, extension in merged.items()][-cls.MAX_CACHE_ENTRIES:]
+                fd, temp_path = tempfile.mkstemp(prefix="sniff-cache.", suffix=".tmp", dir=folder_path)
+                # A name of its own, so concurrent saves never write into the same file.
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(rows, f)
+                    os.replace(temp_path, cls.CACHE_PATH)
+                except BaseException:
+                    os.remove(temp_path)
+                    raise
+            except OSError:
+                pass
+                # The cache only saves time; failing to save it is not an error.
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+    #
+    #
+    @staticmethod
+    def cache_key(st):
+        # Build the cache key from a file's stat result.
+        #
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    #
+    #
+    def sniff(self, file_path, st):
+        # Return the detected extension for one file, or None if it is unknown.
+        #
+        key = self.cache_key(st)
+        # Unchanged files keep the same key, even after being moved on the same disk.
+        with self._cache_lock:
+            if key in self._cache:
+                # The file was already sniffed and has not changed since.
+                return self._cache[key]
+        detected_extension = self._read_and_match(file_path)
+        # Read the header and match it against the signatures.
+        with self._cache_lock:
+            if len(self._cache) >= self.MAX_CACHE_ENTRIES:
+                # Start over rather than let the cache grow without limit.
+                self._cache.clear()
+            self._cache[key] = detected_extension
+            # Remember the result for later runs.
+            type(self)._cache_dirty = True
+        return detected_extension
+    #
+    #
+    def _read_and_match(self, file_path):
+        # Read at most SNIFF_BYTES from the file into a pooled buffer and match it.
+        #
+        buffer = self._buffers.get()
+        # Borrow a buffer from the pool.
+        try:
+            with open(file_path, 'rb', buffering=0) as f:
+                # Unbuffered, so the read goes straight into our buffer.
+                length = f.readinto(buffer)
+            return match_signature(buffer, length or 0)
+        except OSError:
+            # Unreadable files simply have no detected type.
+            return None
+        finally:
+            self._buffers.put(buffer)
+            # Always return the buffer to the pool.
+    #
+    #
+    def sniff_many(self, items, concurrency=None):
+        # Sniff many files in parallel. 'items' is a list of (name, path, stat)
+        # tuples, and the result maps each name to its detected extension. An
+        # AdaptiveConcurrency controller, if given, decides how many reads run at once.
+        #
+        results = {}
+        # The detected extension for each name.
+        pending = []
+        # Files that are not in the cache and must be read.
+        with self._cache_lock:
+            for name, file_path, st in items:
+                # Answer as many files as possible from the cache first.
+                key = self.cache_key(st)
+                if key in self._cache:
+                    results[name] = self._cache[key]
+                else:
+                    pending.append((name, file_path, st))
+        if pending and concurrency:
+            # Read the remaining headers as the controller sees fit.
+            detected = adaptive_map(concurrency, lambda item: self.sniff(item[1], item[2]), pending)
+            for (name, _, _), detected_extension in zip(pending, detected):
+                results[name] = detected_extension
+        elif pending:
+            # Read the remaining headers in parallel.
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                detected = pool.map(lambda item: self.sniff(item[1], item[2]), pending)
+                for (name, _, _), detected_extension in zip(pending, detected):
+                    results[name] = detected_extension
+        return results
+#
+#
+EXIF_READ_LIMIT = 65536
+# EXIF data lives in the first 64 KB of a photo, so never read more than that.
+#
+EXIF_EXTENSIONS = {"jpg", "jpeg", "jpe", "jfif", "tif", "tiff", "dng", "nef", "cr2", "arw", "orf", "rw2"}
+# Types whose EXIF date can be read with the parser below.
+#
+#
+def parse_tiff_datetime(tiff):
+    # Find the photo's DateTimeOriginal (or, failing that, DateTime) in a block of
+    # TIFF-structured EXIF data. Returns a datetime, or None if there is none.
+    #
+    if tiff[:2] == b"II":
+        byte_order = "little"
+        # Intel byte order.
+    elif tiff[:2] == b"MM":
+        byte_order = "big"
+        # Motorola byte order.
+    else:
+        return None
+    #
+    def number(offset, size):
+        # Read an unsigned integer; reads past the end give 0 rather than an error.
+        return int.from_bytes(tiff[offset:offset + size], byte_order)
+    #
+    def find_tag(ifd_offset, tag):
+        # Return the offset of a tag's 12-byte entry in an IFD, or None.
+        for index in range(number(ifd_offset, 2)):
+            entry = ifd_offset + 2 + index * 12
+            if entry + 12 > len(tiff):
+                # The IFD runs past the data we read.
+                return None
+            if number(entry, 2) == tag:
+                return entry
+        return None
+    #
+    def read_date(entry):
+        # Parse the 'YYYY:MM:DD HH:MM:SS' text a date tag points to.
+        if entry is None:
+            return None
+        value_offset = number(entry + 8, 4)
+        try:
+            return datetime.strptime(tiff[value_offset:value_offset + 19].decode("ascii"), "%Y:%m:%d %H:%M:%S")
+        except (UnicodeDecodeError, ValueError):
+            # Missing, blank ('0000:00:00 ...') or damaged dates.
+            return None
+    #
+    first_ifd = number(4, 4)
+    # IFD0 holds the main image's tags.
+    exif_pointer = find_tag(first_ifd, 0x8769)
+    # The ExifIFDPointer tag leads to the camera's own tags.
+    if exif_pointer is not None:
+        taken = read_date(find_tag(number(exif_pointer + 8, 4), 0x9003))
+        # 0x9003 is DateTimeOriginal, when the photo was taken.
+        if taken:
+            return taken
+    return read_date(find_tag(first_ifd, 0x0132))
+    # 0x0132 is DateTime, when the file was last changed.
+#
+#
+def read_exif_datetime(file_path):
+    # Read the date a photo was taken from its EXIF header, reading at most
+    # EXIF_READ_LIMIT bytes. Returns a datetime, or None if there is no EXIF date.
+    #
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read(EXIF_READ_LIMIT)
+    except OSError:
+        return None
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        # TIFF-based files (including most camera raw formats) start with the EXIF data.
+        return parse_tiff_datetime(data)
+    if data[:2] != b"\xff\xd8":
+        # Not a JPEG either.
+        return None
+    position = 2
+    # Walk the JPEG's marker segments looking for the APP1 'Exif' segment.
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            # Not a marker, so the file is damaged.
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker.
+            position += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of image data: no metadata follows.
+            return None
+        length = int.from_bytes(data[position + 2:position + 4], "big")
+        # The segment length, which includes these two length bytes.
+        if marker == 0xE1 and data[position + 4:position + 10] == b"Exif\x00\x00":
+            return parse_tiff_datetime(data[position + 10:position + 2 + length])
+        position += 2 + length
+        # Skip to the next segment.
+    return None
+#
+#
+# Error codes that usually clear up on their own, such as a file that is briefly
+# locked or an NFS handle that went stale. Operations failing with these are retried.
+TRANSIENT_ERRNOS = {
+    code for code in (
+        getattr(errno, name, None)
+        for name in ("EBUSY", "EAGAIN", "EWOULDBLOCK", "EINTR", "ESTALE", "ETIMEDOUT", "ETXTBSY")
+    ) if code is not None
+}
+#
+# Windows reports locked files through 'winerror' rather than 'errno'
+# (32 = sharing violation, 33 = lock violation).
+TRANSIENT_WINERRORS = {32, 33}
+#
+#
+class RetryPolicy:
+    # Decides how the worker reacts when an operation on a single file fails.
+    #
+    # Transient errors are retried with exponential backoff, and once the retries
+    # run out the failure is either recorded so the run can continue, or allowed
+    # to stop the run, depending on 'continue_on_error'.
+    #
+    def __init__(self, max_attempts=4, base_delay=0.25, max_delay=4.0, continue_on_error=True):
+        # Store the retry and failure settings.
+        #
+        self.max_attempts = max_attempts
+        # How many times an operation is tried in total before giving up.
+        self.base_delay = base_delay
+        # The wait, in seconds, before the first retry.
+        self.max_delay = max_delay
+        # The longest wait between two attempts.
+        self.continue_on_error = continue_on_error
+        # Whether the run carries on after a file fails for good.
+    #
+    #
+    @staticmethod
+    def is_transient(error):
+        # Check if an error is worth retrying.
+        #
+        if getattr(error, "winerror", None) in TRANSIENT_WINERRORS:
+            # A file locked by another program on Windows.
+            return True
+        return isinstance(error, OSError) and error.errno in TRANSIENT_ERRNOS
+    #
+    #
+    def delay_for(self, attempt):
+        # Return how long to wait after the given failed attempt (starting at 1).
+        #
+        return min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+    #
+    #
+    def call(self, operation, *args, should_continue=lambda: True):
+        # Run 'operation(*args)', retrying transient failures. The last error is
+        # re-raised with a 'retry_attempts' attribute saying how often it was tried.
+        #
+        attempt = 1
+        # The number of the current attempt.
+        while True:
+            try:
+                return operation(*args)
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.is_transient(e) or not should_continue():
+                    # Give up on permanent errors, exhausted retries or a cancelled run.
+                    e.retry_attempts = attempt
+                    raise
+                time.sleep(self.delay_for(attempt))
+                # Back off before trying again.
+                attempt += 1
+#
+#
+def format_error_report(error_report):
+    # Turn the worker's structured error report into readable text, one line per failure.
+    #
+    lines = []
+    for entry in error_report:
+        # Describe each failed file.
+        error_code = errno.errorcode.get(entry["errno"], "") if entry["errno"] else ""
+        # The symbolic name of the error, such as 'EBUSY', if there is one.
+        lines.append(
+            f"{entry['path']}: {entry['operation']} failed after {entry['attempts']} attempt(s)"
+            f"{' [' + error_code + ']' if error_code else ''} - {entry['error']}"
+        )
+    return "\n".join(lines)
+#
+#
+class TokenBucket:
+    # A token bucket that limits how fast something may happen, e.g. files per
+    # second or bytes per second.
+    #
+    # Tokens refill at 'rate' per second up to 'capacity'. Taking more tokens than
+    # are available puts the bucket in debt and waits until the debt is repaid,
+    # so one large request is allowed but the long-run average stays at 'rate'.
+    # A rate of 0 means unlimited.
+    #
+    def __init__(self, rate, capacity=None):
+        # Store the rate and start with a full bucket.
+        #
+        self.rate = rate
+        # How many tokens are added per second.
+        self.capacity = capacity if capacity is not None else rate
+        # The most tokens that can build up, which allows a short burst.
+        self.tokens = self.capacity
+        # The tokens available right now.
+        self.last_refill = time.monotonic()
+        # When the bucket was last topped up.
+        self.lock = threading.Lock()
+        # Moves running in parallel share one bucket.
+    #
+    #
+    def refill(self):
+        # Add the tokens earned since the last refill and return the current debt.
+        #
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        return -self.tokens
+    #
+    #
+    def consume(self, amount, should_continue=lambda: True):
+        # Take 'amount' tokens, waiting as long as needed for them to refill.
+        #
+        if self.rate <= 0:
+            # An unlimited bucket never waits.
+            return
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+            # Take the tokens, possibly going into debt.
+        while should_continue():
+            with self.lock:
+                debt = self.refill()
+            if debt <= 0:
+                break
+            time.sleep(min(0.1, debt / self.rate))
+            # Wait in short slices so a cancelled run is not held up.
+#
+#
+class AdaptiveConcurrency:
+    # An AIMD controller for how many file operations run at once. Work is done
+    # in batches; after each batch the controller compares its throughput and
+    # per-operation latency with what it has seen before:
+    # - while throughput holds up, it allows one more thread (additive increase);
+    # - when latency has more than doubled without throughput improving, or the
+    #   file system reported it was busy, it halves the threads (multiplicative
+    #   decrease).
+    # Local disks settle on a few threads, high-latency network shares on many.
+    #
+    LATENCY_TOLERANCE = 2.0
+    # How far above the best latency seen a batch may go before backing off.
+    THROUGHPUT_TOLERANCE = 0.1
+    # How much throughput may drop between batches and still count as holding up.
+    TARGET_BATCH_SECONDS = 0.1
+    # Batches are sized to take about this long, so each measurement means something.
+    #
+    #
+    def __init__(self, name, maximum, minimum=1):
+        # Start at the minimum and let the measurements decide.
+        #
+        self.name = name
+        # 'scan' or 'move', for the status bar and profile.
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        # The configured bounds.
+        self.limit = self.minimum
+        # How many operations may run at once right now.
+        self.batch_size = 8
+        # How many operations the next batch holds.
+        self.best_latency = None
+        # The lowest per-operation latency measured, in seconds.
+        self.last_throughput = None
+        # Operations per second in the previous batch.
+        self.started = time.monotonic()
+        self.history = []
+        # (seconds since start, limit, operations per second, latency) after each batch.
+        self.excluded_seconds = 0.0
+        # Time the run was paused, left out of the next measurement.
+    #
+    #
+    def record(self, operations, seconds, congested=False):
+        # Adjust the limit after a batch of 'operations' took 'seconds'.
+        #
+        if operations <= 0:
+            return
+        seconds, self.excluded_seconds = max(seconds - self.excluded_seconds, 1e-6), 0.0
+        # A batch that spanned a pause was not slow.
+        throughput = operations / seconds
+        latency = seconds * min(self.limit, operations) / operations
+        # Each thread handled its share of the batch one after another.
+        self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+        if congested or (latency > self.best_latency * self.LATENCY_TOLERANCE
+                         and throughput <= (self.last_throughput or 0)):
+            self.limit = max(self.minimum, self.limit // 2)
+            # Back off hard: the file system is saturated.
+        elif self.last_throughput is None or throughput >= self.last_throughput * (1 - self.THROUGHPUT_TOLERANCE):
+            self.limit = min(self.maximum, self.limit + 1)
+            # Probe one step further.
+        self.last_throughput = throughput
+        if seconds < self.TARGET_BATCH_SECONDS / 2:
+            self.batch_size = min(4096, self.batch_size * 2)
+        elif seconds > self.TARGET_BATCH_SECONDS * 2:
+            self.batch_size = max(self.limit, self.batch_size // 2)
+        # Keep batches long enough to measure, short enough to react.
+        self.history.append((time.monotonic() - self.started, self.limit, throughput, latency))
+    #
+    #
+    def exclude(self, seconds):
+        # Leave a pause out of the batch in progress.
+        #
+        self.excluded_seconds += seconds
+    #
+    #
+    def describe(self):
+        # Return the current level for the status bar, e.g. 'moves 6/16'.
+        #
+        return f"{self.name} {self.limit}/{self.maximum}"
+    #
+    #
+    def profile_lines(self):
+        # Return the controller's decisions over the run, one line per change of level.
+        #
+        lines = [f"{self.name} concurrency (bounds {self.minimum}-{self.maximum}):"]
+        previous = None
+        for elapsed, limit, throughput, latency in self.history:
+            if limit != previous:
+                lines.append(f"  {elapsed:8.2f}s  {limit:3d} thread(s)  {throughput:10.1f} ops/s  "
+                             f"{latency * 1000:8.2f} ms/op")
+                previous = limit
+        return lines
+#
+#
+def adaptive_map(controller, func, items, should_continue=lambda: True, congested=lambda result: False,
+                 initializer=None):
+    # Apply 'func' to every item and return the results in order, running as
+    # many at once as 'controller' currently allows. Items are handed out in
+    # batches of contiguous runs, one run per thread, so each thread works
+    # through neighbouring items in order. Items not started because
+    # 'should_continue' turned false get None.
+    #
+    guarded = lambda item: func(item) if should_continue() else None
+    # Check for cancellation before every item, not just every batch.
+    if controller.maximum <= 1:
+        return [guarded(item) for item in items]
+        # Sequential by configuration: no threads at all.
+    results = []
+    with ThreadPoolExecutor(max_workers=controller.maximum, initializer=initializer) as pool:
+        position = 0
+        while position < len(items) and should_continue():
+            limit = controller.limit
+            batch = items[position:position + max(limit, controller.batch_size)]
+            started = time.perf_counter()
+            if limit == 1:
+                batch_results = [guarded(item) for item in batch]
+            else:
+                batch_results = [result for run in pool.map(lambda run: [guarded(item) for item in run],
+                                                             split_in_runs(batch, limit))
+                                 for result in run]
+            controller.record(len(batch), time.perf_counter() - started,
+                              any(congested(result) for result in batch_results))
+            results.extend(batch_results)
+            position += len(batch)
+    return results + [None] * (len(items) - len(results))
+#
+#
+# Linux system call numbers for ioprio_set, which differ between architectures.
+IOPRIO_SET_SYSCALLS = {
+    "x86_64": 251, "amd64": 251, "i386": 289, "i686": 289,
+    "aarch64": 30, "arm64": 30, "armv7l": 314, "ppc64le": 273, "s390x": 282,
+}
+#
+#
+IOPRIO_GET_SYSCALLS = {machine: number + 1 for machine, number in IOPRIO_SET_SYSCALLS.items()}
+# ioprio_get comes right after ioprio_set on every architecture.
+IOPRIO_WHO_PROCESS = 1
+# With a process id of 0, ioprio_get and ioprio_set act on the calling thread.
+#
+#
+def lower_thread_priority():
+    # Lower the CPU and I/O priority of the calling thread so it yields to other
+    # users of the machine. Returns a short description of what was applied and
+    # the previous priorities, to hand to restore_thread_priority when done.
+    #
+    applied = []
+    # The priority changes that worked.
+    previous = {}
+    # What each change replaced.
+    if sys.platform == "win32":
+        # Windows' background mode lowers both the I/O and the memory priority.
+        kernel32 = ctypes.windll.kernel32
+        if kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00010000):
+            # 0x00010000 is THREAD_MODE_BACKGROUND_BEGIN.
+            applied.append("background thread mode")
+            previous["background"] = True
+        return ", ".join(applied), previous
+    if not sys.platform.startswith("linux"):
+        return "", previous
+        # Elsewhere 'nice' applies to the whole process and would slow the window
+        # and every other run too, and there is no per-thread I/O priority.
+    thread_id = threading.get_native_id()
+    # On Linux, priorities set for a thread id only affect that thread.
+    try:
+        nice = os.getpriority(os.PRIO_PROCESS, thread_id)
+        os.setpriority(os.PRIO_PROCESS, thread_id, 19)
+        # Use the lowest CPU priority ('nice 19').
+        applied.append("nice 19")
+        previous["nice"] = nice
+    except OSError:
+        pass
+    # Put the thread in the 'idle' I/O class, so it only gets disk time nobody else wants.
+    idle_priority = 3 << 13
+    # IOPRIO_CLASS_IDLE shifted into place, as ioprio_set expects.
+    machine = platform.machine().lower()
+    if machine in IOPRIO_SET_SYSCALLS:
+        libc = ctypes.CDLL(None, use_errno=True)
+        io_priority = libc.syscall(IOPRIO_GET_SYSCALLS[machine], IOPRIO_WHO_PROCESS, 0)
+        if io_priority >= 0 and libc.syscall(IOPRIO_SET_SYSCALLS[machine], IOPRIO_WHO_PROCESS, 0, idle_priority) == 0:
+            applied.append("idle I/O class")
+            previous["io_priority"] = io_priority
+            return ", ".join(applied), previous
+    try:
+        subprocess.run(["ionice", "-c", "3", "-p", str(thread_id)], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Fall back to the 'ionice' tool if the system call is not available.
+        applied.append("idle I/O class")
+        previous["io_priority"] = None
+        # Without the system call the old class is unknown; it is put back to the default.
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return ", ".join(applied), previous
+#
+#
+def restore_thread_priority(previous):
+    # Undo lower_thread_priority on the calling thread, so a pooled thread that
+    # is reused for other work does not keep the low priority.
+    #
+    if previous.get("background"):
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00020000)
+        # 0x00020000 is THREAD_MODE_BACKGROUND_END.
+    thread_id = threading.get_native_id() if previous else None
+    if "nice" in previous:
+        try:
+            os.setpriority(os.PRIO_PROCESS, thread_id, previous["nice"])
+        except OSError:
+            pass
+            # Raising the priority again needs CAP_SYS_NICE (or a RLIMIT_NICE that
+            # allows it); without it the thread has to stay at nice 19.
+    if "io_priority" in previous:
+        machine = platform.machine().lower()
+        if previous["io_priority"] is not None and machine in IOPRIO_SET_SYSCALLS:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.syscall(IOPRIO_SET_SYSCALLS[machine], IOPRIO_WHO_PROCESS, 0, previous["io_priority"])
+            return
+        try:
+            subprocess.run(["ionice", "-c", "0", "-p", str(thread_id)], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # Class 0 is 'none': the I/O priority follows the CPU priority again.
+        except (OSError, subprocess.CalledProcessError):
+            pass
+#
+#
+COPY_CHUNK_SIZE = 1024 * 1024
+# Files moved to another disk are copied in chunks of this many bytes.
+PARTIAL_COPY_PREFIX = ".organizer-partial."
+# Copies are written under a hidden name starting with this until they are complete.
+#
+#
+class MoveCancelled(Exception):
+    # Raised between the chunks of a copy (or before a move) when the run is
+    # cancelled. The partial copy is removed and the file stays where it was.
+    pass
+#
+#
+def is_partial_copy(name):
+    # Whether a file name is that of an unfinished copy.
+    #
+    return name.startswith(PARTIAL_COPY_PREFIX)
+#
+#
+def partial_copy_path(dest_path):
+    # The hidden name a copy to 'dest_path' is written under. It is derived from
+    # the destination, so it stays short and is the same on every run.
+    #
+    folder_path, filename = os.path.split(dest_path)
+    return os.path.join(folder_path, PARTIAL_COPY_PREFIX + hashlib.sha1(os.fsencode(filename)).hexdigest())
+#
+#
+def publish_copy(temp_path, dest_path):
+    # Give a finished copy its real name in one step, without replacing a file
+    # that appeared at the destination meanwhile.
+    #
+    try:
+        os.link(temp_path, dest_path)
+        # A hard link fails with EEXIST rather than overwriting.
+    except FileExistsError:
+        raise
+    except OSError:
+        # The file system has no hard links (e.g. FAT or some shares).
+        if os.path.lexists(dest_path):
+            raise FileExistsError(errno.EEXIST, "File exists", dest_path)
+        os.rename(temp_path, dest_path)
+        return
+    os.remove(temp_path)
+#
+#
+def copy_file_chunked(source_path, dest_path, on_chunk=None, chunk_size=COPY_CHUNK_SIZE, durable=False):
+    # Copy a file in fixed-size chunks, calling 'on_chunk(byte_count)' after each one
+    # so the caller can report progress, pause, or cancel by raising MoveCancelled.
+    # The data goes to a hidden file next to the destination, which only takes the
+    # destination's name once complete, so a partial copy is never mistaken for the
+    # file; it is removed on failure. With 'durable', the copy is flushed to disk
+    # before the function returns.
+    #
+    buffer = bytearray(chunk_size)
+    # One reusable buffer for the whole copy.
+    view = memoryview(buffer)
+    # A view lets us write part of the buffer without copying it.
+    temp_path = partial_copy_path(dest_path)
+    with open(source_path, 'rb', buffering=0) as source:
+        try:
+            dest = open(temp_path, 'xb')
+        except FileExistsError:
+            os.remove(temp_path)
+            dest = open(temp_path, 'xb')
+            # Left over from a run that was killed mid-copy; destination names are
+            # reserved, so no other copy is writing to it.
+        with dest:
+            try:
+                while True:
+                    length = source.readinto(buffer)
+                    # Read the next chunk straight into the buffer.
+                    if not length:
+                        # The whole file has been copied.
+                        break
+                    dest.write(view[:length])
+                    if on_chunk:
+                        on_chunk(length)
+                        # Report the chunk to the caller.
+                if durable:
+                    dest.flush()
+                    os.fsync(dest.fileno())
+                    # The source is deleted next, so the copy must really be on disk.
+            except BaseException:
+                dest.close()
+                os.remove(temp_path)
+                # Never leave a partial copy behind.
+                raise
+    try:
+        shutil.copystat(source_path, temp_path)
+        # Keep the original timestamps and permissions, like shutil.move does.
+        publish_copy(temp_path, dest_path)
+    except BaseException:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        raise
+#
+#
+def move_file_chunked(source_path, dest_path, on_chunk=None, durable=False, remove_source=os.remove):
+    # Move a file. On the same disk this is a single rename; across disks the file is
+    # copied in chunks and then deleted (with 'remove_source'). Returns True if the
+    # data had to be copied.
+    #
+    try:
+        os.rename(source_path, dest_path)
+        # A rename only updates directory entries and is effectively instant.
+        return False
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            # Only 'cross-device link' means we need to copy instead.
+            raise
+    if os.path.islink(source_path):
+        # Symbolic links are recreated rather than copied through.
+        shutil.move(source_path, dest_path)
+        return True
+    copy_file_chunked(source_path, dest_path, on_chunk, durable=durable)
+    # Copy the data in chunks.
+    remove_source(source_path)
+    # Remove the original once the copy is complete.
+    return True
+#
+#
+def move_file_retrying(source_path, dest_path, retry_policy, on_chunk=None, durable=False,
+                       on_attempt=None, should_continue=lambda: True):
+    # Move a file to its reserved destination, retrying transient errors. Every
+    # attempt goes to the same destination, and once the copy has been published
+    # only the removal of the source is retried, so a source that cannot be
+    # deleted never ends up copied a second time under another name.
+    # 'on_attempt' is called before each copy attempt.
+    #
+    published = []
+    # Set once the copy has taken the destination's name.
+    def remove_source(path):
+        published.append(path)
+        os.remove(path)
+    #
+    def attempt():
+        if published:
+            try:
+                os.remove(source_path)
+                # Only the original is left to delete.
+            except FileNotFoundError:
+                pass
+                # Removed by someone else meanwhile, which completes the move too.
+            return True
+        if on_attempt:
+            on_attempt()
+        return move_file_chunked(source_path, dest_path, on_chunk, durable, remove_source)
+    #
+    return retry_policy.call(attempt, should_continue=should_continue)
+#
+#
+def format_duration(seconds):
+    # Format a number of seconds as a short duration like '1h 05m' or '42s'.
+    #
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+#
+#
+class ProgressTracker:
+    # Tracks progress by bytes rather than by file count, so one huge file and
+    # one tiny file are not counted the same, and estimates speed and time left.
+    #
+    # The byte and file rates are smoothed with an exponential moving average
+    # over samples at least SAMPLE_INTERVAL seconds apart, which keeps the ETA
+    # from jumping around every time a large file starts or finishes.
+    #
+    SAMPLE_INTERVAL = 0.5
+    # The shortest time between two rate samples, in seconds.
+    SMOOTHING = 0.3
+    # How much weight a new sample gets in the moving average.
+    #
+    #
+    def __init__(self, total_bytes, total_files):
+        # Store the totals taken from the scan and start the clock.
+        #
+        self.total_bytes = total_bytes
+        # The combined size of all files in the plan.
+        self.total_files = total_files
+        # The number of files in the plan.
+        self.done_bytes = 0
+        # The bytes moved, copied or skipped so far.
+        self.done_files = 0
+        # The files finished (or failed) so far.
+        self.start_time = time.monotonic()
+        # When the run started.
+        self.sample_time = self.start_time
+        # When the last rate sample was taken.
+        self.sample_bytes = 0
+        # 'done_bytes' at the last sample.
+        self.sample_files = 0
+        # 'done_files' at the last sample.
+        self.byte_rate = None
+        # The smoothed bytes per second, once there is a sample.
+        self.file_rate = None
+        # The smoothed files per second, once there is a sample.
+        self.lock = threading.Lock()
+        # Files finishing in parallel threads update the totals one at a time.
+    #
+    #
+    def add_bytes(self, byte_count, file_count=0):
+        # Count bytes that have been copied or otherwise dealt with, and
+        # optionally files finished elsewhere (e.g. in a shard process).
+        #
+        with self.lock:
+            self.done_bytes += byte_count
+            self.done_files += file_count
+            self.sample()
+    #
+    #
+    def skip(self, seconds):
+        # Leave a pause out of the rates and the elapsed time, as if the clock had stopped.
+        #
+        with self.lock:
+            self.start_time += seconds
+            self.sample_time += seconds
+    #
+    #
+    def finish_file(self, file_size, bytes_already_counted=0):
+        # Count a finished file, including whatever part of its size the chunk
+        # callbacks have not already reported.
+        #
+        with self.lock:
+            self.done_bytes += max(0, file_size - bytes_already_counted)
+            self.done_files += 1
+            self.sample()
+    #
+    #
+    def sample(self):
+        # Update the smoothed rates if enough time has passed since the last sample.
+        #
+        now = time.monotonic()
+        elapsed = now - self.sample_time
+        if elapsed < self.SAMPLE_INTERVAL:
+            return
+        byte_rate = (self.done_bytes - self.sample_bytes) / elapsed
+        # The rates over the last interval.
+        file_rate = (self.done_files - self.sample_files) / elapsed
+        if self.byte_rate is None:
+            # The first sample is taken as is.
+            self.byte_rate, self.file_rate = byte_rate, file_rate
+        else:
+            self.byte_rate += self.SMOOTHING * (byte_rate - self.byte_rate)
+            self.file_rate += self.SMOOTHING * (file_rate - self.file_rate)
+        self.sample_time, self.sample_bytes, self.sample_files = now, self.done_bytes, self.done_files
+    #
+    #
+    def rates(self):
+        # Return (bytes per second, files per second), falling back to the average
+        # since the start until the first sample has been taken.
+        #
+        if self.byte_rate is not None:
+            return self.byte_rate, self.file_rate
+        elapsed = max(time.monotonic() - self.start_time, 1e-6)
+        return self.done_bytes / elapsed, self.done_files / elapsed
+    #
+    #
+    def percent(self):
+        # Return the progress as a whole percentage, weighted by bytes.
+        #
+        if self.total_bytes > 0:
+            return min(100, int(self.done_bytes * 100 / self.total_bytes))
+        if self.total_files > 0:
+            # Only empty files: fall back to counting files.
+            return min(100, int(self.done_files * 100 / self.total_files))
+        return 100
+    #
+    #
+    def eta_seconds(self):
+        # Estimate the seconds left from the smoothed rates, or None if unknown.
+        #
+        byte_rate, file_rate = self.rates()
+        if self.total_bytes > 0 and byte_rate > 0:
+            return max(0, self.total_bytes - self.done_bytes) / byte_rate
+        if file_rate > 0:
+            return max(0, self.total_files - self.done_files) / file_rate
+        return None
+    #
+    #
+    def summary(self):
+        # Return a short 'speed, files per second, time left' text for the status line.
+        #
+        byte_rate, file_rate = self.rates()
+        eta = self.eta_seconds()
+        return (f"{byte_rate / (1024 * 1024):.1f} MB/s, {file_rate:.0f} files/s, "
+                f"ETA {format_duration(eta) if eta is not None else '--'}")
+#
+#
+CASE_INSENSITIVE_NAMES = sys.platform in ("win32", "darwin")
+# Windows and macOS treat 'Photo.JPG' and 'photo.jpg' as the same file name by default.
+#
+#
+def name_key(filename):
+    # Return the form of a file name used to detect naming conflicts.
+    #
+    return filename.casefold() if CASE_INSENSITIVE_NAMES else filename
+#
+#
+DEFAULT_EXCLUDE_PATTERNS = "*.part; *.crdownload; *.download; *.tmp; *.swp; ~$*; .~lock.*; .*"
+# In-progress downloads, temporary files, editor and office lock files, and hidden files.
+#
+#
+def split_patterns(text):
+    # Split a pattern list typed as 'a; b, c' into ['a', 'b', 'c'].
+    #
+    return [pattern.strip() for pattern in re.split(r"[;,\n]", text or "") if pattern.strip()]
+#
+#
+class PatternSet:
+    # A set of gitignore-style name patterns, compiled so that matching a name costs
+    # about the same with five patterns or five hundred.
+    #
+    # The common shapes are answered with set lookups: exact names ('Thumbs.db')
+    # and pure suffixes ('*.tmp', '*.tar.gz'). Everything else is translated with
+    # fnmatch and joined into one regular expression, compiled once.
+    #
+    def __init__(self, patterns):
+        # Sort the patterns into exact names, suffixes and one combined regex.
+        #
+        self.exact = set()
+        # Names matched exactly.
+        self.suffixes = set()
+        # Endings like '.tmp' matched by '*.tmp'.
+        translated = []
+        # Regular expressions for everything else.
+        for pattern in patterns:
+            pattern = name_key(pattern.rstrip("/").lstrip("/"))
+            # Folders are never organized, and we only scan one level, so a leading
+            # or trailing slash makes no difference here.
+            if not pattern:
+                continue
+            wildcard_free = not any(char in pattern for char in "*?[")
+            if wildcard_free:
+                self.exact.add(pattern)
+            elif pattern.startswith("*.") and not any(char in pattern[1:] for char in "*?["):
+                self.suffixes.add(pattern[1:])
+            else:
+                translated.append(fnmatch.translate(pattern))
+        self.regex = re.compile("|".join(translated)) if translated else None
+        # One compiled expression for all the remaining patterns.
+        self.empty = not (self.exact or self.suffixes or self.regex)
+        # Whether the set has no patterns at all.
+    #
+    #
+    def matches(self, name):
+        # Check if a file name matches any pattern in the set.
+        #
+        name = name_key(name)
+        # Compare case-insensitively where the file system does.
+        if name in self.exact:
+            return True
+        if self.suffixes:
+            dot = name.find(".")
+            # Try every ending that starts at a dot: 'a.tar.gz' gives '.tar.gz' and '.gz'.
+            while dot != -1:
+                if name[dot:] in self.suffixes:
+                    return True
+                dot = name.find(".", dot + 1)
+        return bool(self.regex and self.regex.match(name))
+#
+#
+class NameFilter:
+    # Decides which directory entries the scanner looks at. A name is kept if it
+    # matches the include patterns (or there are none) and no exclude pattern.
+    #
+    def __init__(self, include_patterns=(), exclude_patterns=()):
+        # Compile both pattern lists once.
+        #
+        self.include = PatternSet(include_patterns)
+        # Only names matching these are organized (all names if empty).
+        self.exclude = PatternSet(exclude_patterns)
+        # Names matching these are never organized.
+    #
+    #
+    def accepts(self, name):
+        # Check if a file name passes the filter.
+        #
+        if not self.include.empty and not self.include.matches(name):
+            return False
+        return not self.exclude.matches(name)
+#
+#
+class DirectoryCache:
+    # Remembers which destination folders are known to exist, for the whole session,
+    # so repeated runs (and every dropped file) don't stat or create them again.
+    #
+    # An entry is dropped with 'invalidate' when a move fails with ENOENT because
+    # the folder was deleted behind our back, and recreated on the next 'ensure'.
+    #
+    def __init__(self):
+        # Start with no known folders.
+        #
+        self.known = set()
+        # The normalized paths of folders known to exist.
+        self.lock = threading.Lock()
+        # Protects 'known', which may be used from several threads.
+    #
+    #
+    @staticmethod
+    def key(path):
+        # Normalize a path so the same folder always gives the same key.
+        #
+        return os.path.normcase(os.path.abspath(path))
+    #
+    #
+    def __contains__(self, path):
+        # Whether a folder is known to exist, without asking the file system.
+        #
+        key = self.key(path)
+        with self.lock:
+            return key in self.known
+    #
+    #
+    def ensure(self, path):
+        # Make sure a folder exists, creating it if needed. Returns True if it had to
+        # be checked or created on disk, False if it was already known.
+        #
+        key = self.key(path)
+        with self.lock:
+            if key in self.known:
+                # Known to exist: no system call needed.
+                return False
+        os.makedirs(path, exist_ok=True)
+        # Create the folder and any missing parents.
+        with self.lock:
+            self.known.add(key)
+        return True
+    #
+    #
+    def invalidate(self, path):
+        # Forget a folder and everything below it, after it turned out to be missing.
+        #
+        key = self.key(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        with self.lock:
+            self.known = {known for known in self.known if known != key and not known.startswith(prefix)}
+#
+#
+KNOWN_DIRECTORIES = DirectoryCache()
+# The session-wide cache of existing destination folders.
+#
+#
+VIEW_MANIFEST_NAME = ".file-organizer-view.json"
+# The file in a view's root that records which link points where.
+#
+#
+def load_view_manifest(view_root):
+    # Load a view's manifest, or return None if the folder is not a view.
+    #
+    try:
+        with open(os.path.join(view_root, VIEW_MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+#
+#
+def save_view_manifest(view_root, manifest):
+    # Write a view's manifest atomically, so an interrupted run never leaves it half written.
+    #
+    manifest_path = os.path.join(view_root, VIEW_MANIFEST_NAME)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+    # Swap the new manifest in with a single rename.
+#
+#
+def scan_view(view_root):
+    # List every entry in an existing view with one scandir per folder. Returns
+    # {relative path: (is_symlink, inode)}; both values come with the listing itself.
+    #
+    entries = {}
+    # The links found in the view.
+    pending = [""]
+    # Folders still to list, relative to the view root.
+    while pending:
+        relative_folder = pending.pop()
+        with os.scandir(os.path.join(view_root, relative_folder)) as listing:
+            for entry in listing:
+                relative_path = os.path.join(relative_folder, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(relative_path)
+                    # Descend into subfolders like 'PDF Files' or '2024/05'.
+                elif relative_path != VIEW_MANIFEST_NAME:
+                    entries[relative_path] = (entry.is_symlink(), entry.inode())
+    return entries
+#
+#
+FS_IOC_FIEMAP = 0xC020660B
+# The Linux ioctl that reports where a file's data is stored on disk.
+#
+#
+def physical_offset(file_path):
+    # Return the disk offset of the first block of a file's data, using FIEMAP,
+    # or None where that is not available (other systems, network file systems,
+    # empty or inline files).
+    #
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return None
+    request = bytearray(32 + 56)
+    # A 32-byte 'struct fiemap' header followed by room for one 56-byte extent.
+    struct.pack_into("=QQIIII", request, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    # Ask for the mapping of the whole file, one extent at most.
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            fcntl.ioctl(fd, FS_IOC_FIEMAP, request)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    if struct.unpack_from("=I", request, 20)[0] == 0:
+        # No extents were mapped.
+        return None
+    if struct.unpack_from("=I", request, 32 + 40)[0] & 0x206:
+        # The location is unknown, not allocated yet, or the data is stored inline
+        # (FIEMAP_EXTENT_UNKNOWN, _DELALLOC and _DATA_INLINE), so there is no offset.
+        return None
+    return struct.unpack_from("=Q", request, 40)[0]
+    # 'fe_physical' of the first extent.
+#
+#
+def order_operations(plan, file_stats, physical_offsets=None):
+    # Turn a plan ({subfolder: [files]}) into an ordered list of (subfolder, file)
+    # moves that is kind to the disk.
+    #
+    # Moves are grouped by destination folder (one folder's metadata at a time).
+    # Renames only touch directory entries and inodes, so within a folder they
+    # are sorted by inode number, which follows the inode table on disk.
+    # Copies to another disk read every byte, so when physical offsets are given
+    # a folder's files are sorted by where their data sits instead, which reads
+    # each folder in one forward sweep (files without a known offset go last,
+    # in inode order). Keeping the folders together costs a jump back at every
+    # folder change, but keeps the destination's directory writes together.
+    #
+    inode = lambda filename: file_stats[filename].st_ino
+    # Inode numbers come from the scan, so ordering needs no extra system calls.
+    if physical_offsets:
+        position = lambda filename: (physical_offsets.get(filename) is None,
+                                     physical_offsets.get(filename) or inode(filename))
+    else:
+        position = inode
+    operations = []
+    for subfolder_name, files in sorted(plan.items(), key=lambda item: min(map(position, item[1]))):
+        # Visit folders in the order of their first file, so the sweep mostly moves forward.
+        operations.extend((subfolder_name, filename) for filename in sorted(files, key=position))
+    return operations
+#
+#
+def fsync_directory(folder_path):
+    # Flush a folder's entries to disk, making the renames inside it durable.
+    # Windows cannot open folders for this and doesn't need it, so it is skipped there.
+    #
+    if sys.platform == "win32":
+        return
+    fd = os.open(folder_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+#
+#
+def benchmark_move_ordering(file_count=2000, folder_count=25, seed=1, directory=None, copy_to=None):
+    # Time real moves of a generated folder in scan order and in the optimized
+    # order. The folder is created in 'directory' (the system's temporary folder
+    # by default), where the moves are renames; with 'copy_to', a folder on
+    # another disk, the files are moved there instead, which copies them.
+    # Every run gets a freshly written copy of the same files, which is evicted
+    # from the page cache before it is timed, so the moves read from the disk.
+    # Returns the report as a list of lines.
+    #
+    generator = random.Random(seed)
+    # A fixed seed makes every run generate the same files.
+    sizes = [min(int(generator.lognormvariate(9, 1.5)) + 1, 4 * 1024 * 1024) for _ in range(file_count)]
+    # Mostly small files with a tail of bigger ones, capped to keep the run short.
+    folders = [generator.randrange(folder_count) for _ in range(file_count)]
+    # The extension, and so the destination folder, of each file.
+    chunk = os.urandom(max(sizes))
+    evicted = hasattr(os, "posix_fadvise")
+    # Whether the files' cached data can be dropped before each timing.
+    #
+    def timed_run(optimized, destination_root):
+        # Generate the folder, then time moving its files in one of the two orders.
+        with tempfile.TemporaryDirectory(dir=directory) as base:
+            for index, (size, folder) in enumerate(zip(sizes, folders)):
+                with open(os.path.join(base, f"file{index}.ext{folder}"), "wb") as file:
+                    file.write(chunk[:size])
+            if hasattr(os, "sync"):
+                os.sync()
+                # Give the data its place on disk, so FIEMAP can report it.
+            file_stats = {entry.name: entry.stat() for entry in os.scandir(base)}
+            # The scan, in the order the directory lists its entries.
+            if evicted:
+                for filename in file_stats:
+                    fd = os.open(os.path.join(base, filename), os.O_RDONLY)
+                    try:
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                        # The data was synced, so the kernel can drop its cached pages.
+                    finally:
+                        os.close(fd)
+            plan = {}
+            for filename in file_stats:
+                plan.setdefault(f"{get_extension(filename).upper()} Files", []).append(filename)
+            with tempfile.TemporaryDirectory(dir=destination_root or base) as destination:
+                for subfolder_name in plan:
+                    os.makedirs(os.path.join(destination, subfolder_name))
+                if not optimized:
+                    operations = [(subfolder_name, filename) for subfolder_name, files in plan.items()
+                                  for filename in files]
+                    # The order the worker used before the optimizer existed.
+                elif destination_root:
+                    offsets = {filename: physical_offset(os.path.join(base, filename)) for filename in file_stats}
+                    operations = order_operations(plan, file_stats,
+                                                  {name: offset for name, offset in offsets.items() if offset is not None})
+                    # Copies use the physical offsets wherever FIEMAP works.
+                else:
+                    operations = order_operations(plan, file_stats)
+                    # Renames never use physical offsets.
+                started = time.perf_counter()
+                for subfolder_name, filename in operations:
+                    move_file_chunked(os.path.join(base, filename), os.path.join(destination, subfolder_name, filename))
+                if hasattr(os, "sync"):
+                    os.sync()
+                    # Count the time to get the moves onto the disk too.
+                return time.perf_counter() - started
+    #
+    lines = [f"Move ordering benchmark ({file_count} files, {folder_count} folders, {format_size(sum(sizes))})"]
+    for label, destination_root in (("rename", None), ("copy", copy_to)):
+        if label == "copy" and not copy_to:
+            continue
+            # Copies need a destination on another disk.
+        before = timed_run(False, destination_root)
+        after = timed_run(True, destination_root)
+        lines.append(f"  {label:<6} scan order {before:8.2f}s   optimized {after:8.2f}s   "
+                     f"speed-up {before / after:5.2f}x")
+    if not evicted:
+        lines.append("  The files were just written, so their data may still be cached in memory.")
+        # Without posix_fadvise (e.g. on Windows) the page cache cannot be dropped per file.
+    return lines
+#
+#
+class FaultyFileSystem:
+    # A test harness that wraps the file system calls the engine and backups
+    # make (scandir/listdir, stat, rename, makedirs and open) for paths under
+    # 'root', adding latency and injecting errors, so flaky-NFS behaviour can
+    # be reproduced on a local disk. Use it as a context manager; the real
+    # functions are put back on exit.
+    #
+    # 'latency' maps an operation to its mean delay in seconds. 'faults' is a
+    # list of (operation, errno, probability, repeat): a path picked with that
+    # probability fails its first 'repeat' calls (every call if None), so
+    # transient errors succeed on a retry and permanent ones never do (the
+    # first fault listed for an operation that picks a path wins). The
+    # 'write' operation fails writes to files opened for writing after a part
+    # of the data, leaving a partial file. Every decision is derived from the
+    # seed, the operation and the path, so a run's faults are the same no
+    # matter how its threads are scheduled.
+    #
+    OPERATIONS = ("scandir", "stat", "rename", "makedirs", "open", "write")
+    # The operations latency and faults can be attached to.
+    #
+    def __init__(self, root, seed=0, latency=None, faults=()):
+        # Store the settings; nothing is patched until the harness is entered.
+        #
+        self.root = os.path.abspath(root)
+        self.seed = seed
+        self.latency = dict(latency or {})
+        self.faults = list(faults)
+        self.lock = threading.Lock()
+        self.attempts = {}
+        # (operation, path) -> calls so far, which decides when a transient fault clears.
+        self.calls = {operation: 0 for operation in self.OPERATIONS}
+        # Calls per operation under 'root'.
+        self.injected = {}
+        # (operation, errno name) -> errors raised.
+        self.originals = None
+    #
+    #
+    def inject(self, operation, path):
+        # Delay and possibly fail one call. Returns the errno to fail with, or None.
+        #
+        if not isinstance(path, (str, bytes, os.PathLike)):
+            return None
+            # File descriptors are not traced.
+        path = os.path.abspath(os.fsdecode(path))
+        if not (path + os.sep).startswith(self.root + os.sep):
+            return None
+            # Only the harness's own folder is affected.
+        with self.lock:
+            attempt = self.attempts.get((operation, path), 0) + 1
+            self.attempts[(operation, path)] = attempt
+            self.calls[operation] += 1
+        chooser = random.Random(f"{self.seed}:{operation}:{os.path.relpath(path, self.root)}")
+        # The same seed, operation and path always draw the same numbers, wherever 'root' is.
+        delay = self.latency.get(operation, 0)
+        if delay:
+            time.sleep(delay * (0.5 + chooser.random()))
+            # Spread the delay between half and one and a half times the mean.
+        for fault_operation, code, probability, repeat in self.faults:
+            if fault_operation == operation and chooser.random() < probability and (repeat is None or attempt <= repeat):
+                with self.lock:
+                    key = (operation, errno.errorcode.get(code, str(code)))
+                    self.injected[key] = self.injected.get(key, 0) + 1
+                return code
+        return None
+    #
+    #
+    def check(self, operation, path):
+        # Delay one call and raise its injected error, if any.
+        #
+        code = self.inject(operation, path)
+        if code is not None:
+            raise OSError(code, f"{os.strerror(code)} (injected)", os.fsdecode(path))
+    #
+    #
+    def __enter__(self):
+        # Replace the file system functions with traced versions.
+        #
+        self.originals = (os.scandir, os.listdir, os.stat, os.rename, os.makedirs, builtins.open)
+        real_scandir, real_listdir, real_stat, real_rename, real_makedirs, real_open = self.originals
+        #
+        def scandir(path="."):
+            self.check("scandir", path)
+            return FaultyScandir(real_scandir(path), self)
+        #
+        def listdir(path="."):
+            self.check("scandir", path)
+            return real_listdir(path)
+        #
+        def stat(path, *args, **kwargs):
+            self.check("stat", path)
+            return real_stat(path, *args, **kwargs)
+        #
+        def rename(source, destination, *args, **kwargs):
+            self.check("rename", source)
+            return real_rename(source, destination, *args, **kwargs)
+        #
+        def makedirs(path, *args, **kwargs):
+            self.check("makedirs", path)
+            return real_makedirs(path, *args, **kwargs)
+        #
+        def open_file(file, mode="r", *args, **kwargs):
+            self.check("open", file)
+            opened = real_open(file, mode, *args, **kwargs)
+            if any(flag in mode for flag in "wax+"):
+                code = self.inject("write", file)
+                if code is not None:
+                    limit = random.Random(f"{self.seed}:limit:{os.path.relpath(os.fsdecode(file), self.root)}").randrange(0, 4096)
+                    return ShortWriteFile(opened, limit, code)
+                    # Writes fail with 'code' once 'limit' bytes are in.
+            return opened
+        #
+        os.scandir, os.listdir, os.stat, os.rename, os.makedirs, builtins.open = (
+            scandir, listdir, stat, rename, makedirs, open_file)
+        return self
+    #
+    #
+    def __exit__(self, *exc_info):
+        # Put the real functions back.
+        #
+        os.scandir, os.listdir, os.stat, os.rename, os.makedirs, builtins.open = self.originals
+    #
+    #
+    def summary(self):
+        # The calls made and errors injected, as report lines.
+        #
+        calls = ", ".join(f"{operation} {count}" for operation, count in self.calls.items() if count)
+        injected = ", ".join(f"{operation} {name} {count}" for (operation, name), count in sorted(self.injected.items()))
+        return [f"  calls      {calls or 'none'}", f"  injected   {injected or 'none'}"]
+#
+#
+class FaultyScandir:
+    # A scandir iterator whose entries' stat() calls go through the harness.
+    #
+    def __init__(self, iterator, file_system):
+        self.iterator = iterator
+        self.file_system = file_system
+    #
+    def __iter__(self):
+        return self
+    #
+    def __next__(self):
+        return FaultyDirEntry(next(self.iterator), self.file_system)
+    #
+    def __enter__(self):
+        return self
+    #
+    def __exit__(self, *exc_info):
+        self.iterator.close()
+    #
+    def close(self):
+        self.iterator.close()
+#
+#
+class FaultyDirEntry:
+    # A directory entry whose stat() is delayed and can fail like os.stat.
+    #
+    def __init__(self, entry, file_system):
+        self.entry = entry
+        self.file_system = file_system
+    #
+    def __getattr__(self, name):
+        return getattr(self.entry, name)
+        # name, path, is_file() and the rest come from the real entry.
+    #
+    def __fspath__(self):
+        return self.entry.path
+    #
+    def stat(self, *, follow_symlinks=True):
+        self.file_system.check("stat", self.entry.path)
+        return self.entry.stat(follow_symlinks=follow_symlinks)
+#
+#
+class ShortWriteFile:
+    # A file opened for writing that fails with 'code' (e.g. ENOSPC) once
+    # 'limit' bytes have been written, after writing as much as fits.
+    #
+    def __init__(self, file, limit, code):
+        self.file = file
+        self.remaining = limit
+        self.code = code
+    #
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        if len(data) > self.remaining:
+            self.file.write(data[:self.remaining])
+            self.remaining = 0
+            raise OSError(self.code, f"{os.strerror(self.code)} (injected)", self.file.name)
+        self.remaining -= len(data)
+        return self.file.write(data)
+    #
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+    #
+    def __enter__(self):
+        return self
+    #
+    def __exit__(self, *exc_info):
+        self.file.close()
+#
+#
+def parse_fault(spec):
+    # Parse a '--fault' value: 'operation:ERRNO:probability[:repeat]', e.g.
+    # 'rename:EBUSY:0.1:2' (10% of files fail their first two renames) or
+    # 'write:ENOSPC:0.01' (1% of written files run out of space for good).
+    #
+    parts = spec.split(":")
+    if len(parts) not in (3, 4) or parts[0] not in FaultyFileSystem.OPERATIONS or not hasattr(errno, parts[1]):
+        raise ValueError(f"Invalid fault '{spec}'; expected operation:ERRNO:probability[:repeat]")
+    return parts[0], getattr(errno, parts[1]), float(parts[2]), int(parts[3]) if len(parts) == 4 else None
+#
+#
+def parse_latency(spec):
+    # Parse a '--latency' value in milliseconds: 'rename=5,stat=0.5'.
+    #
+    latency = {}
+    for item in filter(None, spec.split(",")):
+        operation, _, milliseconds = item.partition("=")
+        if operation not in FaultyFileSystem.OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}' in latency '{spec}'")
+        latency[operation] = float(milliseconds) / 1000
+    return latency
+#
+#
+def benchmark_faults(file_count=2000, latency=None, faults=(), seed=1, max_parallel=8, backup=False, retry_delay=0.25):
+    # Organize a generated folder under a FaultyFileSystem and report the
+    # throughput, the errors injected and whether any file was lost or damaged.
+    # Returns the report as a list of lines.
+    #
+    base = tempfile.mkdtemp(prefix="organizer-faults-")
+    try:
+        folder = os.path.join(base, "files")
+        os.makedirs(os.path.join(base, "backup"))
+        os.makedirs(folder)
+        generator = random.Random(seed)
+        sizes = {}
+        # Every generated file's size, to check the results against.
+        for index in range(file_count):
+            filename = f"file{index}.{generator.choice(['txt', 'pdf', 'jpg', 'png', 'csv'])}"
+            sizes[filename] = int(generator.lognormvariate(8, 1.5)) + 1
+            # Mostly small files with a few large ones.
+            with open(os.path.join(folder, filename), "wb") as f:
+                f.write(generator.randbytes(sizes[filename]))
+        lines = [f"Fault injection benchmark ({file_count} files, seed {seed}, up to {max_parallel} parallel moves)",
+                 "  latency    " + (", ".join(f"{op} {delay * 1000:g}ms" for op, delay in latency.items()) if latency else "none"),
+                 "  faults     " + (", ".join(f"{op} {errno.errorcode.get(code, code)} {probability * 100:g}%"
+                                             f"{'' if repeat is None else f' x{repeat}'}"
+                                             for op, code, probability, repeat in faults) or "none")]
+        with FaultyFileSystem(base, seed, latency, faults) as file_system:
+            if backup:
+                started = time.monotonic()
+                try:
+                    report = create_backup_archive(folder, CompressionPolicy(), "zip", os.path.join(base, "backup"))
+                    lines.append(f"  backup     {time.monotonic() - started:.2f}s   {len(report.members)} members")
+                except OSError as e:
+                    lines.append(f"  backup     {time.monotonic() - started:.2f}s   failed: {e}")
+            engine = OrganizerEngine(folder, retry_policy=RetryPolicy(base_delay=retry_delay), max_parallel=max_parallel)
+            outcome = []
+            engine.finished.connect(lambda message, count: outcome.append(message))
+            engine.error_occurred.connect(outcome.append)
+            started = time.monotonic()
+            engine.run()
+            elapsed = time.monotonic() - started
+        moved = left = damaged = 0
+        found = set()
+        # The generated files that still exist somewhere, intact or not.
+        for directory, _, filenames in os.walk(folder):
+            for filename in filenames:
+                found.add(filename)
+                if filename not in sizes or os.path.getsize(os.path.join(directory, filename)) != sizes[filename]:
+                    damaged += 1
+                    # A stray partial copy, or a file that lost data.
+                elif directory == folder:
+                    left += 1
+                else:
+                    moved += 1
+        lost = len(set(sizes) - found)
+        lines += [f"  organize   {elapsed:.2f}s   {moved / elapsed if elapsed else 0:.0f} files/s   "
+                  f"({outcome[-1] if outcome else 'no result'})",
+                  *file_system.summary(),
+                  f"  outcome    moved {moved}   left in place {left}   reported {len(engine.error_report)}   "
+                  f"lost {lost}   damaged {damaged}",
+                  f"  parallel   {engine.move_concurrency.describe()}"]
+        return lines
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+#
+#
+# Types that are already compressed, so deflating them again costs CPU for no gain.
+STORED_EXTENSIONS = {
+    "jpg", "jpeg", "jpe", "jfif", "png", "gif", "webp", "heic", "heif", "avif",
+    "mp4", "m4v", "mov", "mkv", "webm", "avi", "wmv", "flv", "3gp",
+    "mp3", "m4a", "aac", "ogg", "oga", "opus", "flac", "wma",
+    "zip", "gz", "tgz", "bz2", "tbz2", "xz", "txz", "zst", "7z", "rar", "cab", "lz4",
+    "docx", "xlsx", "pptx", "odt", "ods", "odp", "epub", "jar", "apk", "whl", "cbz", "cbr",
+    "woff", "woff2", "dmg", "iso",
+}
+#
+# Types that always compress well, so they are deflated without sampling.
+DEFLATED_EXTENSIONS = {
+    "txt", "log", "csv", "tsv", "json", "xml", "html", "htm", "css", "js", "ts", "md", "rst",
+    "py", "c", "h", "cpp", "java", "cs", "go", "rs", "sql", "yaml", "yml", "ini", "cfg", "conf",
+    "svg", "bmp", "tif", "tiff", "wav", "doc", "xls", "ppt", "rtf", "ps", "eps",
+}
+#
+#
+class CompressionPolicy:
+    # Chooses, per file, whether a backup stores it as is or deflates it.
+    #
+    # Known compressed types are stored, known compressible types are deflated,
+    # and anything else is judged by deflating a small sample from the start of
+    # the file: if that saves less than 'min_saving', the file is stored.
+    #
+    SAMPLE_SIZE = 64 * 1024
+    # How much of an unknown file is test-compressed.
+    SMALL_FILE_SIZE = 4096
+    # Files this small are simply deflated; sampling would cost more than it saves.
+    #
+    #
+    def __init__(self, level=6, min_saving=0.05, overrides=None):
+        # Store the compression settings.
+        #
+        self.level = level
+        # The deflate level, from 1 (fastest) to 9 (smallest); 0 stores everything.
+        self.min_saving = min_saving
+        # The smallest saving (as a fraction) that makes deflating worthwhile.
+        self.overrides = overrides or {}
+        # Per-extension choices ('store' or 'deflate') that win over everything else.
+        self.sample_bytes = 0
+        # How many bytes were test-compressed...
+        self.sample_seconds = 0.0
+        # ...and how long it took, which gives an estimate of deflate speed.
+    #
+    #
+    def choose(self, file_path, file_size):
+        # Return zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED for one file.
+        #
+        extension = get_extension(os.path.basename(file_path))
+        # The policy is keyed by extension first.
+        choice = self.overrides.get(extension)
+        if self.level == 0 or choice == "store":
+            return zipfile.ZIP_STORED
+        if choice == "deflate" or extension in DEFLATED_EXTENSIONS or file_size <= self.SMALL_FILE_SIZE:
+            return zipfile.ZIP_DEFLATED
+        if extension in STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED if self.sample_saving(file_path) >= self.min_saving else zipfile.ZIP_STORED
+        # Unknown type: let a sample decide.
+    #
+    #
+    def sample_saving(self, file_path):
+        # Deflate the first SAMPLE_SIZE bytes and return the fraction saved.
+        #
+        try:
+            with open(file_path, 'rb') as f:
+                sample = f.read(self.SAMPLE_SIZE)
+        except OSError:
+            return 1.0
+            # Let the archive writer report the real error.
+        if not sample:
+            return 1.0
+        started = time.perf_counter()
+        compressed_size = len(zlib.compress(sample, self.level))
+        self.sample_seconds += time.perf_counter() - started
+        self.sample_bytes += len(sample)
+        return 1 - compressed_size / len(sample)
+    #
+    #
+    def deflate_rate(self):
+        # Return the measured deflate speed in bytes per second, or None.
+        #
+        return self.sample_bytes / self.sample_seconds if self.sample_seconds > 0 else None
+#
+#
+class BackupReport:
+    # Collects what a backup did: how many files and bytes went in, how much
+    # compression saved, and how much time storing incompressible files saved.
+    #
+    def __init__(self):
+        # Start with empty totals.
+        #
+        self.archive_path = ""
+        # Where the backup was written.
+        self.files = 0
+        # The number of files backed up.
+        self.bytes_in = 0
+        # Their combined size.
+        self.bytes_out = 0
+        # Their combined size inside the archive.
+        self.stored_files = 0
+        # Files written without compression...
+        self.stored_bytes = 0
+        # ...and their combined size.
+        self.deflate_bytes = 0
+        # Bytes that were deflated...
+        self.deflate_seconds = 0.0
+        # ...and how long writing them took.
+        self.seconds = 0.0
+        # How long the whole backup took.
+        self.archive_format = "zip"
+        # The archive format, which decides how the backup is read back.
+        self.file_path = None
+        # The archive's file, if it was written to one (pipes cannot be re-read).
+        self.members = {}
+        # What each member should contain: name -> (size, CRC-32), taken while backing up.
+        self.unchanged_files = 0
+        # Files an incremental backup skipped because they had not changed.
+    #
+    #
+    def time_saved(self, policy):
+        # Estimate the seconds saved by storing files instead of deflating them,
+        # from the deflate speed measured during this backup.
+        #
+        rate = self.deflate_bytes / self.deflate_seconds if self.deflate_seconds > 0 else policy.deflate_rate()
+        return self.stored_bytes / rate if rate else 0.0
+    #
+    #
+    def summary(self, policy):
+        # Return a one-line description of the backup.
+        #
+        megabytes = lambda byte_count: byte_count / (1024 * 1024)
+        return (f"Backup: {self.files} file(s), {megabytes(self.bytes_in):.1f} MB -> {megabytes(self.bytes_out):.1f} MB "
+                f"(saved {megabytes(self.bytes_in - self.bytes_out):.1f} MB), {self.stored_files} stored uncompressed "
+                f"(~{format_duration(self.time_saved(policy))} CPU saved), "
+                + (f"{self.unchanged_files} unchanged, " if self.unchanged_files else "")
+                + f"took {format_duration(self.seconds)}")
+#
+#
+def backup_members(source_path):
+    # Yield (file path, name inside the archive) for everything a backup of
+    # 'source_path' contains. Folder members keep the folder's name as their prefix.
+    #
+    if os.path.isfile(source_path):
+        yield source_path, os.path.basename(source_path)
+        return
+    parent_dir = os.path.dirname(source_path)
+    for root, _, files in os.walk(source_path):
+        # Walk through all directories and files in the selected folder.
+        for file in files:
+            file_path = os.path.join(root, file)
+            yield file_path, os.path.relpath(file_path, parent_dir)
+            # Preserve each file's path relative to the folder's parent.
+#
+#
+def backup_base_path(source_path, timestamp):
+    # Return the backup's path without its extension, next to the source.
+    #
+    name = os.path.basename(source_path)
+    if os.path.isfile(source_path):
+        name = os.path.splitext(name)[0]
+        # 'report.pdf' is backed up as 'report_backup_<timestamp>.zip'.
+    return os.path.join(os.path.dirname(source_path), f"{name}_backup_{timestamp}")
+#
+#
+BACKUP_BUFFER_SIZE = 4 * 1024 * 1024
+# Backups are written through a large buffer so pipes and network shares see few, big writes.
+#
+#
+class CountingWriter:
+    # Wraps a writable binary stream, counting the bytes written through it.
+    # It deliberately cannot seek, so archive writers treat every target - a
+    # file, a pipe or standard output - as a forward-only stream.
+    #
+    def __init__(self, stream):
+        # Remember the underlying stream.
+        #
+        self.stream = stream
+        # Where the bytes really go.
+        self.count = 0
+        # How many bytes have been written so far.
+    #
+    #
+    def write(self, data):
+        # Pass the data on and count it.
+        #
+        self.stream.write(data)
+        self.count += len(data)
+        return len(data)
+    #
+    #
+    def tell(self):
+        # Archive writers ask for their position; it is the byte count.
+        #
+        return self.count
+    #
+    #
+    def flush(self):
+        # Flush the underlying stream.
+        #
+        self.stream.flush()
+#
+#
+class ZipArchiveBackend:
+    # Writes members into a ZIP archive, storing or deflating each one as the
+    # compression policy decides. ZIP64 records are written automatically for
+    # members over 4 GB and for more than 65,535 members. Note that ZIP keeps
+    # one small entry per member in memory for its central directory.
+    #
+    def __init__(self, stream, policy):
+        # Start an archive on 'stream'.
+        #
+        self.policy = policy
+        # Decides per member whether to compress.
+        self.zipf = zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED, allowZip64=True,
+                                    compresslevel=policy.level or None)
+        # Open a new ZIP archive in write mode.
+    #
+    #
+    def add(self, file_path, archive_name, st):
+        # Add one file. Returns whether it was compressed, its member name,
+        # and the size and CRC-32 of the data read.
+        #
+        compress_type = self.policy.choose(file_path, st.st_size)
+        # Store or deflate this member.
+        self.zipf.write(file_path, archive_name, compress_type=compress_type)
+        # Write the file into the ZIP archive.
+        info = self.zipf.infolist()[-1]
+        # The entry just written, with the size and CRC-32 of the data that was read.
+        return compress_type != zipfile.ZIP_STORED, info.filename, info.file_size, info.CRC
+    #
+    #
+    def close(self):
+        # Write the central directory.
+        #
+        self.zipf.close()
+#
+#
+class TarArchiveBackend:
+    # Streams members into a POSIX (pax) tar archive, optionally compressed as a
+    # whole with gzip or xz. Headers are written one at a time and file data is
+    # copied in chunks, so memory use stays constant however many members or
+    # bytes the archive holds, and the output never needs to seek.
+    #
+    def __init__(self, stream, policy, compression=""):
+        # Start an archive on 'stream'.
+        #
+        self.raw = stream
+        # The archive's final destination.
+        self.compressed = compression == "xz" or (compression == "gz" and policy.level > 0)
+        # Whether members end up compressed. gzip level 0 only wraps the data, but
+        # xz's lowest preset, which level 0 maps to, still compresses.
+        if not compression:
+            self.stream = stream
+        elif compression == "gz":
+            self.stream = gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=policy.level, mtime=0)
+            # Compress the whole stream with gzip.
+        else:
+            self.stream = lzma.LZMAFile(stream, 'wb', preset=policy.level)
+            # Compress the whole stream with xz.
+        self.offset = 0
+        # How many uncompressed tar bytes have been written, for the final padding.
+    #
+    #
+    def write(self, data):
+        # Write tar bytes into the (possibly compressed) stream.
+        #
+        self.stream.write(data)
+        self.offset += len(data)
+    #
+    #
+    def add(self, file_path, archive_name, st):
+        # Add one file. Returns whether it was compressed, its member name,
+        # and the size and CRC-32 of the data written.
+        #
+        info = tarfile.TarInfo(archive_name.replace(os.sep, "/"))
+        # Tar member names always use forward slashes.
+        info.size = st.st_size
+        info.mtime = int(st.st_mtime)
+        info.mode = stat.S_IMODE(st.st_mode)
+        self.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        # pax headers carry sizes over 8 GB and names of any length.
+        remaining = info.size
+        crc = 0
+        # The checksum of the member's data, for verification.
+        with open(file_path, 'rb') as src:
+            while remaining > 0:
+                chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OSError(errno.EIO, "File shrank while it was being backed up", file_path)
+                    # The header already promised more data than there is.
+                self.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+        if info.size % tarfile.BLOCKSIZE:
+            self.write(tarfile.NUL * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE))
+            # Pad the data to a whole block.
+        return self.compressed, info.name, info.size, crc
+    #
+    #
+    def close(self):
+        # Write the end-of-archive marker and finish the compressed stream.
+        #
+        self.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+        # Two empty blocks end a tar archive.
+        if self.offset % tarfile.RECORDSIZE:
+            self.write(tarfile.NUL * (tarfile.RECORDSIZE - self.offset % tarfile.RECORDSIZE))
+            # Pad to a whole record, as tar readers expect.
+        if self.stream is not self.raw:
+            self.stream.close()
+            # Closing the compressor flushes it but leaves the target open.
+#
+#
+ARCHIVE_FORMATS = {
+    "zip": (".zip", lambda stream, policy: ZipArchiveBackend(stream, policy)),
+    "tar": (".tar", lambda stream, policy: TarArchiveBackend(stream, policy)),
+    "tar.gz": (".tar.gz", lambda stream, policy: TarArchiveBackend(stream, policy, "gz")),
+    "tar.xz": (".tar.xz", lambda stream, policy: TarArchiveBackend(stream, policy, "xz")),
+}
+# The available backup formats: their file name extension and a factory for
+# their archive backend on a stream.
+#
+#
+class BackupTarget:
+    # Where a backup is written. The spec may be empty (next to the source),
+    # a folder, a file path, '-' for standard output, or '| command' to pipe
+    # the archive into a command such as 'ssh host "cat > backup.tar.gz"'.
+    # The command is split into arguments and run without a shell, so shell
+    # syntax (pipes, redirection, variables) only works on the remote side.
+    #
+    def __init__(self, spec, default_base, extension):
+        # Open the target for writing. A default name ('default_base' plus
+        # 'extension') that is taken gets a counter, e.g. '..._1.zip'.
+        #
+        spec = (spec or "").strip()
+        self.process = None
+        # The command a pipe target feeds, if any.
+        self.path = None
+        # The file a file target writes, if any.
+        if spec.startswith("|"):
+            self.process = subprocess.Popen(shlex.split(spec[1:]), stdin=subprocess.PIPE, bufsize=BACKUP_BUFFER_SIZE)
+            # Start the command with the archive as its input.
+            self.description = f"pipe to '{spec[1:].strip()}'"
+            stream = self.process.stdin
+        elif spec == "-":
+            stream = os.fdopen(sys.stdout.fileno(), 'wb', buffering=BACKUP_BUFFER_SIZE, closefd=False)
+            # Write to standard output without closing it afterwards.
+            self.description = "standard output"
+        elif spec and not os.path.isdir(spec):
+            self.path = spec
+            stream = open(self.path, 'xb', buffering=BACKUP_BUFFER_SIZE)
+            # Never overwrite an existing file.
+            self.description = self.path
+        else:
+            base = os.path.join(spec, os.path.basename(default_base)) if spec else default_base
+            # A folder receives the archive under its usual name.
+            counter = 0
+            while True:
+                self.path = f"{base}_{counter}{extension}" if counter else base + extension
+                try:
+                    stream = open(self.path, 'xb', buffering=BACKUP_BUFFER_SIZE)
+                    break
+                except FileExistsError:
+                    counter += 1
+                    # Another backup was made within the same second.
+            self.description = self.path
+        self.stream = CountingWriter(stream)
+        # Count what is written, whatever the target.
+    #
+    #
+    def close(self, failed=False):
+        # Finish the target. A failed backup to a file leaves no partial file behind.
+        #
+        try:
+            self.stream.stream.close()
+            # Flush the buffer; standard output itself stays open.
+        finally:
+            if self.path and failed:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+        if self.process and self.process.wait() != 0 and not failed:
+            raise OSError(f"Backup command exited with status {self.process.returncode}")
+#
+#
+def create_backup_archive(source_path, policy, archive_format="zip", target=None, on_member=None):
+    # Write a timestamped backup of a file or folder in the chosen format to
+    # 'target' (see BackupTarget; by default next to the source). 'on_member'
+    # is called after each file. Returns a BackupReport.
+    #
+    if archive_format == "incremental":
+        return create_incremental_backup(source_path, policy, target, on_member)
+        # An incremental store is a folder of chunks and run manifests, not a stream.
+    report = BackupReport()
+    started = time.perf_counter()
+    extension, make_backend = ARCHIVE_FORMATS[archive_format]
+    default_base = backup_base_path(source_path, datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+    output = BackupTarget(target, default_base, extension)
+    report.archive_path = output.description
+    report.archive_format = archive_format
+    report.file_path = output.path
+    backend = None
+    try:
+        backend = make_backend(output.stream, policy)
+        for file_path, archive_name in backup_members(source_path):
+            st = os.stat(file_path)
+            member_started = time.perf_counter()
+            compressed, member_name, size, crc = backend.add(file_path, archive_name, st)
+            # Write the file into the archive.
+            report.members[member_name] = (size, crc)
+            # Remember what it should contain.
+            report.files += 1
+            report.bytes_in += st.st_size
+            if compressed:
+                report.deflate_bytes += st.st_size
+                report.deflate_seconds += time.perf_counter() - member_started
+            else:
+                report.stored_files += 1
+                report.stored_bytes += st.st_size
+            if on_member:
+                on_member(report)
+        backend.close()
+    except BaseException:
+        if backend is not None:
+            try:
+                backend.close()
+                # Finish the archive object now, or it writes its trailer to the
+                # closed target when it is garbage collected.
+            except Exception:
+                pass
+        output.close(failed=True)
+        raise
+    output.close()
+    report.bytes_out = output.stream.count
+    # The archive's total size, headers included.
+    report.seconds = time.perf_counter() - started
+    return report
+#
+#
+def read_member_checksum(stream):
+    # Read a member to its end, returning its size and CRC-32.
+    #
+    size = 0
+    crc = 0
+    while True:
+        chunk = stream.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            return size, crc
+        size += len(chunk)
+        crc = zlib.crc32(chunk, crc)
+        # zlib releases the GIL for large buffers, so threads checksum in parallel.
+#
+#
+def check_member(name, actual, expected):
+    # Compare a member's (size, CRC-32) with what was backed up; return a problem or None.
+    #
+    if actual[0] != expected[0]:
+        return f"{name}: {actual[0]} bytes in the archive, {expected[0]} backed up"
+    if actual[1] != expected[1]:
+        return f"{name}: checksum mismatch"
+    return None
+#
+#
+def split_in_runs(items, count):
+    # Split a list into 'count' contiguous runs, so each reader moves forward
+    # through its own part of the archive.
+    #
+    size = -(-len(items) // max(1, count))
+    return [items[i:i + size] for i in range(0, len(items), size)] if items else []
+#
+#
+class LimitedReader:
+    # Reads at most 'size' bytes from a file, starting at its current position.
+    #
+    def __init__(self, f, size):
+        # Remember the file and how much of it belongs to this member.
+        #
+        self.f = f
+        self.remaining = size
+    #
+    #
+    def read(self, amount):
+        # Read up to 'amount' bytes, never past the member's end.
+        #
+        data = self.f.read(min(amount, self.remaining))
+        self.remaining -= len(data)
+        return data
+#
+#
+def verify_backup(report, max_workers=None):
+    # Re-read a finished backup and check every member's size and CRC-32
+    # against what was recorded while backing up. ZIP and plain tar members are
+    # checked in parallel, each thread reading a contiguous run of the archive
+    # in order; compressed tar streams can only be read through once.
+    # Returns a list of problems, empty if the backup is sound.
+    #
+    if report.file_path is None:
+        return []
+        # A backup streamed into a pipe cannot be read back here.
+    max_workers = max_workers or os.cpu_count() or 1
+    if report.archive_format == "incremental":
+        return verify_backup_run(report.file_path, max_workers)
+    expected = report.members
+    problems = []
+    seen = set()
+    # Every member found, to spot missing ones afterwards.
+    try:
+        if report.archive_format == "zip":
+            with zipfile.ZipFile(report.file_path) as zipf:
+                # The central directory is read once and shared by all threads.
+                infos = sorted(zipf.infolist(), key=lambda info: info.header_offset)
+                #
+                def check_zip_run(run):
+                    # Check one run of ZIP members; zipfile also checks each stored CRC.
+                    found = []
+                    for info in run:
+                        try:
+                            with zipf.open(info) as member:
+                                actual = read_member_checksum(member)
+                        except (zipfile.BadZipFile, zlib.error, OSError) as e:
+                            found.append(f"{info.filename}: {e}")
+                            continue
+                        if info.filename in expected:
+                            found.append(check_member(info.filename, actual, expected[info.filename]))
+                    return found
+                #
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    for found in pool.map(check_zip_run, split_in_runs(infos, max_workers)):
+                        problems.extend(problem for problem in found if problem)
+                seen.update(info.filename for info in infos)
+        elif report.archive_format == "tar":
+            with tarfile.open(report.file_path, 'r:') as tar:
+                members = [member for member in tar.getmembers() if member.isfile()]
+                # Only headers are read here; the data is skipped over.
+            #
+            def check_tar_run(run):
+                # Check one run of tar members through a private file handle.
+                found = []
+                with open(report.file_path, 'rb') as f:
+                    for member in run:
+                        if member.name in expected:
+                            f.seek(member.offset_data)
+                            found.append(check_member(member.name, read_member_checksum(LimitedReader(f, member.size)),
+                                                      expected[member.name]))
+                return found
+            #
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for found in pool.map(check_tar_run, split_in_runs(members, max_workers)):
+                    problems.extend(problem for problem in found if problem)
+            seen.update(member.name for member in members)
+        else:
+            with tarfile.open(report.file_path, 'r|*') as tar:
+                # A compressed stream is decompressed once, from start to end.
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    seen.add(member.name)
+                    problem = check_member(member.name, read_member_checksum(tar.extractfile(member)),
+                                           expected[member.name]) if member.name in expected else None
+                    if problem:
+                        problems.append(problem)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, lzma.LZMAError, zlib.error, OSError) as e:
+        return problems + [f"Archive cannot be read: {e}"]
+    problems.extend(f"{name}: missing from the archive" for name in expected if name not in seen)
+    return problems
+#
+#
+STORE_CHUNK_SIZE = 4 * 1024 * 1024
+# Files are split into chunks of this size; identical chunks are stored once.
+#
+#
+class BackupStore:
+    # A content-addressed backup store: a folder holding 'chunks/', where each
+    # chunk is saved once under its SHA-256, and 'runs/', where each backup run
+    # writes a manifest listing every file with its chunks. A run's manifest
+    # plus the chunks it names is enough to restore that run on its own.
+    #
+    def __init__(self, root):
+        # Open (or create) the store at 'root'.
+        #
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.runs_dir = os.path.join(root, "runs")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.runs_dir, exist_ok=True)
+    #
+    #
+    def chunk_path(self, digest):
+        # Chunks are fanned out over 256 folders by the first two hex digits.
+        #
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+    #
+    #
+    def put_chunk(self, data, compress, level):
+        # Save a chunk unless the store already has it. Returns its digest and
+        # the number of bytes newly written.
+        #
+        digest = hashlib.sha256(data).hexdigest()
+        # hashlib releases the GIL while hashing large buffers.
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+            # Deduplicated: this content is already stored.
+        payload = b"Z" + zlib.compress(data, level) if compress else b"S" + data
+        # The first byte records whether the chunk is deflated or stored.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+        # A chunk appears complete or not at all.
+        return digest, len(payload)
+    #
+    #
+    def get_chunk(self, digest):
+        # Read a chunk back, checking that its content still matches its name.
+        #
+        with open(self.chunk_path(digest), 'rb') as f:
+            payload = f.read()
+        data = zlib.decompress(payload[1:]) if payload[:1] == b"Z" else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise OSError(errno.EIO, "Chunk is corrupt", self.chunk_path(digest))
+        return data
+    #
+    #
+    def save_run(self, manifest):
+        # Write a run's manifest atomically and return its path.
+        #
+        run_path = os.path.join(self.runs_dir, manifest["created"] + ".json")
+        temp_path = run_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, run_path)
+        # The run only exists once all its chunks do.
+        return run_path
+    #
+    #
+    def latest_run(self, source_path):
+        # Return the newest run manifest for 'source_path', or None.
+        #
+        for name in sorted(os.listdir(self.runs_dir), reverse=True):
+            # Run names are timestamps, so they sort by age.
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.runs_dir, name), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("source") == source_path:
+                return manifest
+        return None
+#
+#
+def create_incremental_backup(source_path, policy, store_root=None, on_member=None):
+    # Back up a file or folder into an incremental store (by default
+    # '<name>_backups' next to it). Files whose size, modification time and
+    # inode match the previous run are not read at all; everything else is
+    # chunked and only chunks the store lacks are written. Returns a BackupReport.
+    #
+    report = BackupReport()
+    started = time.perf_counter()
+    source_path = os.path.abspath(source_path)
+    if store_root and store_root.strip()[:1] in ("|", "-"):
+        raise ValueError("An incremental backup needs a folder to keep its store in")
+    name = os.path.splitext(os.path.basename(source_path))[0] if os.path.isfile(source_path) else os.path.basename(source_path)
+    store = BackupStore(store_root.strip() if store_root and store_root.strip()
+                        else os.path.join(os.path.dirname(source_path), f"{name}_backups"))
+    previous = (store.latest_run(source_path) or {}).get("files", {})
+    # What the last run recorded, to recognise unchanged files.
+    files = {}
+    # This run's complete listing: member name -> size, time, inode, mode and chunks.
+    for file_path, archive_name in backup_members(source_path):
+        st = os.stat(file_path)
+        old = previous.get(archive_name)
+        if (old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns and old["inode"] == st.st_ino
+                and all(os.path.exists(store.chunk_path(digest)) for digest, _ in old["chunks"])):
+            chunks = old["chunks"]
+            # Unchanged: reuse the previous run's chunks without reading the file.
+            report.unchanged_files += 1
+        else:
+            compress = policy.choose(file_path, st.st_size) == zipfile.ZIP_DEFLATED
+            # Compress chunks of compressible types only.
+            chunks = []
+            member_started = time.perf_counter()
+            with open(file_path, 'rb') as f:
+                while True:
+                    data = f.read(STORE_CHUNK_SIZE)
+                    if not data:
+                        break
+                    digest, written = store.put_chunk(data, compress, policy.level)
+                    chunks.append([digest, len(data)])
+                    report.bytes_out += written
+            if compress:
+                report.deflate_bytes += st.st_size
+                report.deflate_seconds += time.perf_counter() - member_started
+            else:
+                report.stored_files += 1
+                report.stored_bytes += st.st_size
+        files[archive_name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino,
+                               "mode": stat.S_IMODE(st.st_mode), "chunks": chunks}
+        report.files += 1
+        report.bytes_in += st.st_size
+        if on_member:
+            on_member(report)
+    created = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+    report.file_path = store.save_run({"source": source_path, "created": created, "files": files})
+    report.archive_path = report.file_path
+    report.archive_format = "incremental"
+    report.seconds = time.perf_counter() - started
+    return report
+#
+#
+def load_backup_run(run_path):
+    # Open the store a run manifest belongs to and load the manifest.
+    #
+    with open(run_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return BackupStore(os.path.dirname(os.path.dirname(os.path.abspath(run_path)))), manifest
+#
+#
+def verify_backup_run(run_path, max_workers=None):
+    # Check that every chunk a run needs is present and uncorrupted, and that
+    # each file's chunks add up to its size. Chunks are checked in parallel.
+    # Returns a list of problems, empty if the run can be restored.
+    #
+    store, manifest = load_backup_run(run_path)
+    problems = [f"{name}: chunks add up to {sum(length for _, length in entry['chunks'])} bytes, "
+                f"{entry['size']} backed up"
+                for name, entry in manifest["files"].items()
+                if sum(length for _, length in entry["chunks"]) != entry["size"]]
+    digests = sorted({digest for entry in manifest["files"].values() for digest, _ in entry["chunks"]})
+    # Each distinct chunk is checked once, in name order.
+    #
+    def check_chunks(run):
+        # Read and hash one run of chunks.
+        found = []
+        for digest in run:
+            try:
+                store.get_chunk(digest)
+            except (OSError, zlib.error) as e:
+                found.append(f"chunk {digest[:12]}: {e}")
+        return found
+    #
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for found in pool.map(check_chunks, split_in_runs(digests, max_workers * 4)):
+            problems.extend(found)
+    return problems
+#
+#
+def restore_backup_run(run_path, destination):
+    # Rebuild every file of one run under 'destination', with its original
+    # modification time and permissions. Returns the number of files restored.
+    #
+    store, manifest = load_backup_run(run_path)
+    for name, entry in manifest["files"].items():
+        target = os.path.join(destination, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = target + ".restoring"
+        with open(temp_path, 'wb') as f:
+            for digest, _ in entry["chunks"]:
+                f.write(store.get_chunk(digest))
+        os.chmod(temp_path, entry["mode"])
+        os.utime(temp_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        os.replace(temp_path, target)
+        # A restored file appears complete or not at all.
+    return len(manifest["files"])
+#
+#
+PACK_NAME = ".file-organizer-pack.zip"
+# The archive small files are packed into, inside each '<EXT> Files' folder.
+PACK_INDEX_NAME = ".file-organizer-pack.json"
+# Its index, which says where each member's data starts.
+ZIP_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+# The fixed part of the ZIP header in front of every member's data.
+#
+#
+def is_pack_file(name):
+    # Whether a file name belongs to a pack (the archive, its index or their temporary files).
+    #
+    return name.startswith(".file-organizer-pack.")
+#
+#
+def pack_candidates(folder_path, max_size, min_age, now=None):
+    # The files in a folder that are small and old enough to be packed, as
+    # (name, stat) pairs in inode order, so they are read with little seeking.
+    #
+    cutoff = (now or time.time()) - min_age
+    candidates = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if is_pack_file(entry.name) or not entry.is_file(follow_symlinks=False):
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if st.st_size <= max_size and st.st_mtime <= cutoff:
+                candidates.append((entry.name, st))
+    return sorted(candidates, key=lambda candidate: candidate[1].st_ino)
+#
+#
+def file_crc32(file_path):
+    # The CRC-32 of a file's content, as ZIP records it.
+    #
+    crc = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(BACKUP_BUFFER_SIZE), b""):
+            crc = zlib.crc32(block, crc)
+    return crc
+#
+#
+class SmallFilePack:
+    # The pack of one '<EXT> Files' folder: a ZIP archive holding small files
+    # that were moved out of the folder, plus a JSON index of its members. The
+    # index keeps each member's data offset, sizes, CRC-32, permissions and exact
+    # modification time, so one member is listed or read with a single seek and
+    # without parsing the archive's central directory. Members are only ever
+    # appended, so offsets stay valid, and the archive opens in any ZIP tool.
+    #
+    def __init__(self, folder_path):
+        # Open the pack of 'folder_path'; it is created by the first add().
+        #
+        self.folder_path = folder_path
+        self.archive_path = os.path.join(folder_path, PACK_NAME)
+        self.index_path = os.path.join(folder_path, PACK_INDEX_NAME)
+        self.members = self.load_index()
+        # Member name -> index entry.
+    #
+    #
+    def load_index(self):
+        # Read the index, or start an empty one.
+        #
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return json.load(f)["members"]
+        except FileNotFoundError:
+            return {}
+    #
+    #
+    def save_index(self):
+        # Write the index atomically and flush it to disk.
+        #
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"archive": PACK_NAME, "members": self.members}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.index_path)
+    #
+    #
+    def add(self, candidates, policy, should_continue=lambda: True):
+        # Append files to the archive and index them. The originals are left in
+        # place for the caller to remove once this returns. A file whose name is
+        # taken by a different packed file is packed under a numbered name
+        # ('app_1.log'). Returns the packed files as name -> (member name, stat).
+        #
+        packed = {}
+        with zipfile.ZipFile(self.archive_path, 'a', zipfile.ZIP_DEFLATED, allowZip64=True,
+                             compresslevel=policy.level or None, strict_timestamps=False) as zipf:
+            # ZIP dates start in 1980; older files get that date in the archive,
+            # while the index keeps their exact modification time.
+            for name, st in candidates:
+                if not should_continue():
+                    break
+                file_path = os.path.join(self.folder_path, name)
+                base, extension = os.path.splitext(name)
+                for counter in itertools.count():
+                    member_name = f"{base}_{counter}{extension}" if counter else name
+                    info = zipf.NameToInfo.get(member_name)
+                    if info is None:
+                        zipf.write(file_path, member_name, compress_type=policy.choose(file_path, st.st_size))
+                        break
+                    if (info.file_size, info.CRC) == (st.st_size, file_crc32(file_path)):
+                        break
+                        # The same content: extracted earlier, or packed by a run that was
+                        # interrupted before its index was saved.
+                packed[name] = (member_name, st)
+        with open(self.archive_path, 'rb') as f:
+            os.fsync(f.fileno())
+            # The members must be on disk before their originals are removed.
+            with zipfile.ZipFile(f) as zipf:
+                for member_name, st in packed.values():
+                    info = zipf.getinfo(member_name)
+                    f.seek(info.header_offset)
+                    header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+                    self.members[member_name] = {
+                        "offset": info.header_offset + ZIP_LOCAL_HEADER.size + header[-2] + header[-1],
+                        # The data follows the header, the member's name and its extra field.
+                        "compressed_size": info.compress_size,
+                        "size": info.file_size,
+                        "crc": info.CRC,
+                        "deflated": info.compress_type == zipfile.ZIP_DEFLATED,
+                        "mode": stat.S_IMODE(st.st_mode),
+                        "mtime_ns": st.st_mtime_ns,
+                    }
+        self.save_index()
+        return packed
+    #
+    #
+    def read(self, name):
+        # Return one member's content, checking its CRC-32.
+        #
+        entry = self.members.get(name)
+        if entry is None:
+            raise FileNotFoundError(errno.ENOENT, "Not in the pack", name)
+        with open(self.archive_path, 'rb') as f:
+            f.seek(entry["offset"])
+            data = f.read(entry["compressed_size"])
+        if entry["deflated"]:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+            # ZIP members are raw deflate streams, without a zlib header.
+        if len(data) != entry["size"] or zlib.crc32(data) != entry["crc"]:
+            raise OSError(errno.EIO, "Packed member is corrupt", name)
+        return data
+    #
+    #
+    def extract(self, name, destination=None, filename=None):
+        # Write one member back out as a file (by default into the pack's folder,
+        # under its own name), with its original permissions and modification
+        # time. An existing file is never overwritten. Returns the path written.
+        #
+        data = self.read(name)
+        target = os.path.join(destination or self.folder_path, filename or name)
+        with open(target, 'xb') as f:
+            f.write(data)
+        os.chmod(target, self.members[name]["mode"])
+        os.utime(target, ns=(self.members[name]["mtime_ns"], self.members[name]["mtime_ns"]))
+        return target
+    #
+    #
+    def unpack(self, should_continue=lambda: True):
+        # Extract every member into the pack's folder and delete the pack once it
+        # is empty. A member whose name is taken by another file gets a number
+        # ('app_1.log'). Members that fail stay in the pack and its index, so a
+        # later run neither loses nor duplicates them. Returns the number of
+        # files extracted and an error report.
+        #
+        extracted = 0
+        errors = []
+        for name in sorted(self.members):
+            if not should_continue():
+                break
+            base, extension = os.path.splitext(name)
+            for counter in itertools.count():
+                try:
+                    self.extract(name, filename=f"{base}_{counter}{extension}" if counter else name)
+                except FileExistsError:
+                    continue
+                    # Try the next number.
+                except (OSError, zlib.error) as e:
+                    errors.append(error_entry(os.path.join(self.folder_path, name), "unpack", e))
+                else:
+                    del self.members[name]
+                    extracted += 1
+                break
+        if self.members:
+            self.save_index()
+            # Only what is still packed.
+            return extracted, errors
+        for path in (self.index_path, self.archive_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return extracted, errors
+#
+#
+def pack_small_files(root, max_size, min_age, policy=None, should_continue=lambda: True, on_status=None):
+    # Pack the files of at most 'max_size' bytes not modified for 'min_age'
+    # seconds in each of the root's '<EXT> Files' folders into the folder's pack,
+    # then remove the originals. A file that changed while it was being packed
+    # is kept. Returns the number of files and bytes packed and an error report.
+    #
+    policy = policy or CompressionPolicy()
+    packed_files = packed_bytes = 0
+    errors = []
+    with os.scandir(root) as entries:
+        folder_paths = sorted(entry.path for entry in entries
+                              if entry.is_dir(follow_symlinks=False) and is_extension_folder(entry.name))
+    for folder_path in folder_paths:
+        if not should_continue():
+            break
+        candidates = pack_candidates(folder_path, max_size, min_age)
+        if not candidates:
+            continue
+        if on_status:
+            on_status(f"Packing {len(candidates)} small file(s) in '{os.path.basename(folder_path)}'...")
+        pack = SmallFilePack(folder_path)
+        try:
+            packed = pack.add(candidates, policy, should_continue)
+        except (OSError, zipfile.BadZipFile) as e:
+            errors.append(error_entry(pack.archive_path, "pack", e))
+            continue
+            # Every original is still in place.
+        for name, (_, st) in packed.items():
+            file_path = os.path.join(folder_path, name)
+            try:
+                current = os.stat(file_path)
+                if (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                    raise OSError(errno.EBUSY, "Changed while it was being packed, so it was kept")
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+                # Removed by someone else; the pack has it.
+            except OSError as e:
+                errors.append(error_entry(file_path, "pack", e))
+                continue
+            packed_files += 1
+            packed_bytes += st.st_size
+    return packed_files, packed_bytes, errors
+#
+#
+class ScanStatistics:
+    # Statistics gathered while a folder is scanned, one file at a time, so they
+    # are ready (and can be shown live) without going over the files again:
+    # files and bytes per extension and per destination folder, a size
+    # histogram and an age histogram. Updates are thread-safe.
+    #
+    SIZE_LIMITS = [1, 1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3]
+    SIZE_LABELS = ["empty", "< 1 KB", "< 10 KB", "< 100 KB", "< 1 MB", "< 10 MB", "< 100 MB", "< 1 GB", ">= 1 GB"]
+    # The size histogram's buckets.
+    AGE_LIMITS = [86400, 7 * 86400, 30 * 86400, 365 * 86400, 5 * 365 * 86400]
+    AGE_LABELS = ["< 1 day", "< 1 week", "< 1 month", "< 1 year", "< 5 years", "older"]
+    # The age histogram's buckets, by time since the last modification.
+    #
+    #
+    def __init__(self):
+        # Start with empty totals.
+        #
+        self.now = time.time()
+        # Ages are measured from the start of the scan.
+        self.files = 0
+        self.bytes = 0
+        # All files scanned, and their combined size.
+        self.extensions = {}
+        # Extension -> [files, bytes]; '' collects files without a type.
+        self.groups = {}
+        # Destination folder -> [files, bytes], before the minimum file count.
+        self.sizes = [0] * len(self.SIZE_LABELS)
+        self.ages = [0] * len(self.AGE_LABELS)
+        # The histograms.
+        self.exif_applied = False
+        # Whether photos have been moved to the folders of their EXIF dates.
+        self.lock = threading.Lock()
+        # Scanning threads update the totals one at a time.
+    #
+    #
+    def update(self, extension, group, st, sign):
+        # Count (sign 1) or uncount (sign -1) one file.
+        #
+        with self.lock:
+            self.files += sign
+            self.bytes += sign * st.st_size
+            for key, table in ((extension, self.extensions), (group, self.groups)):
+                if key is None:
+                    continue
+                totals = table.setdefault(key, [0, 0])
+                totals[0] += sign
+                totals[1] += sign * st.st_size
+                if not totals[0]:
+                    del table[key]
+            self.sizes[bisect.bisect_right(self.SIZE_LIMITS, st.st_size)] += sign
+            self.ages[bisect.bisect_right(self.AGE_LIMITS, max(0, self.now - st.st_mtime))] += sign
+    #
+    #
+    def add(self, extension, group, st):
+        # Count a scanned file.
+        #
+        self.update(extension, group, st, 1)
+    #
+    #
+    def move(self, old, new, st):
+        # Move a file from one (extension, group) to another, e.g. after its
+        # content showed it is really a JPEG.
+        #
+        self.update(*old, st, -1)
+        self.update(*new, st, 1)
+    #
+    #
+    def snapshot(self):
+        # Return a copy of the totals that the GUI can read while scanning goes on.
+        #
+        with self.lock:
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "extensions": {key: tuple(totals) for key, totals in self.extensions.items()},
+                "groups": {key: tuple(totals) for key, totals in self.groups.items()},
+                "sizes": list(self.sizes),
+                "ages": list(self.ages),
+            }
+#
+#
+def format_size(byte_count):
+    # Return a size in the largest unit that keeps it above 1, e.g. '3.2 GB'.
+    #
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(byte_count) < 1024:
+            return f"{byte_count:.0f} {unit}" if unit == "B" else f"{byte_count:.1f} {unit}"
+        byte_count /= 1024
+    return f"{byte_count:.1f} TB"
+#
+#
+def format_statistics(snapshot, min_files_count):
+    # Turn a ScanStatistics snapshot into the text of the Statistics tab.
+    #
+    def bar(count, largest, width=30):
+        # A text bar proportional to 'count'.
+        return "#" * (round(width * count / largest) if largest else 0)
+    #
+    lines = [f"{snapshot['files']} file(s), {format_size(snapshot['bytes'])}", ""]
+    lines.append("Bytes per extension:")
+    for extension, (files, byte_count) in sorted(snapshot["extensions"].items(), key=lambda item: -item[1][1]):
+        lines.append(f"  {(extension.upper() or '(none)'):<10} {files:>9} file(s) {format_size(byte_count):>10}")
+    for title, labels, counts in (("File sizes:", ScanStatistics.SIZE_LABELS, snapshot["sizes"]),
+                                  ("Last modified:", ScanStatistics.AGE_LABELS, snapshot["ages"])):
+        lines += ["", title]
+        lines += [f"  {label:<10} {count:>9}  {bar(count, max(counts))}" for label, count in zip(labels, counts)]
+    lines += ["", f"Projected folders (at least {min_files_count} file(s)):"]
+    for group, (files, byte_count) in sorted(snapshot["groups"].items(), key=lambda item: -item[1][1]):
+        if files >= min_files_count:
+            lines.append(f"  {group:<20} {files:>9} file(s) {format_size(byte_count):>10}")
+    return "\n".join(lines)
+#
+#
+PLANNED_FILE_BYTES = 700
+# A rough in-memory cost of one scanned file: its directory entry, stat result,
+# name and its places in the grouping dictionaries.
+SPILL_BATCH_SIZE = 50000
+# The most files scanned, grouped or moved at a time once a plan is on disk.
+#
+#
+class PlannedFile:
+    # The part of a stat result the moves need, for files read back from a SpilledPlan.
+    #
+    __slots__ = ("st_size",)
+    #
+    def __init__(self, st_size):
+        self.st_size = st_size
+#
+#
+class SpilledPlan:
+    # Grouped scan results kept in a temporary SQLite database instead of in
+    # memory, for folders whose scan would not fit in the memory budget. SQLite
+    # sorts and counts on disk, so only one batch of files is in memory at a time.
+    #
+    def __init__(self):
+        # Create an empty store in the temporary folder.
+        #
+        handle, self.path = tempfile.mkstemp(prefix="organizer-plan-", suffix=".sqlite")
+        os.close(handle)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        # The preview scans in one thread and reads the plan in another.
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        # A scratch file: nothing to recover if the process dies.
+        self.db.execute("CREATE TABLE files (folder TEXT, name TEXT, size INTEGER, inode INTEGER)")
+        self.indexed = False
+    #
+    #
+    def add(self, groups, file_stats):
+        # Store a batch of grouped files with the sizes and inodes from their stat results.
+        #
+        self.db.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", (
+            (folder, name, file_stats[name].st_size, file_stats[name].st_ino)
+            for folder, names in groups.items() for name in names))
+        self.indexed = False
+    #
+    #
+    def index(self):
+        # Index the files by folder once all batches are in, rather than on every insert.
+        #
+        if not self.indexed:
+            self.db.execute("CREATE INDEX IF NOT EXISTS by_folder ON files (folder, name)")
+            self.indexed = True
+    #
+    #
+    def folder_counts(self):
+        # Each folder's file count and total size: {folder: (count, size)}.
+        #
+        self.index()
+        return {folder: (count, size) for folder, count, size in
+                self.db.execute("SELECT folder, COUNT(*), SUM(size) FROM files GROUP BY folder")}
+    #
+    #
+    def files(self, folder):
+        # The names of a folder's files, in name order, for the preview.
+        #
+        self.index()
+        for (name,) in self.db.execute("SELECT name FROM files WHERE folder = ? ORDER BY name", (folder,)):
+            yield name
+    #
+    #
+    def moves(self, folder):
+        # A folder's files as (name, size), in inode order for the moves.
+        #
+        self.index()
+        yield from self.db.execute("SELECT name, size FROM files WHERE folder = ? ORDER BY inode", (folder,))
+    #
+    #
+    def close(self):
+        # Delete the store.
+        #
+        self.db.close()
+        os.remove(self.path)
+    #
+    #
+    def __enter__(self):
+        return self
+    #
+    def __exit__(self, *exc_info):
+        self.close()
+#
+#
+def plan_preview_lines(root_name, counts, files_of, min_files):
+    # The preview tree, one line at a time, so it can be cut short or written
+    # to a file without building one huge string. 'counts' maps each folder to
+    # its file count and 'files_of(folder)' yields the folder's files in order.
+    #
+    yield f"📁 {root_name}"
+    folders = sorted(counts)
+    # Sort the folders for a consistent and readable preview.
+    for i, folder_name in enumerate(folders):
+        is_last_folder = i == len(folders) - 1
+        # The last folder is drawn with a corner and no line below it.
+        folder_prefix = "└── " if is_last_folder else "├── "
+        if counts[folder_name] < min_files:
+            yield f"{folder_prefix} 🚫 Skipping '{folder_name}' ({counts[folder_name]} file(s), less than min {min_files})"
+            continue
+        yield f"{folder_prefix}📂 {folder_name}"
+        indent = "    " if is_last_folder else "│   "
+        for j, filename in enumerate(files_of(folder_name)):
+            yield f"{indent}{'└── ' if j == counts[folder_name] - 1 else '├── '}{filename}"
+#
+#
+class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    # The memory figures Windows' GetProcessMemoryInfo fills in.
+    #
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+        (name, ctypes.c_size_t) for name in (
+            "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+            "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+#
+#
+def peak_memory_usage():
+    # The most memory this process has held in RAM so far (its peak resident
+    # set size), in bytes, or None where it can't be read.
+    #
+    if sys.platform == "win32":
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                    ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+        return None
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+    # macOS reports bytes, Linux kilobytes.
+#
+#
+def error_entry(path, operation, error):
+    # Describe a failed file operation for the structured error report.
+    #
+    return {
+        "path": path,
+        # The file that failed.
+        "operation": operation,
+        # What was being done to it, e.g. 'move' or 'create folder'.
+        "errno": getattr(error, "errno", None),
+        # The operating system error code, if there is one.
+        "error": str(error),
+        # The error message.
+        "attempts": getattr(error, "retry_attempts", 1),
+        # How many times the operation was tried.
+    }
+#
+#
+def shard_of(filename, shard_count):
+    # Return the shard a file name belongs to. CRC-32 rather than hash(), so
+    # every process agrees on it.
+    #
+    return zlib.crc32(filename.encode("utf-8", "surrogateescape")) % shard_count
+#
+#
+def classify_shard(folder_path, filenames, options):
+    # Runs in a shard process: stat, sniff and group one shard's files exactly
+    # as a single-threaded scan would. Returns {subfolder: [(filename, size, inode)]}.
+    #
+    detect_content, organize_by, use_exif_date = options
+    worker = OrganizerEngine(folder_path, detect_content=detect_content, organize_by=organize_by,
+                             use_exif_date=use_exif_date)
+    # The engine's grouping logic, without Qt.
+    for filename in filenames:
+        try:
+            worker.file_stats[filename] = os.stat(os.path.join(folder_path, filename))
+        except OSError:
+            pass
+            # Removed since the folder was listed.
+    groups = worker.group_files(worker.group_by_extension(
+        folder_path, [filename for filename in filenames if filename in worker.file_stats]))
+    if worker.sniffer:
+        worker.sniffer.save_cache()
+        # Merged with the other shards' results, not written over them.
+    return {
+        subfolder_name: [(filename, worker.file_stats[filename].st_size, worker.file_stats[filename].st_ino)
+                         for filename in files]
+        for subfolder_name, files in groups.items()
+    }
+#
+#
+def move_shard(folder_path, moves, retry_policy, durable, max_ops_per_second, max_bytes_per_second,
+               progress_queue, cancel_event, resume_event):
+    # Runs in a shard process: move one shard's files to the destinations the
+    # coordinator picked, sending (files, bytes) progress about ten times a
+    # second. Returns the number of files moved and the shard's error report.
+    #
+    ops_bucket = TokenBucket(max_ops_per_second)
+    bytes_bucket = TokenBucket(max_bytes_per_second, capacity=max(max_bytes_per_second, COPY_CHUNK_SIZE))
+    # This shard's share of the rate limits.
+    keep_going = lambda: not cancel_event.is_set()
+    moved = 0
+    errors = []
+    pending = [0, 0]
+    # Files and bytes not yet sent to the coordinator.
+    current = [0]
+    # Bytes of the current file already counted by chunk callbacks.
+    last_sent = time.monotonic()
+    #
+    def wait_while_paused():
+        # Hold while the run is paused (the coordinator clears 'resume_event'); a cancel ends the wait.
+        while not resume_event.wait(0.25) and keep_going():
+            pass
+    #
+    def chunk_copied(byte_count):
+        # Count a copied chunk, respect the bandwidth limit, and pause or stop between chunks.
+        current[0] += byte_count
+        pending[1] += byte_count
+        bytes_bucket.consume(byte_count, keep_going)
+        wait_while_paused()
+        if not keep_going():
+            raise MoveCancelled()
+    #
+    def restart_file():
+        # A retry starts the copy over, so take back the failed attempt's bytes.
+        pending[1] -= current[0]
+        current[0] = 0
+    #
+    for filename, dest_path, size in moves:
+        wait_while_paused()
+        if not keep_going():
+            break
+        ops_bucket.consume(1, keep_going)
+        source_path = os.path.join(folder_path, filename)
+        current[0] = 0
+        try:
+            move_file_retrying(source_path, dest_path, retry_policy, chunk_copied, durable, restart_file, keep_going)
+            moved += 1
+        except MoveCancelled:
+            pending[1] -= current[0]
+            break
+            # The partial copy is gone and the file is still in place.
+        except FileNotFoundError as e:
+            if os.path.lexists(source_path):
+                errors.append(error_entry(source_path, "move", e))
+            # Otherwise the file was removed since the scan: nothing to move.
+        except Exception as e:
+            errors.append(error_entry(source_path, "move", e))
+            if not retry_policy.continue_on_error:
+                cancel_event.set()
+                # Stop every shard, as the single-threaded run would stop.
+        pending[0] += 1
+        pending[1] += max(0, size - current[0])
+        # Count the rest of the file's size, which a rename never reported in chunks.
+        if time.monotonic() - last_sent >= 0.1:
+            progress_queue.put(tuple(pending))
+            pending[:] = [0, 0]
+            last_sent = time.monotonic()
+    progress_queue.put(tuple(pending))
+    # Send whatever is left.
+    return moved, errors
+#
+#
+#
+#
+class Metric:
+    # One metric family in the Prometheus text format: a counter, a gauge or a
+    # histogram, with an optional set of label names. Safe to update from any thread.
+    #
+    def __init__(self, name, help_text, kind, label_names=(), buckets=None):
+        # 'buckets' are a histogram's upper bounds, in increasing order.
+        #
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets or ())
+        self.lock = threading.Lock()
+        self.values = {}
+        # Label values -> number, or for a histogram [bucket counts..., sum, count].
+        if not self.label_names:
+            self.values[()] = self.empty()
+            # An unlabelled metric is reported as zero before anything happens.
+    #
+    #
+    def empty(self):
+        # The starting value of one labelled series.
+        #
+        return [0] * len(self.buckets) + [0.0, 0] if self.kind == "histogram" else 0
+    #
+    #
+    def key(self, labels):
+        # The series' label values, in the declared order.
+        #
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+    #
+    #
+    def inc(self, amount=1, **labels):
+        # Add to a counter or gauge.
+        #
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    #
+    #
+    def set(self, value, **labels):
+        # Set a gauge.
+        #
+        with self.lock:
+            self.values[self.key(labels)] = value
+    #
+    #
+    def observe(self, value, **labels):
+        # Count one observation in a histogram.
+        #
+        key = self.key(labels)
+        with self.lock:
+            series = self.values.setdefault(key, self.empty())
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+                # Only the bucket the value falls in; the output adds them up.
+            series[-2] += value
+            series[-1] += 1
+    #
+    #
+    def render_lines(self):
+        # The metric's lines in the Prometheus text exposition format.
+        #
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            values = {key: list(value) if isinstance(value, list) else value for key, value in self.values.items()}
+        for key, value in sorted(values.items()):
+            labels = [f'{name}="{escape_label(label)}"' for name, label in zip(self.label_names, key)]
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{format_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets, value):
+                cumulative += count
+                # Buckets are cumulative in the output.
+                bucket_labels = format_labels(labels + ['le="%s"' % bound])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_labels(labels + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{bucket_labels} {value[-1]}")
+            # The +Inf bucket holds every observation.
+            lines.append(f"{self.name}_sum{format_labels(labels)} {value[-2]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {value[-1]}")
+        return lines
+#
+#
+def escape_label(value):
+    # Escape a label value as the text format requires.
+    #
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+#
+#
+def format_labels(labels):
+    # '{a="1",b="2"}', or nothing for an unlabelled series.
+    #
+    return "{" + ",".join(labels) + "}" if labels else ""
+#
+#
+class MetricsRegistry:
+    # The metrics a process exposes, rendered together for a scrape.
+    #
+    def __init__(self):
+        # Start with no metrics.
+        #
+        self.metrics = []
+    #
+    #
+    def add(self, name, help_text, kind, label_names=(), buckets=None):
+        # Register and return a new metric.
+        #
+        metric = Metric(name, help_text, kind, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+    #
+    #
+    def render(self):
+        # Every metric, as the body of a /metrics response or a .prom file.
+        #
+        return "\n".join(line for metric in self.metrics for line in metric.render_lines()) + "\n"
+#
+#
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seconds, from a local rename to a large copy over the network.
+SCAN_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+# Seconds for a whole folder scan.
+METRICS = MetricsRegistry()
+# This process's metrics, served by serve_metrics() or written by write_metrics_textfile().
+FILES_MOVED = METRICS.add("organizer_files_moved_total", "Files moved into their folders.", "counter")
+BYTES_MOVED = METRICS.add("organizer_bytes_moved_total", "Bytes of the files moved into their folders.", "counter")
+SCAN_DURATION = METRICS.add("organizer_scan_duration_seconds", "Time taken to scan a folder.", "histogram",
+                            buckets=SCAN_BUCKETS)
+QUEUE_DEPTH = METRICS.add("organizer_queue_depth", "Planned moves not yet done in the current run.", "gauge")
+ERRORS = METRICS.add("organizer_errors_total", "Failed file operations.", "counter", ("operation", "errno"))
+OPERATION_LATENCY = METRICS.add("organizer_operation_duration_seconds", "Latency of single file operations.",
+                                "histogram", ("operation",), LATENCY_BUCKETS)
+RUNS = METRICS.add("organizer_runs_total", "Scheduled runs by result.", "counter", ("result",))
+PEAK_MEMORY = METRICS.add("organizer_peak_memory_bytes", "Peak resident memory of this process.", "gauge")
+COALESCED_TRIGGERS = METRICS.add("organizer_coalesced_triggers_total",
+                                 "Scheduled triggers folded into a run that was already queued.", "counter")
+#
+#
+def count_error(entry):
+    # Count an error report entry by operation and errno name (e.g. 'EACCES').
+    #
+    code = entry.get("errno")
+    ERRORS.inc(operation=entry["operation"], errno=errno.errorcode.get(code, str(code)) if code else "none")
+#
+#
+def serve_metrics(address, registry=METRICS):
+    # Serve 'registry' at http://<address>/metrics from a background thread.
+    # 'address' is a port, or 'host:port'; the host defaults to localhost so
+    # the metrics are not exposed to the network by accident.
+    #
+    host, _, port = str(address).rpartition(":")
+    #
+    class MetricsHandler(BaseHTTPRequestHandler):
+        # Answers GET /metrics with the current values.
+        #
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        #
+        def log_message(self, *args):
+            pass
+            # Scrapes every few seconds would flood the log.
+    #
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+#
+#
+def write_metrics_textfile(path, registry=METRICS):
+    # Write 'registry' to a .prom file for node_exporter's textfile collector,
+    # atomically so the collector never reads half a file.
+    #
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(temp_path, path)
+#
+#
+class CronSchedule:
+    # A five-field cron expression ("minute hour day month weekday", e.g.
+    # "*/15 * * * *" or "0 3 * * 1-5") or one of the @hourly/@daily/@weekly/
+    # @monthly shorthands. Weekdays run 0-6 from Sunday.
+    #
+    ALIASES = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *"}
+    # The shorthands cron itself accepts.
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+    # The allowed values of each field, in order.
+    #
+    def __init__(self, expression):
+        # Parse 'expression', raising ValueError if it is malformed.
+        #
+        self.expression = expression
+        fields = self.ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected five fields in schedule '{expression}'")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self.parse_field(field, low, high) for field, (low, high) in zip(fields, self.RANGES))
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        # As in cron, if both day fields are restricted, matching either is enough.
+    #
+    #
+    @staticmethod
+    def parse_field(field, low, high):
+        # Expand one field ("*", "5", "1-5", "*/10", "0-30/5", "1,15") into its values.
+        #
+        values = set()
+        for part in field.split(","):
+            range_part, _, step = part.partition("/")
+            try:
+                if range_part == "*":
+                    start, end = low, high
+                elif "-" in range_part:
+                    start, end = (int(value) for value in range_part.split("-", 1))
+                else:
+                    start = int(range_part)
+                    end = high if step else start
+                    # "5/15" means every 15 starting at 5.
+                step = int(step) if step else 1
+            except ValueError:
+                raise ValueError(f"Invalid schedule field '{field}'") from None
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Schedule field '{field}' is outside {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+    #
+    #
+    def day_matches(self, when):
+        # Whether the schedule runs at all on the day of 'when'.
+        #
+        day = when.day in self.days
+        weekday = (when.weekday() + 1) % 7 in self.weekdays
+        # Python counts from Monday, cron from Sunday.
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+    #
+    #
+    def next_after(self, when):
+        # The first minute strictly after 'when' that the schedule matches.
+        #
+        when = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = when + timedelta(days=366 * 5)
+        # Long enough for any valid date (February 29th) to come round.
+        while when < limit:
+            if when.month not in self.months:
+                when = (when.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                # Skip to the first day of the next month.
+            elif not self.day_matches(when):
+                when = when.replace(hour=0, minute=0) + timedelta(days=1)
+            elif when.hour not in self.hours:
+                when = when.replace(minute=0) + timedelta(hours=1)
+            elif when.minute not in self.minutes:
+                when += timedelta(minutes=1)
+            else:
+                return when
+        raise ValueError(f"Schedule '{self.expression}' never runs")
+#
+#
+class FolderScanCache:
+    # Remembers each root folder's signature (device, inode, modification and
+    # change times) after a clean run, together with the options that run used.
+    # Adding, removing or renaming an entry in a folder changes its times, so
+    # if the signature still matches, a new run would find nothing to do and
+    # can be skipped after a single stat. Saved as JSON when given a path.
+    #
+    def __init__(self, path=None):
+        # Load the signatures saved at 'path', if any.
+        #
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+    #
+    #
+    @staticmethod
+    def signature(root, options):
+        # What must be unchanged for a run on 'root' to be skippable.
+        #
+        st = os.stat(root)
+        return [st.st_dev, st.st_ino, st.st_mtime_ns, st.st_ctime_ns, json.dumps(options, sort_keys=True, default=str)]
+    #
+    #
+    def unchanged(self, root, options):
+        # Whether 'root' is exactly as the last clean run left it.
+        #
+        with self.lock:
+            remembered = self.entries.get(root)
+        return remembered is not None and remembered == self.signature(root, options)
+    #
+    #
+    def remember(self, root, options):
+        # Record 'root' as organized with 'options'.
+        #
+        signature = self.signature(root, options)
+        with self.lock:
+            self.entries[root] = signature
+            self.save()
+    #
+    #
+    def forget(self, root):
+        # Make the next run on 'root' scan it again.
+        #
+        with self.lock:
+            if self.entries.pop(root, None) is not None:
+                self.save()
+    #
+    #
+    def save(self):
+        # Write the signatures atomically. Called with the lock held.
+        #
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+#
+#
+class ScheduledJob:
+    # One root folder organized on one schedule, with the engine options to use.
+    #
+    def __init__(self, root, schedule, options=None):
+        # 'schedule' is a CronSchedule or a cron expression.
+        #
+        self.root = os.path.abspath(root)
+        self.schedule = schedule if isinstance(schedule, CronSchedule) else CronSchedule(schedule)
+        self.options = dict(options or {})
+        self.next_run = None
+        # Set by the scheduler's first tick.
+        self.coalesced = 0
+        # Triggers folded into an already queued run.
+#
+#
+class OrganizerScheduler:
+    # Runs the organizer engine on each job's schedule, in this process.
+    #
+    # Only one run per root folder happens at a time: a trigger that arrives
+    # while its root is busy queues one follow-up run, and further triggers
+    # fold into that queued run instead of piling up. Runs on different roots
+    # go in parallel. Each run also takes a lock file in 'state_dir', so a
+    # second scheduler (or a leftover cron job using run-once) on the same
+    # machine skips a folder that is already being organized rather than
+    # racing on it. Folders unchanged since their last clean run are skipped
+    # after one stat (see FolderScanCache).
+    #
+    def __init__(self, jobs, state_dir=None, max_concurrent_runs=4, log=print, metrics_textfile=None):
+        # 'log' receives one line per run event; 'metrics_textfile', if set, is
+        # rewritten with the process's metrics after every run.
+        #
+        self.jobs = list(jobs)
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(os.path.join(state_dir, "locks"), exist_ok=True)
+        self.cache = FolderScanCache(os.path.join(state_dir, "scan-cache.json") if state_dir else None)
+        self.log = log
+        self.state_lock = threading.Lock()
+        # Guards 'active' and 'pending'.
+        self.active = set()
+        # Roots with a run in progress.
+        self.pending = {}
+        # Root -> the job to run again once the current run on that root ends.
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrent_runs, thread_name_prefix="scheduled-run")
+        self.stop_event = threading.Event()
+        self.runs = 0
+        self.skipped = 0
+        self.metrics_textfile = metrics_textfile
+    #
+    #
+    def tick(self, now):
+        # Trigger every job due at 'now' and work out when each runs next.
+        # Returns the earliest next run time.
+        #
+        for job in self.jobs:
+            if job.next_run is not None and now >= job.next_run:
+                self.trigger(job)
+            if job.next_run is None or now >= job.next_run:
+                job.next_run = job.schedule.next_after(now)
+                # A run missed while the machine slept fires once, not once per missed minute.
+        return min(job.next_run for job in self.jobs)
+    #
+    #
+    def trigger(self, job):
+        # Start a run of 'job' now, or coalesce it with the run its root already has.
+        # Returns True if a run was started.
+        #
+        with self.state_lock:
+            if job.root in self.active:
+                queued = self.pending.get(job.root)
+                if queued is None:
+                    self.pending[job.root] = job
+                    self.log(f"{job.root}: still running, queued one more run")
+                else:
+                    queued.coalesced += 1
+                    COALESCED_TRIGGERS.inc()
+                    self.log(f"{job.root}: run already queued, trigger coalesced")
+                return False
+            self.active.add(job.root)
+        self.pool.submit(self.run_root, job)
+        return True
+    #
+    #
+    def run_root(self, job):
+        # Run 'job', then any run queued on its root meanwhile, then release the root.
+        #
+        root = job.root
+        while job is not None:
+            try:
+                self.execute(job)
+            except Exception as e:
+                self.cache.forget(root)
+                RUNS.inc(result="failed")
+                self.log(f"{root}: run failed: {e}")
+            if self.metrics_textfile:
+                write_metrics_textfile(self.metrics_textfile)
+            with self.state_lock:
+                job = self.pending.pop(root, None)
+                if job is None:
+                    self.active.discard(root)
+    #
+    #
+    def root_lock_path(self, root):
+        # The lock file other processes check before organizing 'root'.
+        #
+        digest = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.state_dir, "locks", digest + ".lock")
+    #
+    #
+    def execute(self, job):
+        # One run: skip an unchanged folder, otherwise run the engine on it
+        # under the root's lock file. With packing on, an unchanged folder is
+        # still packed, since its files keep getting older.
+        #
+        unchanged = self.cache.unchanged(job.root, job.options)
+        if unchanged and not job.options.get("pack_max_size"):
+            self.skipped += 1
+            RUNS.inc(result="unchanged")
+            self.log(f"{job.root}: unchanged since the last run, skipped")
+            return
+        lock_file = None
+        if self.state_dir and fcntl is not None:
+            lock_file = open(self.root_lock_path(job.root), "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                RUNS.inc(result="busy")
+                self.log(f"{job.root}: being organized by another process, skipped")
+                return
+        try:
+            if unchanged:
+                self.pack_unchanged(job)
+                return
+            outcome = {}
+            engine = OrganizerEngine(job.root, **job.options)
+            engine.finished.connect(lambda message, count: outcome.update(message=message, count=count))
+            engine.error_occurred.connect(lambda message: outcome.update(error=message))
+            started = time.monotonic()
+            engine.run()
+            # The engine runs in this pool thread; its events call back directly.
+            self.runs += 1
+            RUNS.inc(result="failed" if "error" in outcome else "organized")
+            if "error" in outcome or engine.error_report:
+                self.cache.forget(job.root)
+                # Try the folder again in full next time.
+                self.log(f"{job.root}: {outcome.get('error') or outcome.get('message')}")
+            else:
+                self.cache.remember(job.root, job.options)
+                # Taken after the run, so the run's own moves don't count as changes.
+                self.log(f"{job.root}: {outcome.get('message', 'done')} ({time.monotonic() - started:.1f}s)")
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+                # Closing the file releases the lock.
+    #
+    #
+    def pack_unchanged(self, job):
+        # Pack the files of an unchanged folder that have aged past the pack age
+        # since the last run. Packing only touches the '<EXT> Files' folders, so
+        # the root's signature stays valid. Called with the root's lock held.
+        #
+        packed_files, packed_bytes, errors = pack_small_files(job.root, job.options["pack_max_size"],
+                                                              job.options.get("pack_min_age", 0))
+        self.skipped += 1
+        RUNS.inc(result="unchanged")
+        for entry in errors:
+            count_error(entry)
+            self.log(f"{job.root}: {format_error_report([entry])}")
+        self.log(f"{job.root}: unchanged since the last run, packed {packed_files} small file(s) "
+                 f"({format_size(packed_bytes)})")
+    #
+    #
+    def serve_forever(self):
+        # Trigger jobs on schedule until stop() is called.
+        #
+        while not self.stop_event.is_set():
+            next_run = self.tick(datetime.now())
+            self.stop_event.wait(min(60, max(0.5, (next_run - datetime.now()).total_seconds())))
+            # Wake at least every minute, so clock changes are noticed.
+    #
+    #
+    def run_once(self):
+        # Run every job immediately and wait for the runs to end.
+        #
+        for job in self.jobs:
+            self.trigger(job)
+        self.stop()
+    #
+    #
+    def stop(self):
+        # Stop triggering and wait for the runs in progress.
+        #
+        self.stop_event.set()
+        self.pool.shutdown(wait=True)
+#
+#
+HEARTBEAT_INTERVAL = 2.0
+# Seconds between a distributed worker's heartbeats.
+HEARTBEAT_TIMEOUT = 10.0
+# A worker silent for this long is told to cancel its folder; one that does not
+# confirm within the same time again is treated as dead and its folder reassigned.
+WORKER_WAIT_TIMEOUT = 60.0
+# A coordinator left without workers for this long gives up on the remaining folders.
+DISTRIBUTED_OPTIONS = {"min_files_count", "detect_content", "organize_by", "use_exif_date", "durable",
+                       "max_parallel", "memory_budget", "flatten", "pack_max_size", "pack_min_age"}
+# The engine options a coordinator may send to its workers.
+#
+#
+def send_message(connection, message, lock):
+    # Send one message of the distributed protocol: a line of JSON.
+    #
+    data = (json.dumps(message) + "\n").encode("utf-8")
+    with lock:
+        connection.sendall(data)
+        # One message at a time, so heartbeats never interleave with results.
+#
+#
+def progress_snapshot(engine):
+    # The part of an engine's progress a worker reports to its coordinator.
+    #
+    progress = engine.progress if engine is not None else None
+    if progress is None:
+        return None
+    return {"done_files": progress.done_files, "total_files": progress.total_files,
+            "done_bytes": progress.done_bytes, "total_bytes": progress.total_bytes}
+#
+#
+class RemoteWorker:
+    # The coordinator's view of one connected worker process.
+    #
+    def __init__(self, connection, address):
+        # A connection that has not said hello yet.
+        #
+        self.connection = connection
+        self.name = f"{address[0]}:{address[1]}"
+        self.send_lock = threading.Lock()
+        self.ready = False
+        # Set once the worker has introduced itself with the right token.
+        self.alive = True
+        self.root = None
+        # The folder it is organizing, if any.
+        self.progress = None
+        # Its progress on that folder, from the last heartbeat.
+        self.last_seen = time.monotonic()
+        self.cancel_sent = None
+        # When it was told to cancel its folder for going quiet, if it was.
+    #
+    #
+    def send(self, message):
+        # Send a message to the worker.
+        #
+        send_message(self.connection, message, self.send_lock)
+#
+#
+class OrganizeCoordinator:
+    # Shares a list of root folders out between worker processes that connect
+    # over TCP, one folder per worker at a time. Each worker organizes its folder
+    # with the normal engine and reports progress in its heartbeats. A worker
+    # that disconnects loses its folder, which goes back to the front of the
+    # queue (organizing is safe to repeat: moved files are no longer in the
+    # root), up to 'max_attempts' times. A worker that stops sending heartbeats
+    # may only be slow, so it is first told to cancel; its folder is reassigned
+    # once it confirms that its engine has stopped (the worker then stays for
+    # the next folder), or when it stays silent for another heartbeat timeout
+    # (the worker is dropped), so two engines never knowingly share a folder.
+    # If no worker is connected for 'worker_timeout' seconds, the folders still
+    # waiting fail instead of waiting forever.
+    #
+    # The protocol is one JSON object per line. Workers send 'hello' (with the
+    # shared token), 'heartbeat', 'done', 'failed' and 'cancelled'; the
+    # coordinator sends 'job', 'cancel' and 'shutdown'.
+    #
+    def __init__(self, roots, options=None, address=("127.0.0.1", 0), token="", max_attempts=3,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT, worker_timeout=WORKER_WAIT_TIMEOUT, log=print):
+        # Listen on 'address' (port 0 picks a free port; see 'self.address').
+        #
+        self.pending = [os.path.abspath(root) for root in roots]
+        self.total_roots = len(self.pending)
+        self.options = {name: value for name, value in (options or {}).items() if name in DISTRIBUTED_OPTIONS}
+        self.token = token
+        self.max_attempts = max_attempts
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_timeout = worker_timeout
+        self.log = log
+        self.server = socket.create_server(address)
+        self.address = self.server.getsockname()[:2]
+        self.condition = threading.Condition()
+        # Guards everything below; notified whenever a worker's state changes.
+        self.workers = []
+        self.attempts = {}
+        # Root -> how many of its workers were lost or cancelled.
+        self.results = {}
+        # Root -> the outcome reported for it.
+    #
+    #
+    def serve(self, on_progress=None, progress_interval=1.0):
+        # Hand out the roots until every one has a result, calling 'on_progress'
+        # with the aggregated progress along the way. Returns the results.
+        #
+        threading.Thread(target=self.accept_loop, name="coordinator", daemon=True).start()
+        last_report = 0
+        last_worker = time.monotonic()
+        # When a worker was last connected; starts with the wait for the first one.
+        with self.condition:
+            while len(self.results) < self.total_roots:
+                self.check_heartbeats()
+                self.dispatch()
+                if self.workers:
+                    last_worker = time.monotonic()
+                elif time.monotonic() - last_worker > self.worker_timeout:
+                    self.give_up(f"No workers connected for {self.worker_timeout:g} seconds")
+                    break
+                self.condition.wait(timeout=0.5)
+                if on_progress and time.monotonic() - last_report >= progress_interval:
+                    last_report = time.monotonic()
+                    on_progress(self.aggregate_progress())
+            workers = list(self.workers)
+        for worker in workers:
+            try:
+                worker.send({"type": "shutdown"})
+            except OSError:
+                pass
+        self.server.close()
+        return self.results
+    #
+    #
+    def accept_loop(self):
+        # Accept worker connections until the server is closed.
+        #
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return
+            worker = RemoteWorker(connection, address)
+            threading.Thread(target=self.read_loop, args=(worker,), name=f"worker {worker.name}", daemon=True).start()
+    #
+    #
+    def read_loop(self, worker):
+        # Handle one worker's messages until its connection ends.
+        #
+        try:
+            for line in worker.connection.makefile("r", encoding="utf-8"):
+                message = json.loads(line)
+                kind = message.get("type")
+                with self.condition:
+                    worker.last_seen = time.monotonic()
+                    if not worker.ready:
+                        if kind != "hello" or not hmac.compare_digest(str(message.get("token", "")), self.token):
+                            self.log(f"Rejected {worker.name}: wrong token")
+                            break
+                        worker.ready = True
+                        worker.name = message.get("name") or worker.name
+                        self.workers.append(worker)
+                        self.log(f"Worker {worker.name} joined")
+                    elif kind == "heartbeat":
+                        worker.progress = message.get("progress")
+                    elif kind in ("done", "failed") and message.get("root") == worker.root:
+                        self.results[worker.root] = dict(message, worker=worker.name)
+                        self.log(f"{worker.root}: {message.get('message') or message.get('error')} ({worker.name})")
+                        worker.root = worker.progress = worker.cancel_sent = None
+                        # Ready for the next folder.
+                    elif kind == "cancelled" and message.get("root") == worker.root:
+                        root = worker.root
+                        worker.root = worker.progress = worker.cancel_sent = None
+                        # Its engine has stopped and it answers again, so it stays for the next folder.
+                        self.requeue(root, worker.name, "was too slow and cancelled")
+                    self.condition.notify_all()
+        except (OSError, ValueError):
+            pass
+            # A broken connection or a garbled message ends the worker.
+        with self.condition:
+            self.worker_lost(worker, "disconnected")
+            self.condition.notify_all()
+    #
+    #
+    def worker_lost(self, worker, reason):
+        # Drop a dead worker and put its folder back in the queue. Called with the lock held.
+        #
+        if not worker.alive:
+            return
+        worker.alive = False
+        if worker in self.workers:
+            self.workers.remove(worker)
+        try:
+            worker.connection.close()
+        except OSError:
+            pass
+        self.requeue(worker.root, worker.name, reason)
+    #
+    #
+    def requeue(self, root, worker_name, reason):
+        # Put a folder whose worker stopped on it back in the queue, or fail it
+        # after 'max_attempts' tries. Called with the lock held.
+        #
+        if root is None or root in self.results:
+            return
+        self.attempts[root] = self.attempts.get(root, 0) + 1
+        if self.attempts[root] >= self.max_attempts:
+            self.results[root] = {"type": "failed", "root": root, "worker": worker_name,
+                                  "error": f"Gave up after {self.attempts[root]} attempt(s); last: worker {reason}"}
+            self.log(f"{root}: {self.results[root]['error']}")
+        else:
+            self.pending.insert(0, root)
+            # Reassign it before any folder that hasn't been started.
+            self.log(f"{root}: worker {worker_name} {reason}, reassigning")
+    #
+    #
+    def give_up(self, reason):
+        # Fail every folder that is still waiting for a worker. Called with the lock held.
+        #
+        for root in self.pending:
+            self.results[root] = {"type": "failed", "root": root, "error": reason}
+            self.log(f"{root}: {reason}")
+        self.pending.clear()
+    #
+    #
+    def check_heartbeats(self):
+        # Cancel the folders of workers that went quiet, and treat workers that
+        # stay quiet as dead. Called with the lock held.
+        #
+        now = time.monotonic()
+        for worker in list(self.workers):
+            if now - worker.last_seen <= self.heartbeat_timeout:
+                continue
+            if worker.root is None:
+                self.worker_lost(worker, "stopped sending heartbeats")
+            elif worker.cancel_sent is None:
+                worker.cancel_sent = now
+                self.log(f"{worker.root}: worker {worker.name} stopped sending heartbeats, cancelling")
+                try:
+                    worker.send({"type": "cancel", "root": worker.root})
+                except OSError:
+                    self.worker_lost(worker, "could not be reached")
+                    # A broken connection makes the worker stop its engine on its own.
+            elif now - worker.cancel_sent > self.heartbeat_timeout:
+                self.worker_lost(worker, "did not confirm the cancel")
+    #
+    #
+    def dispatch(self):
+        # Give the next folder to every idle worker. Called with the lock held.
+        #
+        for worker in list(self.workers):
+            if worker.root is None and self.pending:
+                worker.root = self.pending.pop(0)
+                try:
+                    worker.send({"type": "job", "root": worker.root, "options": self.options})
+                except OSError:
+                    self.worker_lost(worker, "could not be reached")
+    #
+    #
+    def aggregate_progress(self):
+        # The progress of all folders together: finished ones from their
+        # results, running ones from their workers' last heartbeats.
+        #
+        totals = {"done_files": 0, "total_files": 0, "done_bytes": 0, "total_bytes": 0}
+        reports = [result.get("progress") for result in self.results.values()]
+        reports += [worker.progress for worker in self.workers]
+        for report in filter(None, reports):
+            for key in totals:
+                totals[key] += report.get(key, 0)
+        return dict(totals, roots_done=len(self.results), roots_total=self.total_roots, workers=len(self.workers))
 #
-import zipfile
-# The 'zipfile' module is used to create compressed ZIP archive backups
-# of the selected folders or files.
 #
+def format_distributed_progress(progress):
+    # One status line for the coordinator's aggregated progress.
+    #
+    return (f"{progress['roots_done']}/{progress['roots_total']} folder(s) done, {progress['workers']} worker(s), "
+            f"{progress['done_files']}/{progress['total_files']} files, "
+            f"{format_size(progress['done_bytes'])} of {format_size(progress['total_bytes'])}")
 #
 #
+def run_distributed_worker(address, token="", name=None, heartbeat_interval=HEARTBEAT_INTERVAL):
+    # Connect to a coordinator and organize the folders it sends until it says
+    # to shut down or goes away. The engine runs in its own thread, so a
+    # 'cancel' is acted on while it works; losing the coordinator stops the
+    # engine too, since the folder is then handed to another worker. Returns
+    # the number of folders organized.
+    #
+    connection = socket.create_connection(address)
+    send_lock = threading.Lock()
+    current = {}
+    # The job at work: its engine (for the heartbeats), root, thread and whether it was cancelled.
+    stopped = threading.Event()
+    completed = [0]
+    #
+    def send_heartbeats():
+        # Prove this worker is alive, with its progress, until it stops.
+        while not stopped.wait(heartbeat_interval):
+            try:
+                send_message(connection, {"type": "heartbeat", "progress": progress_snapshot(current.get("engine"))},
+                             send_lock)
+            except OSError:
+                stop_job()
+                return
+    #
+    def stop_job():
+        # Stop the engine at work, if any; it stops between two files or chunks.
+        engine = current.get("engine")
+        if engine is not None:
+            current["cancelled"] = True
+            engine.stop()
+    #
+    def run_job(engine, root):
+        # Organize one folder and report the outcome (or that it was cancelled).
+        outcome = {}
+        engine.finished.connect(lambda text, count: outcome.update(message=text, count=count))
+        engine.error_occurred.connect(lambda text: outcome.update(error=text))
+        engine.run()
+        # The same scan, plan and move logic as a local run.
+        if current.get("cancelled"):
+            reply = {"type": "cancelled", "root": root}
+        else:
+            reply = {"root": root, "progress": progress_snapshot(engine), "errors": engine.error_report}
+            if "error" in outcome:
+                reply.update(type="failed", error=outcome["error"])
+            else:
+                reply.update(type="done", message=outcome.get("message", ""), count=outcome.get("count", 0))
+                completed[0] += 1
+        current.clear()
+        # Idle again before the coordinator hears about it.
+        try:
+            send_message(connection, reply, send_lock)
+        except OSError:
+            pass
+            # The coordinator went away; the read loop notices too.
+    #
+    send_message(connection, {"type": "hello", "name": name or f"{socket.gethostname()}:{os.getpid()}",
+                              "token": token}, send_lock)
+    threading.Thread(target=send_heartbeats, name="heartbeat", daemon=True).start()
+    try:
+        for line in connection.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if message.get("type") == "shutdown":
+                break
+            if message.get("type") == "cancel" and message.get("root") == current.get("root"):
+                stop_job()
+                # The thread reports 'cancelled' once the engine has stopped.
+                continue
+            if message.get("type") != "job" or current:
+                continue
+            options = {name: value for name, value in message.get("options", {}).items() if name in DISTRIBUTED_OPTIONS}
+            engine = OrganizerEngine(message["root"], **options)
+            thread = threading.Thread(target=run_job, args=(engine, message["root"]), name="organize")
+            current.update(engine=engine, root=message["root"], thread=thread, cancelled=False)
+            thread.start()
+    except (OSError, ValueError):
+        pass
+        # The coordinator went away, or sent something unreadable.
+    finally:
+        thread = current.get("thread")
+        stop_job()
+        # Without the coordinator the folder may be reassigned, so stop working on it.
+        if thread is not None:
+            thread.join()
+        stopped.set()
+        connection.close()
+    return completed[0]
 #
 #
-# Import specific widgets and classes from PyQt5 for the graphical user interface.
+OBJECT_PART_SIZE = 8 * 1024 * 1024
+# Files larger than this are uploaded in parts of this size (S3 needs at least 5 MB).
+OBJECT_STORE_TRANSIENT_CODES = {"SlowDown", "RequestTimeout", "InternalError", "ServiceUnavailable"}
+# Error codes that mean 'try again later' rather than 'this will never work'.
+UNSIGNED_QUERY = "-_.~"
+# The characters SigV4 leaves unescaped.
 #
 #
-from PyQt5.QtWidgets import (
-    QApplication,
-    # QApplication is the main class for any PyQt5 application,
-    # responsible for the event loop.
-    QMainWindow,
-    # QMainWindow provides a main application window with a status bar,
-    # menu bar, and other features.
-    QWidget,
-    # QWidget is the base class for all user interface objects in PyQt5.
-    QVBoxLayout,
-    # QVBoxLayout arranges widgets vertically in a layout.
-    QHBoxLayout,
-    # QHBoxLayout arranges widgets horizontally in a layout.
-    QGridLayout,
-    # QGridLayout arranges widgets in a grid.
-    QLabel,
-    # QLabel is used to display text or images in the GUI.
-    QPushButton,
-    # QPushButton is a clickable button widget.
-    QLineEdit,
-    # QLineEdit provides a single-line text input field.
-    QTextEdit,
-    # QTextEdit provides a multi-line rich text editor.
-    QProgressBar,
-    # QProgressBar displays a horizontal or vertical progress bar.
-    QFileDialog,
-    # QFileDialog is a dialog box for selecting files or folders.
-    QMessageBox,
-    # QMessageBox provides modal dialogs for displaying messages.
-    QGroupBox,
-    # QGroupBox provides a titled frame to group other widgets.
-    QCheckBox,
-    # QCheckBox is a checkbox widget that can be checked or unchecked.
-    QSpinBox,
-    # QSpinBox allows the user to select an integer value.
-    QMenuBar,
-    # QMenuBar provides a menu bar at the top of the window.
-    QAction,
-    # QAction is an abstract class for commands that can be added to menus.
-    QStatusBar,
-    # QStatusBar provides a horizontal bar at the bottom of a window for status messages.
-)
-#
-#
-from PyQt5.QtCore import (
-    QThread,
-    # QThread provides a way to run code in a separate thread,
-    # preventing the GUI from freezing.
-    pyqtSignal,
-    # pyqtSignal is a signal for inter-thread communication.
-    Qt,
-    # Qt provides an enumeration of constants, such as alignment options.
-    QSettings
-    # QSettings is used for persistent application settings, like window geometry.
-)
-#
-#
-from PyQt5 import QtGui
-# The 'QtGui' module provides classes for window icons and other graphical elements.
-#
-#
-#
-#
-class FileOrganizerWorker(QThread):
-    # This class runs the file organization logic in a separate thread.
+def sign_s3_request(method, host, path, query, headers, payload_hash, access_key, secret_key, region, now=None):
+    # Return 'headers' plus the AWS Signature Version 4 headers for one request.
+    # 'path' is the already escaped request path and 'query' a dict of parameters.
     #
-    # It inherits from QThread to handle background tasks.
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ") if now else time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    headers = dict(headers, Host=host)
+    headers["x-amz-date"] = amz_date
+    headers["x-amz-content-sha256"] = payload_hash
+    canonical = {name.lower(): " ".join(str(value).split()) for name, value in headers.items()}
+    signed_headers = ";".join(sorted(canonical))
+    canonical_request = "\n".join([
+        method, path,
+        "&".join(f"{urllib.parse.quote(name, safe=UNSIGNED_QUERY)}={urllib.parse.quote(value, safe=UNSIGNED_QUERY)}"
+                 for name, value in sorted(query.items())),
+        "".join(f"{name}:{canonical[name]}\n" for name in sorted(canonical)),
+        signed_headers, payload_hash,
+    ])
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+    key = ("AWS4" + secret_key).encode("utf-8")
+    for part in scope.split("/"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+        # The signing key is derived from the date, region and service.
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                                f"SignedHeaders={signed_headers}, Signature={signature}")
+    return headers
+#
+#
+def object_store_error(status, body, key):
+    # Turn an error response into an OSError whose errno the retry policy understands.
     #
-    # This prevents the main GUI from freezing while files are being moved.
+    match = re.search(rb"<Code>(.*?)</Code>", body or b"")
+    code = match.group(1).decode("utf-8", "replace") if match else ""
+    if status >= 500 or code in OBJECT_STORE_TRANSIENT_CODES:
+        error_number = errno.EAGAIN
+        # Overloaded or briefly unavailable: retried, and the uploads back off.
+    else:
+        error_number = {404: errno.ENOENT, 403: errno.EACCES, 401: errno.EACCES}.get(status, errno.EIO)
+    return OSError(error_number, f"Object store answered {status} {code}".rstrip(), key)
+#
+#
+def xml_texts(body, tag):
+    # The text of every element named 'tag' in an S3 XML response, whatever its namespace.
     #
+    return [element.text or "" for element in ElementTree.fromstring(body).iter()
+            if element.tag == tag or element.tag.endswith("}" + tag)]
+#
+#
+class ConnectionPool:
+    # Keep-alive HTTP(S) connections to one endpoint, shared between threads.
+    # A connection goes back to the pool after each complete response, so TCP
+    # and TLS set-up happen once per connection instead of once per request.
+    # At most 'size' requests are in flight; more threads wait for a connection.
     #
-    # Define signals to communicate updates back to the main GUI thread.
-    progress_updated = pyqtSignal(int)
-    # Signal that sends an integer value for the progress bar.
-    status_updated = pyqtSignal(str)
-    # Signal that sends a string for the status message label.
-    finished = pyqtSignal(str, int)
-    # Signal that sends a final message and the count of files organized.
-    error_occurred = pyqtSignal(str)
-    # Signal that sends an error message if something goes wrong.
+    def __init__(self, endpoint, size=16, timeout=60):
+        # 'endpoint' is a URL such as https://s3.eu-west-1.amazonaws.com.
+        #
+        parts = urllib.parse.urlsplit(endpoint)
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        # The most recently used connection is the least likely to have timed out.
+        self.slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+        # How many connections were opened, to show the pooling works.
     #
     #
-    def __init__(self, target_path, min_files_count=1):
-        # Initialize the worker thread with the user's selected path and options.
+    def connect(self):
+        # Open a new connection.
         #
-        super().__init__()
-        # Call the constructor of the parent QThread class.
+        self.opened += 1
+        return self.connection_class(self.host, timeout=self.timeout)
+    #
+    #
+    def request(self, method, path, headers, body=b""):
+        # Send one request and return (status, headers with lower-case names, body).
+        # A pooled connection the server has closed meanwhile is replaced once.
+        #
+        with self.slots:
+            try:
+                connection = self.idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self.connect()
+                reused = False
+            while True:
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                    # The whole body must be read before the connection can be reused.
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    connection.close()
+                    if not reused:
+                        raise
+                    connection, reused = self.connect(), False
+                    continue
+                except BaseException:
+                    connection.close()
+                    raise
+                if response.will_close:
+                    connection.close()
+                else:
+                    self.idle.put(connection)
+                return response.status, {name.lower(): value for name, value in response.getheaders()}, data
+    #
+    #
+    def close(self):
+        # Close the idle connections.
+        #
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+#
+#
+class ObjectStoreDestination:
+    # An S3-compatible bucket that organized files are uploaded to, each under
+    # its folder's name as a key prefix ('PDF Files/report.pdf'). Requests are
+    # signed with AWS Signature Version 4 and use path-style URLs, which AWS,
+    # MinIO, Ceph and the local stand-in server all accept.
+    #
+    # Files over 'part_size' go up as multipart uploads, 'part_parallel' parts
+    # at a time. With a 'state_dir', each upload's ID and finished parts are
+    # saved as they complete, so an upload cut short by a cancel, a crash or a
+    # network failure resumes with the parts that are still missing.
+    #
+    def __init__(self, endpoint, bucket, access_key, secret_key, region="us-east-1", prefix="",
+                 part_size=OBJECT_PART_SIZE, part_parallel=4, connections=16, state_dir=None):
+        # Describe the bucket; nothing is sent until the first request.
+        #
+        self.pool = ConnectionPool(endpoint, connections)
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        # Keys are '<prefix>/<folder>/<file name>'.
+        self.part_size = max(5 * 1024 * 1024, part_size)
+        self.part_parallel = part_parallel
+        self.state_dir = os.path.join(state_dir, "uploads") if state_dir else None
+        self.state_lock = threading.Lock()
+    #
+    #
+    def request(self, method, key=None, query=None, body=b"", headers=None):
+        # Send a signed request for 'key' (or the bucket itself) and return the
+        # response headers and body. Error responses are raised as OSError.
+        #
+        query = query or {}
+        path = urllib.parse.quote(f"{self.pool.base_path}/{self.bucket}" + (f"/{key}" if key is not None else ""),
+                                  safe="/" + UNSIGNED_QUERY)
+        headers = sign_s3_request(method, self.pool.host, path, query, headers or {},
+                                  hashlib.sha256(body).hexdigest(), self.access_key, self.secret_key, self.region)
+        if query:
+            path += "?" + urllib.parse.urlencode(sorted(query.items()), quote_via=urllib.parse.quote)
+        try:
+            status, response_headers, data = self.pool.request(method, path, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            raise OSError(errno.ETIMEDOUT if isinstance(e, TimeoutError) else errno.EAGAIN,
+                          f"Object store connection failed: {e}", key) from e
+            # Network trouble is worth retrying, like a briefly locked file.
+        if status >= 300 or (method == "POST" and b"<Error>" in data[:512]):
+            raise object_store_error(status, data, key)
+            # A completed multipart upload can still fail inside a 200 response.
+        return response_headers, data
+    #
+    #
+    def list_names(self, folder):
+        # The names of the objects directly under a folder's prefix.
+        #
+        names = []
+        query = {"list-type": "2", "prefix": f"{self.prefix}{folder}/", "delimiter": "/"}
+        while True:
+            _, body = self.request("GET", query=query)
+            names += [key.rpartition("/")[2] for key in xml_texts(body, "Key")]
+            tokens = xml_texts(body, "NextContinuationToken")
+            if not tokens or not tokens[0]:
+                return names
+            query["continuation-token"] = tokens[0]
+    #
+    #
+    def upload_file(self, file_path, key, on_chunk=None):
+        # Upload one file as 'key' (below the prefix), calling 'on_chunk(byte_count)'
+        # as data goes up. 'on_chunk' may block to pause, or raise to cancel; a
+        # multipart upload then keeps its finished parts for the next attempt.
+        #
+        st = os.stat(file_path)
+        key = self.prefix + key
+        if st.st_size <= self.part_size:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            self.request("PUT", key, body=data,
+                         headers={"Content-MD5": base64.b64encode(hashlib.md5(data).digest()).decode("ascii")})
+            # The store checks the MD5, so a corrupted upload is refused.
+            if on_chunk:
+                on_chunk(len(data))
+            return
+        state_path = self.state_path(file_path, st, key)
+        state = self.load_state(state_path)
+        try:
+            self.upload_parts(file_path, st, key, state_path, state, on_chunk)
+        except OSError as e:
+            if not state or e.errno != errno.ENOENT:
+                raise
+            self.save_state(state_path, None)
+            self.upload_parts(file_path, st, key, state_path, None, on_chunk)
+            # The saved upload was aborted or expired on the server: start over.
+    #
+    #
+    def upload_parts(self, file_path, st, key, state_path, state, on_chunk):
+        # Upload the missing parts of a multipart upload, then complete it.
+        #
+        if not state:
+            _, body = self.request("POST", key, {"uploads": ""})
+            state = {"upload_id": xml_texts(body, "UploadId")[0], "parts": {}}
+            self.save_state(state_path, state)
+        part_count = (st.st_size + self.part_size - 1) // self.part_size
+        missing = iter([number for number in range(1, part_count + 1) if str(number) not in state["parts"]])
+        with ThreadPoolExecutor(max_workers=self.part_parallel) as pool:
+            #
+            def submit_next():
+                # Start the next missing part, if any; returns its future or None.
+                number = next(missing, None)
+                return number and pool.submit(self.upload_part, file_path, key, state["upload_id"], number)
+            #
+            running = set(filter(None, (submit_next() for _ in range(self.part_parallel))))
+            # Only a window of parts is in flight, so a pause or cancel takes effect quickly.
+            try:
+                while running:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        number, etag, length = future.result()
+                        state["parts"][str(number)] = etag
+                        self.save_state(state_path, state)
+                        # A finished part is never sent again.
+                        if on_chunk:
+                            on_chunk(length)
+                        running |= set(filter(None, [submit_next()]))
+            except BaseException:
+                for future in wait(running).done:
+                    if not future.cancelled() and future.exception() is None:
+                        number, etag, _ = future.result()
+                        state["parts"][str(number)] = etag
+                        # Parts already in flight when the upload stopped are not sent again either.
+                self.save_state(state_path, state)
+                raise
+        parts = "".join(f"<Part><PartNumber>{number}</PartNumber><ETag>{escape_xml(etag)}</ETag></Part>"
+                        for number, etag in sorted(state["parts"].items(), key=lambda item: int(item[0])))
+        self.request("POST", key, {"uploadId": state["upload_id"]},
+                     f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode("utf-8"))
+        self.save_state(state_path, None)
+    #
+    #
+    def upload_part(self, file_path, key, upload_id, number):
+        # Upload one part. Returns its number, ETag and size.
+        #
+        with open(file_path, 'rb') as f:
+            f.seek((number - 1) * self.part_size)
+            data = f.read(self.part_size)
+        response_headers, _ = self.request(
+            "PUT", key, {"partNumber": str(number), "uploadId": upload_id}, data,
+            {"Content-MD5": base64.b64encode(hashlib.md5(data).digest()).decode("ascii")})
+        return number, response_headers.get("etag", ""), len(data)
+    #
+    #
+    def state_path(self, file_path, st, key):
+        # Where the state of one upload is saved: one file per source file
+        # version and destination, so a changed file starts a new upload.
+        #
+        if not self.state_dir:
+            return None
+        identity = f"{self.pool.host}\n{self.bucket}\n{key}\n{os.path.abspath(file_path)}\n{st.st_size}\n{st.st_mtime_ns}"
+        return os.path.join(self.state_dir, hashlib.sha1(identity.encode("utf-8")).hexdigest() + ".json")
+    #
+    #
+    def load_state(self, state_path):
+        # Read an upload's saved state, or None.
+        #
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (TypeError, FileNotFoundError, ValueError):
+            return None
+            # No state directory, no saved upload, or a damaged file.
+    #
+    #
+    def save_state(self, state_path, state):
+        # Save an upload's state atomically, or remove it once the upload is complete.
+        #
+        if not state_path:
+            return
+        with self.state_lock:
+            if state is None:
+                if os.path.exists(state_path):
+                    os.remove(state_path)
+                return
+            os.makedirs(self.state_dir, exist_ok=True)
+            with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(state_path + ".tmp", state_path)
+#
+#
+def escape_xml(text):
+    # Escape text for an XML element.
+    #
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+#
+#
+def serve_object_store(root, address="127.0.0.1:0", access_key="local", secret_key="local-secret", region="us-east-1"):
+    # A small S3-compatible stand-in for testing uploads without a network:
+    # objects, multipart uploads and ListObjectsV2 on a local folder, with
+    # keep-alive connections and Signature Version 4 checks. Buckets are
+    # created on first use. Returns the server; 'server.request_counts' and
+    # 'server.connections' show what clients did.
+    #
+    host, _, port = str(address).rpartition(":")
+    uploads_dir = os.path.join(root, ".uploads")
+    os.makedirs(uploads_dir, exist_ok=True)
+    #
+    class ObjectStoreHandler(BaseHTTPRequestHandler):
+        # Answers one connection's requests.
+        #
+        protocol_version = "HTTP/1.1"
+        # Keep connections open between requests.
+        #
+        def setup(self):
+            super().setup()
+            server.connections += 1
+        #
+        def log_message(self, *args):
+            pass
+        #
+        def reply(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        #
+        def fail(self, status, code):
+            self.reply(status, f"<Error><Code>{code}</Code></Error>".encode("utf-8"))
+        #
+        def handle_request(self, method):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            raw_path, _, raw_query = self.path.partition("?")
+            query = dict(urllib.parse.parse_qsl(raw_query, keep_blank_values=True))
+            signed = sign_s3_request(method, self.headers.get("Host", ""), raw_path, query,
+                                     {name: self.headers[name] for name in self.headers
+                                      if name.lower() in ("content-md5", "content-type")},
+                                     self.headers.get("x-amz-content-sha256", ""), access_key, secret_key, region,
+                                     datetime.strptime(self.headers.get("x-amz-date", "19700101T000000Z"),
+                                                       "%Y%m%dT%H%M%SZ"))
+            if not hmac.compare_digest(signed["Authorization"], self.headers.get("Authorization", "")):
+                return self.fail(403, "SignatureDoesNotMatch")
+            if hashlib.sha256(body).hexdigest() != self.headers.get("x-amz-content-sha256"):
+                return self.fail(400, "XAmzContentSHA256Mismatch")
+            if "Content-MD5" in self.headers and \
+                    base64.b64encode(hashlib.md5(body).digest()).decode("ascii") != self.headers["Content-MD5"]:
+                return self.fail(400, "BadDigest")
+            bucket, _, key = urllib.parse.unquote(raw_path).lstrip("/").partition("/")
+            if not bucket or ".." in key.split("/") or bucket.startswith("."):
+                return self.fail(400, "InvalidRequest")
+            object_path = os.path.join(root, bucket, *key.split("/"))
+            upload_path = os.path.join(uploads_dir, os.path.basename(query.get("uploadId", "")))
+            kind = ("list" if not key and method == "GET" else "create upload" if "uploads" in query
+                    else "part" if "partNumber" in query else "complete" if method == "POST"
+                    else "abort" if method == "DELETE" and "uploadId" in query else method.lower())
+            with server.lock:
+                server.request_counts[kind] = server.request_counts.get(kind, 0) + 1
+            if "uploadId" in query and not os.path.isdir(upload_path):
+                return self.fail(404, "NoSuchUpload")
+            if kind == "list":
+                prefix, delimiter = query.get("prefix", ""), query.get("delimiter", "")
+                bucket_dir = os.path.join(root, bucket)
+                keys = sorted(os.path.relpath(os.path.join(folder, name), bucket_dir).replace(os.sep, "/")
+                              for folder, _, names in os.walk(bucket_dir) for name in names)
+                keys = [key for key in keys if key.startswith(prefix) and key > query.get("continuation-token", "")
+                        and not (delimiter and delimiter in key[len(prefix):])]
+                page = keys[:int(query.get("max-keys", 1000))]
+                more = len(keys) > len(page)
+                return self.reply(200, ("<ListBucketResult>" + "".join(f"<Contents><Key>{escape_xml(key)}</Key></Contents>"
+                                                                        for key in page)
+                                        + (f"<NextContinuationToken>{escape_xml(page[-1])}</NextContinuationToken>"
+                                           if more else "") + "</ListBucketResult>").encode("utf-8"))
+            if kind == "create upload":
+                upload_id = secrets.token_hex(16)
+                os.makedirs(os.path.join(uploads_dir, upload_id))
+                with open(os.path.join(uploads_dir, upload_id, "key"), "w", encoding="utf-8") as f:
+                    f.write(f"{bucket}/{key}")
+                return self.reply(200, f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId>"
+                                       f"</InitiateMultipartUploadResult>".encode("utf-8"))
+            if kind == "part":
+                with open(os.path.join(upload_path, str(int(query["partNumber"]))), "wb") as f:
+                    f.write(body)
+                return self.reply(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+            if kind == "complete":
+                numbers = [int(number) for number in xml_texts(body, "PartNumber")]
+                if any(not os.path.exists(os.path.join(upload_path, str(number))) for number in numbers):
+                    return self.fail(400, "InvalidPart")
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                with open(object_path + ".uploading", "wb") as f:
+                    for number in numbers:
+                        with open(os.path.join(upload_path, str(number)), "rb") as part:
+                            shutil.copyfileobj(part, f)
+                os.replace(object_path + ".uploading", object_path)
+                shutil.rmtree(upload_path)
+                return self.reply(200, b"<CompleteMultipartUploadResult></CompleteMultipartUploadResult>")
+            if kind == "abort":
+                shutil.rmtree(upload_path)
+                return self.reply(204)
+            if not key:
+                return self.fail(400, "InvalidRequest")
+            if kind == "put":
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                with open(object_path + ".uploading", "wb") as f:
+                    f.write(body)
+                os.replace(object_path + ".uploading", object_path)
+                return self.reply(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+            if kind in ("get", "head") and os.path.isfile(object_path):
+                with open(object_path, "rb") as f:
+                    data = f.read()
+                if kind == "head":
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    return
+                return self.reply(200, data)
+            if kind == "delete":
+                if os.path.isfile(object_path):
+                    os.remove(object_path)
+                return self.reply(204)
+            return self.fail(404, "NoSuchKey")
+        #
+        def do_GET(self):
+            self.handle_request("GET")
+        #
+        def do_HEAD(self):
+            self.handle_request("HEAD")
+        #
+        def do_PUT(self):
+            self.handle_request("PUT")
+        #
+        def do_POST(self):
+            self.handle_request("POST")
+        #
+        def do_DELETE(self):
+            self.handle_request("DELETE")
+    #
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port or 0)), ObjectStoreHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_counts = {}
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, name="object store", daemon=True).start()
+    return server
+#
+#
+class EngineEvent:
+    # A stand-in for a Qt signal, so the organizer engine can run without Qt:
+    # slots are plain callables, called in the emitting thread.
+    #
+    def __init__(self):
+        # Start with no slots.
+        #
+        self.slots = []
+    #
+    #
+    def connect(self, slot):
+        # Call 'slot' on every emit.
+        #
+        self.slots.append(slot)
+    #
+    #
+    def emit(self, *args):
+        # Call every connected slot with the event's arguments.
+        #
+        for slot in self.slots:
+            slot(*args)
+#
+#
+ENGINE_EVENTS = ("progress_updated", "status_updated", "finished", "error_occurred", "error_report_ready",
+                 "concurrency_updated", "statistics_updated")
+# What the engine reports while it runs; the Qt worker declares each one as a signal.
+#
+#
+class OrganizerEngine:
+    # The file organization logic: scanning, planning, moving and linking. It
+    # runs in whatever thread calls run(): the GUI wraps it in a QThread
+    # (FileOrganizerWorker), the scheduler and shard processes call it directly.
+    #
+    def __init__(self, target_path, min_files_count=1, detect_content=False, retry_policy=None,
+                 background_mode=False, max_ops_per_second=0, max_bytes_per_second=0,
+                 organize_by="type", use_exif_date=False, view_mode=None, view_root=None, durable=False,
+                 name_filter=None, shards=1, max_parallel=None, profile=False, memory_budget=0, flatten=False,
+                 pack_max_size=0, pack_min_age=0, object_store=None):
+        # Initialize the engine with the user's selected path and options.
+        #
+        for event_name in ENGINE_EVENTS:
+            if not hasattr(type(self), event_name):
+                setattr(self, event_name, EngineEvent())
+                # Without Qt signals, report through plain callbacks.
         self.target_path = target_path
         # Store the path to the folder or file.
         self.min_files_count = min_files_count
         # Store the minimum file count required to create a new folder.
+        self.detect_content = detect_content
+        # Whether to detect file types from their content instead of only their names.
+        self.sniffer = FileTypeSniffer() if detect_content else None
+        # The content sniffer, only needed when content detection is enabled.
+        self.organize_by = organize_by
+        # 'type' groups files into '<EXT> Files' folders, 'date' into 'YYYY/MM' folders.
+        self.use_exif_date = use_exif_date
+        # In date mode, whether photos are filed by the date they were taken.
+        self.view_mode = view_mode
+        # None moves the files; 'symlink' or 'hardlink' builds a linked view instead.
+        self.view_root = view_root
+        # The folder the linked view is built in.
+        self.durable = durable
+        # Whether moves are flushed to disk (fsync) before the run reports success.
+        self.name_filter = name_filter or NameFilter()
+        # Which file names the scanner considers at all.
+        self.shards = shards
+        # How many processes share the work on a folder (1 keeps it all in this thread).
+        self.max_ops_per_second = max_ops_per_second
+        self.max_bytes_per_second = max_bytes_per_second
+        # The rate limits, which shard processes split between them.
+        self.scan_concurrency = AdaptiveConcurrency("scan", max_parallel or min(16, (os.cpu_count() or 1) * 2))
+        self.move_concurrency = AdaptiveConcurrency("moves", max_parallel or 1)
+        # How many stat/read and move operations run at once, tuned while running
+        # within these bounds. Without a bound, moves stay sequential.
+        self.profile = profile
+        # Whether to print the controllers' decisions when the run ends.
+        self.memory_budget = memory_budget
+        # Bytes the scan may hold in memory before the plan spills to disk (0 means unlimited).
+        self.flatten = flatten
+        # Whether to undo an organization instead, moving files out of the '<EXT> Files' folders.
+        self.pack_max_size = pack_max_size
+        self.pack_min_age = pack_min_age
+        # After organizing, files up to this many bytes and at least this many seconds
+        # old are packed into their folder's archive (a size of 0 turns packing off).
+        self.object_store = object_store
+        # An ObjectStoreDestination to upload the folders to instead of creating them here.
+        self.concurrency_text = ""
+        # The levels last sent to the status bar.
+        self.fatal_error = None
+        # Set when a failure must stop the run (errors are not being skipped).
+        self.names_lock = threading.Lock()
+        # Parallel moves reserve destination names one at a time.
+        self.file_state = threading.local()
+        # Per-thread state of the file being moved.
+        self.file_stats = {}
+        # The stat result of every file seen by the last scan, keyed by file name.
+        self.statistics = None
+        # The statistics of the last scan, gathered as it went.
+        self.last_statistics_update = 0
+        # When statistics were last sent to the GUI.
+        self.retry_policy = retry_policy or RetryPolicy()
+        # How failed file operations are retried and whether the run continues after them.
+        self.error_report = []
+        # One entry per file that could not be organized during this run.
+        self.background_mode = background_mode
+        # Whether the worker runs at low CPU and I/O priority.
+        self.ops_bucket = TokenBucket(max_ops_per_second)
+        # Limits how many files are moved per second (0 means unlimited).
+        self.bytes_bucket = TokenBucket(max_bytes_per_second, capacity=max(max_bytes_per_second, COPY_CHUNK_SIZE))
+        # Limits how many bytes are copied per second (0 means unlimited).
+        self.progress = None
+        # The byte-weighted progress of the current run.
+        self.status_text = ""
+        # The 'Moving ...' part of the status line.
+        self.taken_names = {}
+        # The names already used in each prepared destination folder.
+        self.last_update = 0
+        # When the GUI was last updated, to avoid flooding it with signals.
         self.running = True
         # A flag to control the thread's execution, used for stopping it.
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        # Cleared while the run is paused.
+        self.paused_at = None
+        # When the current pause began.
+        self.shard_resume_event = None
+        # The shard processes' copy of 'resume_event', while they are moving files.
     #
     #
     def get_file_extensions(self, folder_path):
         # Scan a folder to find all files and group them by their extensions.
         #
-        extensions = {}
-        # Initialize an empty dictionary to store file extensions and their files.
+        self.file_stats = {}
+        # Forget the stat results of any previous scan.
+        self.statistics = ScanStatistics()
+        # Start the statistics afresh; they fill in as files are stat'ed.
         if not os.path.isdir(folder_path):
             # Check if the path is a valid directory.
-            return extensions
+            return {}
         # If not a directory, return an empty dictionary.
-        for filename in os.listdir(folder_path):
-            # Loop through all items in the given folder.
-            file_path = os.path.join(folder_path, filename)
-            # Create the full path to the file.
-            if os.path.isfile(file_path):
-                # Check if the current item is a file.
-                file_extension = filename.split('.')[-1].lower()
-                # Get the file extension and convert it to lowercase.
-                if file_extension and '.' in filename:
-                    # Make sure the file has a valid extension.
-                    if file_extension not in extensions:
-                        # If the extension is not yet in the dictionary, add it.
-                        extensions[file_extension] = []
-                    extensions[file_extension].append(filename)
-                    # Add the filename to the list for its extension.
+        started = time.monotonic()
+        scanned = []
+        # The name of every file, in directory order.
+        with os.scandir(folder_path) as entries:
+            # scandir returns file types with the listing, avoiding a stat per entry.
+            for entry in entries:
+                # Loop through all items in the given folder.
+                if not self.name_filter.accepts(entry.name):
+                    # Excluded names are dropped before any stat call or planning.
+                    continue
+                if entry.is_file():
+                    # Check if the current item is a file.
+                    scanned.append(entry)
+                    # Remember the entry, in directory order.
+        stats = adaptive_map(self.scan_concurrency, self.scan_entry, scanned, initializer=self.worker_thread_started)
+        # Stat the files, in parallel where that is faster (e.g. on network shares).
+        scanned = [entry for entry, st in zip(scanned, stats) if st is not None]
+        # Files that vanished or could not be stat'ed are left out of the plan.
+        for entry, st in zip(scanned, filter(None, stats)):
+            self.file_stats[entry.name] = st
+            # Keep the stat result for later stages of the run.
+        extensions = self.group_by_extension(folder_path, [entry.name for entry in scanned], self.statistics)
+        # Group the files by their extensions.
+        self.publish_statistics(force=True)
+        # Send the finished statistics.
+        SCAN_DURATION.observe(time.monotonic() - started)
+        return extensions
+    #
+    #
+    def scan_within_budget(self, folder_path):
+        # Scan a folder and group its files by subfolder, before the minimum file
+        # count is applied. Returns a dict of subfolder -> files while the scan fits
+        # in the memory budget, or a SpilledPlan (which the caller closes) once it doesn't.
+        #
+        if not self.memory_budget:
+            return self.group_files(self.get_file_extensions(folder_path))
+            # Without a budget, keep everything in memory as usual.
+        started = time.monotonic()
+        self.file_stats = {}
+        self.statistics = ScanStatistics()
+        batch_size = max(1000, min(SPILL_BATCH_SIZE, self.memory_budget // PLANNED_FILE_BYTES // 4))
+        # Small enough that one batch is a fraction of the budget.
+        groups = {}
+        spilled = None
+        batch = []
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if self.name_filter.accepts(entry.name) and entry.is_file():
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        spilled = self.plan_batch(folder_path, batch, groups, spilled)
+                        batch = []
+        spilled = self.plan_batch(folder_path, batch, groups, spilled)
+        self.publish_statistics(force=True)
+        SCAN_DURATION.observe(time.monotonic() - started)
+        return spilled if spilled is not None else groups
+    #
+    #
+    def plan_batch(self, folder_path, batch, groups, spilled):
+        # Stat and group one batch of scanned entries into 'groups', moving
+        # everything to a SpilledPlan once the files held would exceed the budget.
+        # Returns the spill store, or None while nothing has spilled.
+        #
+        stats = adaptive_map(self.scan_concurrency, self.scan_entry, batch, initializer=self.worker_thread_started)
+        batch = [entry for entry, st in zip(batch, stats) if st is not None]
+        # Files that vanished or could not be stat'ed are left out of the plan.
+        self.file_stats.update((entry.name, st) for entry, st in zip(batch, filter(None, stats)))
+        self.statistics.exif_applied = False
+        # Each batch brings EXIF dates the statistics haven't seen.
+        extensions = self.group_by_extension(folder_path, [entry.name for entry in batch], self.statistics)
+        for subfolder_name, files in self.group_files(extensions).items():
+            groups.setdefault(subfolder_name, []).extend(files)
+        if spilled is None and len(self.file_stats) * PLANNED_FILE_BYTES > self.memory_budget:
+            spilled = SpilledPlan()
+            self.status_updated.emit("The scan is larger than the memory budget, continuing on disk...")
+        if spilled is not None:
+            spilled.add(groups, self.file_stats)
+            groups.clear()
+            self.file_stats = {}
+            # Only the next batch is held in memory from now on.
+        return spilled
+    #
+    #
+    def stat_entry(self, entry):
+        # Stat one scanned file, retrying transient errors. Returns None for a file
+        # that was removed since the listing, or (when errors are skipped) one
+        # that could not be stat'ed, which is then in the error report.
+        #
+        started = time.perf_counter()
+        try:
+            st = self.retry_policy.call(entry.stat, should_continue=lambda: self.running)
+        except FileNotFoundError:
+            return None
+            # Deleted between the listing and the stat: nothing to organize.
+        except OSError as e:
+            if not self.retry_policy.continue_on_error:
+                raise
+            self.record_error(entry.path, "stat", e)
+            return None
+        OPERATION_LATENCY.observe(time.perf_counter() - started, operation="stat")
+        return st
+    #
+    #
+    def scan_entry(self, entry):
+        # Stat one scanned file and count it in the statistics straight away.
+        #
+        st = self.stat_entry(entry)
+        if st is None:
+            return None
+        extension = get_extension(entry.name)
+        self.statistics.add(extension, self.statistics_group(extension, st), st)
+        # Count it under its name's extension; content detection may correct that later.
+        self.publish_statistics()
+        return st
+    #
+    #
+    def statistics_group(self, extension, st, taken=None):
+        # Return the folder a file would go to, for the projected folder sizes.
+        #
+        if not extension:
+            return None
+            # Files without a type are not organized.
+        return f"{extension.upper()} Files" if self.organize_by != "date" else self.date_folder(taken, st)
+    #
+    #
+    def publish_statistics(self, force=False):
+        # Send a snapshot of the statistics to the GUI, at most four times a second.
+        #
+        now = time.monotonic()
+        if force or now - self.last_statistics_update >= 0.25:
+            self.last_statistics_update = now
+            self.statistics_updated.emit(self.statistics.snapshot())
+    #
+    #
+    def group_by_extension(self, folder_path, filenames, statistics=None):
+        # Group scanned files (whose stat results are in 'file_stats') by extension.
+        # Files whose content changes their extension are moved in 'statistics'.
+        #
+        extensions = {}
+        # Initialize an empty dictionary to store file extensions and their files.
+        scanned = [(filename, get_extension(filename)) for filename in filenames]
+        # Get each file extension from the name.
+        detected = {}
+        # The content-detected extension of each file, if detection is enabled.
+        if self.sniffer:
+            # Read the file headers in parallel, skipping unchanged files seen before.
+            detected = self.sniffer.sniff_many([
+                (filename, os.path.join(folder_path, filename), self.file_stats[filename])
+                for filename, _ in scanned
+            ], self.scan_concurrency)
+        for filename, name_extension in scanned:
+            # Group the files in the order they were listed.
+            file_extension = choose_extension(name_extension, detected.get(filename))
+            # Combine the name and content evidence into one extension.
+            if statistics is not None and file_extension != name_extension:
+                st = self.file_stats[filename]
+                statistics.move((name_extension, self.statistics_group(name_extension, st)),
+                                (file_extension, self.statistics_group(file_extension, st)), st)
+                # Only corrected files are touched again.
+            if file_extension:
+                # Make sure the file has a valid extension.
+                if file_extension not in extensions:
+                    # If the extension is not yet in the dictionary, add it.
+                    extensions[file_extension] = []
+                extensions[file_extension].append(filename)
+                # Add the filename to the list for its extension.
         return extensions
         # Return the dictionary of extensions and files.
     #
     #
+    def detect_extension(self, file_path):
+        # Work out the extension a single file should be organized under.
+        #
+        name_extension = get_extension(os.path.basename(file_path))
+        # Start from the extension in the file's name.
+        if not self.sniffer:
+            # Without content detection, the name is all we have.
+            return name_extension
+        detected_extension = self.sniffer.sniff(file_path, os.stat(file_path))
+        return choose_extension(name_extension, detected_extension)
+        # Let the file's content confirm or correct its name.
+    #
+    #
+    def date_folder(self, taken, st):
+        # Return the 'YYYY/MM' folder for a file, from its EXIF date if known,
+        # otherwise from the modification time the scan already read.
+        #
+        when = taken or datetime.fromtimestamp(st.st_mtime)
+        # Prefer the date the photo was taken.
+        return os.path.join(f"{when.year:04d}", f"{when.month:02d}")
+    #
+    #
+    def read_exif_dates(self, extensions):
+        # Read the EXIF date of every photo in the scan, in parallel.
+        #
+        photos = [filename for ext, files in extensions.items() if ext in EXIF_EXTENSIONS for filename in files]
+        # Only photo formats carry EXIF dates.
+        dates = adaptive_map(self.scan_concurrency,
+                             lambda filename: read_exif_datetime(os.path.join(self.target_path, filename)), photos)
+        # Each read is bounded to EXIF_READ_LIMIT bytes.
+        return dict(zip(photos, dates))
+    #
+    #
+    def group_files(self, extensions):
+        # Group the scanned files by the subfolder they belong in, before the
+        # minimum file count is applied.
+        #
+        if self.organize_by != "date":
+            # Group by type into folders like 'PDF Files'.
+            return {f"{ext.upper()} Files": files for ext, files in extensions.items()}
+        exif_dates = self.read_exif_dates(extensions) if self.use_exif_date else {}
+        # The date each photo was taken, if requested.
+        if exif_dates and self.statistics is not None and not self.statistics.exif_applied:
+            # Move photos to the folders of the dates they were taken in the statistics too.
+            for filename, taken in exif_dates.items():
+                st = self.file_stats[filename]
+                if taken:
+                    self.statistics.move((None, self.date_folder(None, st)), (None, self.date_folder(taken, st)), st)
+            self.statistics.exif_applied = True
+            self.publish_statistics(force=True)
+        groups = {}
+        for files in extensions.values():
+            for filename in files:
+                # File each file under the year and month it belongs to.
+                subfolder_name = self.date_folder(exif_dates.get(filename), self.file_stats[filename])
+                groups.setdefault(subfolder_name, []).append(filename)
+        return groups
+    #
+    #
+    def build_plan(self, groups):
+        # Return the organization plan: each subfolder to fill and the files going into it.
+        #
+        return {
+            subfolder_name: files for subfolder_name, files in groups.items()
+            if len(files) >= self.min_files_count
+        }
+        # Leave out folders that don't meet the minimum file count.
+    #
+    #
+    def subfolder_for_file(self, file_path, file_extension):
+        # Return the subfolder a single selected file belongs in.
+        #
+        if self.organize_by != "date":
+            return f"{file_extension.upper()} Files"
+            # Create a descriptive subfolder name, e.g., 'PDF Files'.
+        taken = read_exif_datetime(file_path) if self.use_exif_date and file_extension in EXIF_EXTENSIONS else None
+        # The date the photo was taken, if requested.
+        return self.date_folder(taken, os.stat(file_path))
+    #
+    #
+    def create_target_folders(self, plan):
+        # Create every destination folder of the plan in one pass, before any file
+        # is moved, and index the names already in them so the moves themselves never
+        # need to look at the folders again. Returns the paths that are ready and the
+        # errors of those that aren't.
+        #
+        folder_paths = {}
+        # The full path of each subfolder that is ready.
+        failures = {}
+        # The error for each subfolder that could not be created.
+        for subfolder_name in plan:
+            try:
+                folder_paths[subfolder_name] = self.retry_policy.call(
+                    self.prepare_folder, os.path.join(self.target_path, subfolder_name),
+                    should_continue=lambda: self.running)
+                # Create and index the subfolder, retrying transient errors.
+            except Exception as e:
+                failures[subfolder_name] = e
+        return folder_paths, failures
+    #
+    #
+    def prepare_folder(self, subfolder_path):
+        # Make sure a destination folder exists and index the file names already in it.
+        #
+        if subfolder_path in KNOWN_DIRECTORIES:
+            # Known to exist, so the listing alone is enough.
+            try:
+                self.taken_names[subfolder_path] = {name_key(name) for name in os.listdir(subfolder_path)}
+                return subfolder_path
+            except FileNotFoundError:
+                KNOWN_DIRECTORIES.invalidate(subfolder_path)
+                # Deleted since it was last seen: forget it and create it again below.
+        created = not os.path.isdir(subfolder_path)
+        # A folder that did not exist yet is known to be empty.
+        KNOWN_DIRECTORIES.ensure(subfolder_path)
+        # Create it, unless it is already known to exist.
+        self.taken_names[subfolder_path] = set() if created else {name_key(name) for name in os.listdir(subfolder_path)}
+        # One listing per folder replaces an existence check per file.
+        return subfolder_path
+    #
+    #
     def create_sub_folder_if_needed(self, folder_path, subfolder_name):
         # Create a new subfolder inside the target folder if it doesn't already exist.
         #
         subfolder_path = os.path.join(folder_path, subfolder_name)
         # Construct the full path for the new subfolder.
-        if not os.path.exists(subfolder_path):
-            # Check if the subfolder already exists.
-            os.makedirs(subfolder_path)
-            # Create the new directory if it does not exist.
+        KNOWN_DIRECTORIES.ensure(subfolder_path)
+        # Create the directory, unless it is already known to exist from an earlier run.
         return subfolder_path
         # Return the path to the new subfolder.
     #
     #
+    def unique_destination(self, subfolder_path, filename):
+        # Return a destination path inside 'subfolder_path' that is not taken yet.
+        #
+        with self.names_lock:
+            return self.reserve_destination(subfolder_path, filename)
+            # Parallel moves must never pick the same name.
+    #
+    #
+    def reserve_destination(self, subfolder_path, filename):
+        # Pick a free name in 'subfolder_path' and reserve it in the folder's index.
+        #
+        taken = self.taken_names.get(subfolder_path)
+        # The names already in the folder, if it was indexed.
+        if taken is None:
+            # Not indexed (e.g. a single dropped file), so ask the file system.
+            is_taken = lambda name: os.path.exists(os.path.join(subfolder_path, name))
+        else:
+            is_taken = lambda name: name_key(name) in taken
+        new_filename = filename
+        # The destination file name.
+        if is_taken(new_filename):
+            # If a file with the same name already exists in the destination,
+            # handle the naming conflict.
+            base, extension = os.path.splitext(filename)
+            # Split the file name into its base and extension.
+            counter = 1
+            # Start a counter for renaming.
+            while is_taken(new_filename):
+                # Keep renaming until a unique file name is found.
+                new_filename = f"{base}_{counter}{extension}"
+                # Create a new file name with a number, e.g., 'document_1.pdf'.
+                counter += 1
+                # Increment the counter.
+        if taken is not None:
+            taken.add(name_key(new_filename))
+            # Reserve the name for this file.
+        return os.path.join(subfolder_path, new_filename)
+    #
+    #
+    def move_file(self, source_path, subfolder_path, filename):
+        # Move one file into its subfolder, renaming it if the name is taken.
+        # Returns the destination path, or None if the source file has disappeared.
+        # Transient errors are retried against the same destination name.
+        #
+        dest_path = self.unique_destination(subfolder_path, filename)
+        # Pick a free destination name.
+        try:
+            move_file_retrying(source_path, dest_path, self.retry_policy, self.chunk_copied, self.durable,
+                               self.restart_file, lambda: self.running)
+            # Move the file from its source to its destination.
+        except FileNotFoundError:
+            if not os.path.lexists(source_path):
+                # The file was removed since the scan, so there is nothing to move.
+                return None
+            KNOWN_DIRECTORIES.invalidate(subfolder_path)
+            # The destination folder was deleted behind our back: forget it,
+            self.prepare_folder(subfolder_path)
+            # recreate it,
+            dest_path = self.unique_destination(subfolder_path, filename)
+            move_file_retrying(source_path, dest_path, self.retry_policy, self.chunk_copied, self.durable,
+                               self.restart_file, lambda: self.running)
+            # and try the move once more.
+        return dest_path
+    #
+    #
+    def restart_file(self):
+        # A retry starts the copy over, so take back the bytes of the failed attempt.
+        #
+        if self.progress and self.current_file_bytes:
+            self.progress.add_bytes(-self.current_file_bytes)
+        self.current_file_bytes = 0
+    #
+    #
+    def order_moves(self, plan):
+        # Return the plan's moves in a disk-friendly order. When the files will be
+        # copied to another disk, their physical offsets are looked up (in parallel)
+        # so they can be read in one sweep.
+        #
+        source_device = os.stat(self.target_path).st_dev
+        # The disk the files are on now.
+        copies = any(os.stat(os.path.join(self.target_path, name)).st_dev != source_device for name in plan)
+        # Whether any destination folder is on another disk.
+        if not copies:
+            return order_operations(plan, self.file_stats)
+            # Renames only: group by folder, in inode order.
+        filenames = [filename for files in plan.values() for filename in files]
+        with ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2)) as pool:
+            offsets = pool.map(lambda filename: physical_offset(os.path.join(self.target_path, filename)), filenames)
+            physical_offsets = {name: offset for name, offset in zip(filenames, offsets) if offset is not None}
+        return order_operations(plan, self.file_stats, physical_offsets)
+    #
+    #
+    def make_link(self, source_path, link_path):
+        # Create one entry of a linked view.
+        #
+        if self.view_mode == "hardlink":
+            os.link(source_path, link_path)
+            # A hard link is another name for the same data, on the same disk.
+        else:
+            os.symlink(source_path, link_path)
+            # A symbolic link points to the original path.
+    #
+    #
+    def sync_view(self, plan):
+        # Build the organized tree as links under 'view_root', leaving the original
+        # files where they are. On later runs only the entries that changed are touched.
+        #
+        source_root = os.path.abspath(self.target_path)
+        # Links point at absolute paths so they work from anywhere.
+        os.makedirs(self.view_root, exist_ok=True)
+        # Make sure the view's root folder exists.
+        manifest = load_view_manifest(self.view_root)
+        # What the last sync created, if this folder is already a view.
+        if manifest is None and os.listdir(self.view_root):
+            # Never prune a folder that this organizer did not create.
+            self.error_occurred.emit(f"'{self.view_root}' is not empty and is not an organizer view. "
+                                     "Choose an empty folder for the view.")
+            return
+        recorded_links = manifest.get("links", {}) if manifest and manifest.get("mode") == self.view_mode else {}
+        # Links recorded under a different mode are all rebuilt.
+        desired = {
+            os.path.join(subfolder_name, filename): filename
+            for subfolder_name, files in plan.items() for filename in files
+        }
+        # Every link the view should contain, and the file it stands for.
+        existing = scan_view(self.view_root)
+        # Every entry the view contains now.
+        #
+        def up_to_date(relative_path):
+            # Check if an existing entry already is the right link.
+            is_symlink, inode = existing[relative_path]
+            filename = desired[relative_path]
+            if self.view_mode == "hardlink":
+                return not is_symlink and inode == self.file_stats[filename].st_ino
+                # A hard link shares the source's inode, known from the scan.
+            return is_symlink and recorded_links.get(relative_path) == os.path.join(source_root, filename)
+            # A symbolic link is current if the manifest says it points at the source.
+        #
+        stale = [path for path in existing if path not in desired or not up_to_date(path)]
+        # Entries to remove: no longer wanted, or pointing at the wrong file.
+        stale_set = set(stale)
+        missing = [path for path in desired if path not in existing or path in stale_set]
+        # Links to create.
+        unchanged = len(desired) - len(missing)
+        # Links that are already correct and are not touched at all.
+        self.progress = ProgressTracker(0, len(stale) + len(missing))
+        # Count progress in link operations.
+        removed = created = 0
+        for relative_path in stale:
+            # Remove the stale entries first, so their names are free for new links.
+            if not self.running:
+                # Stop if the user cancelled.
+                break
+            self.status_text = f"Removing {relative_path}..."
+            # Describe the entry being removed.
+            try:
+                self.retry_policy.call(os.remove, os.path.join(self.view_root, relative_path),
+                                       should_continue=lambda: self.running)
+                # Removing a link never touches the original file.
+                removed += 1
+            except Exception as e:
+                self.record_error(os.path.join(self.view_root, relative_path), "remove link", e)
+                # Record the failure and carry on.
+            self.progress.finish_file(0)
+            self.report_progress()
+            # Update the progress bar and status line.
+        for relative_path in missing:
+            # Then create the links that are missing.
+            if not self.running:
+                # Stop if the user cancelled.
+                break
+            self.status_text = f"Linking {relative_path}..."
+            # Describe the link being created.
+            link_path = os.path.join(self.view_root, relative_path)
+            # The full path of the new link.
+            try:
+                KNOWN_DIRECTORIES.ensure(os.path.dirname(link_path))
+                # Create the link's folder, unless it is known to exist.
+                self.throttle()
+                # Respect the configured files-per-second limit.
+                self.retry_policy.call(self.make_link, os.path.join(source_root, desired[relative_path]),
+                                       link_path, should_continue=lambda: self.running)
+                # Create the link, retrying transient errors.
+                created += 1
+            except Exception as e:
+                if not self.retry_policy.continue_on_error:
+                    self.error_occurred.emit(f"Failed to link {relative_path}: {str(e)}")
+                    return
+                    # Stop the thread.
+                self.record_error(link_path, "link", e)
+                # Record the failure and carry on.
+            self.progress.finish_file(0)
+            self.report_progress()
+            # Update the progress bar and status line.
+        for relative_folder in sorted({os.path.dirname(path) for path in stale}, key=len, reverse=True):
+            # Remove folders the stale links left empty, deepest first.
+            while relative_folder:
+                try:
+                    os.rmdir(os.path.join(self.view_root, relative_folder))
+                    KNOWN_DIRECTORIES.invalidate(os.path.join(self.view_root, relative_folder))
+                except OSError:
+                    break
+                    # Not empty (or already gone), so its parents are not empty either.
+                relative_folder = os.path.dirname(relative_folder)
+        failed = {entry["path"] for entry in self.error_report}
+        # Links that could not be created are left out of the manifest.
+        save_view_manifest(self.view_root, {
+            "mode": self.view_mode,
+            "source": source_root,
+            "links": {
+                relative_path: os.path.join(source_root, filename) for relative_path, filename in desired.items()
+                if os.path.join(self.view_root, relative_path) not in failed
+            },
+        })
+        # Record the view so the next run only needs to look at what changed.
+        self.error_report_ready.emit(self.error_report)
+        # Send the list of failures before the final message.
+        summary = f"View updated: {created} link(s) added, {removed} removed, {unchanged} unchanged."
+        # Describe what the sync did.
+        if self.error_report:
+            summary += f" {len(self.error_report)} operation(s) failed."
+            # Mention any failures in the final message.
+        self.finished.emit(summary if self.running else f"View update cancelled. {summary}", created)
+    #
+    #
+    def chunk_copied(self, byte_count):
+        # Called after each chunk of a cross-disk copy.
+        #
+        self.current_file_bytes += byte_count
+        # Remember how much of this file is done.
+        if self.progress:
+            self.progress.add_bytes(byte_count)
+            # Count the chunk towards the overall progress.
+            self.report_progress()
+            # Keep the progress bar moving during large copies.
+        self.bytes_bucket.consume(byte_count, lambda: self.running)
+        # Only copied bytes use up bandwidth; a rename on the same disk does not.
+        self.wait_while_paused()
+        # Pause or stop between chunks, not only between files.
+    #
+    #
+    def report_progress(self, force=False):
+        # Send the byte-weighted progress and the status line to the GUI, at most
+        # 20 times a second unless 'force' is set.
+        #
+        now = time.monotonic()
+        if not force and now - self.last_update < 0.05:
+            # Update the GUI at most 20 times a second so it stays smooth.
+            return
+        self.last_update = now
+        self.progress_updated.emit(self.progress.percent())
+        # Update the GUI's progress bar.
+        self.status_updated.emit(f"{self.status_text} | {self.progress.summary()}")
+        # Update the GUI's status label with the speed and time left.
+        concurrency_text = f"Parallel I/O: {self.scan_concurrency.describe()}, {self.move_concurrency.describe()}"
+        if concurrency_text != self.concurrency_text and self.move_concurrency.maximum > 1:
+            # Show the controllers' current levels in the status bar when they change.
+            self.concurrency_text = concurrency_text
+            self.concurrency_updated.emit(concurrency_text)
+    #
+    #
+    def throttle(self):
+        # Wait until the rate limits allow the next file to be moved.
+        #
+        self.ops_bucket.consume(1, lambda: self.running)
+        # Every move counts as one operation.
+    #
+    #
+    def record_error(self, path, operation, error):
+        # Add a failed file to the structured error report.
+        #
+        entry = error_entry(path, operation, error)
+        self.error_report.append(entry)
+        count_error(entry)
+        # Count it by errno for the metrics too.
+    #
+    #
     def run(self):
         # This method is the entry point for the thread's execution.
         #
+        self.error_report = []
+        # Start every run with an empty error report.
+        previous_priority = {}
+        # The priorities background mode replaced, put back when the run ends.
         try:
             # Use a try-except block to gracefully handle any errors.
+            if self.background_mode:
+                # Step aside for other users of the machine before touching any files.
+                applied, previous_priority = lower_thread_priority()
+                self.status_updated.emit(f"Background mode: {applied or 'priority unchanged'}")
+                # Tell the user which priority changes took effect.
             if os.path.isfile(self.target_path):
                 # If the user selected a single file, handle it here.
                 file_to_move = os.path.basename(self.target_path)
                 # Get the name of the file to be moved.
-                file_extension = file_to_move.split('.')[-1].lower()
+                if not self.name_filter.accepts(file_to_move):
+                    # The file matches an exclude pattern (or no include pattern).
+                    self.finished.emit(f"'{file_to_move}' is excluded by the file name filters.", 0)
+                    return
+                file_extension = self.detect_extension(self.target_path)
                 # Get the file's extension.
+                if not file_extension:
+                    # A file without a recognizable type has no folder to go to.
+                    self.finished.emit("File has no recognizable type, nothing to organize.", 0)
+                    return
                 parent_folder = os.path.dirname(self.target_path)
                 # Get the parent directory of the file.
                 #
-                subfolder_name = f"{file_extension.upper()} Files"
-                # Create a descriptive subfolder name, e.g., 'PDF Files'.
+                subfolder_name = self.subfolder_for_file(self.target_path, file_extension)
+                # Work out the subfolder, e.g. 'PDF Files' or '2024/05'.
+                if self.view_mode:
+                    # Add a link to the view instead of moving the file.
+                    link_folder = os.path.join(self.view_root, subfolder_name)
+                    KNOWN_DIRECTORIES.ensure(link_folder)
+                    # Create the link's folder, unless it is known to exist.
+                    self.retry_policy.call(self.make_link, os.path.abspath(self.target_path),
+                                           self.unique_destination(link_folder, file_to_move),
+                                           should_continue=lambda: self.running)
+                    self.finished.emit(f"Linked {file_to_move} into the view's '{subfolder_name}'.", 1)
+                    return
                 subfolder_path = self.create_sub_folder_if_needed(parent_folder, subfolder_name)
                 # Create the subfolder if it doesn't exist.
                 #
-                source_path = self.target_path
-                # The path to the file being moved.
-                dest_path = os.path.join(subfolder_path, file_to_move)
-                # The destination path for the file.
-                #
-                if os.path.exists(dest_path):
-                    # If a file with the same name already exists in the destination,
-                    # handle the naming conflict.
-                    base, extension = os.path.splitext(file_to_move)
-                    # Split the file name into its base and extension.
-                    counter = 1
-                    # Start a counter for renaming.
-                    while os.path.exists(dest_path):
-                        # Keep renaming until a unique file name is found.
-                        new_filename = f"{base}_{counter}{extension}"
-                        # Create a new file name with a number, e.g., 'document_1.pdf'.
-                        dest_path = os.path.join(subfolder_path, new_filename)
-                        # Update the destination path.
-                        counter += 1
-                        # Increment the counter.
-                #
-                shutil.move(source_path, dest_path)
-                # Move the file from its source to its destination.
+                if not self.move_file(self.target_path, subfolder_path, file_to_move):
+                    # Move the file, retrying if it is briefly locked.
+                    self.finished.emit(f"'{file_to_move}' no longer exists, nothing to organize.", 0)
+                    return
                 self.status_updated.emit(f"Moved {file_to_move} to '{subfolder_name}'.")
                 # Send a status message to the GUI.
+                FILES_MOVED.inc()
                 self.finished.emit("Successfully organized 1 file.", 1)
                 # Send a final success message.
                 return
                 # Exit the thread's run method.
             #
             #
+            elif os.path.isdir(self.target_path) and self.flatten:
+                # Move the files in the extension folders back into the folder.
+                self.run_flatten()
+            #
+            #
+            elif os.path.isdir(self.target_path) and self.shards > 1 and not self.view_mode and not self.object_store:
+                # Share a huge folder out between several processes.
+                self.run_sharded()
+            #
+            #
             elif os.path.isdir(self.target_path):
                 # If a folder was selected, handle the bulk organization here.
-                extensions = self.get_file_extensions(self.target_path)
-                # Get all files grouped by their extensions.
-                filtered_extensions = {
-                    ext: files for ext, files in extensions.items()
-                    if len(files) >= self.min_files_count
-                }
-                # Filter out extensions that don't meet the minimum file count.
+                if self.view_mode or self.object_store:
+                    groups = self.group_files(self.get_file_extensions(self.target_path))
+                    # A view is synced against the whole plan, and uploads pick names
+                    # against the bucket's listing, so these plans are built in memory.
+                else:
+                    groups = self.scan_within_budget(self.target_path)
+                    # Get all files grouped by subfolder, on disk if they don't fit the memory budget.
+                if isinstance(groups, SpilledPlan):
+                    with groups:
+                        self.run_spilled(groups)
+                    return
+                plan = self.build_plan(groups)
+                # Decide which subfolder each file goes into.
+                #
+                if self.view_mode:
+                    # Build or refresh a linked view instead of moving anything.
+                    self.sync_view(plan)
+                    return
+                if self.object_store:
+                    # Upload the folders to the object store instead.
+                    self.run_upload(plan)
+                    return
                 #
-                total_files = sum(len(files) for files in filtered_extensions.values())
+                total_files = sum(len(files) for files in plan.values())
                 # Count the total number of files to be organized.
                 if total_files == 0:
                     # If no files meet the criteria, send a message and exit.
                     self.status_updated.emit("No files match the criteria to organize.")
-                    self.finished.emit("No files found to organize.", 0)
+                    self.finished.emit(f"No files found to organize.{self.pack_folders()}", 0)
+                    # Files already in the folders may have become old enough to pack.
                     return
                 #
+                total_bytes = sum(self.file_stats[filename].st_size
+                                  for files in plan.values() for filename in files)
+                # Add up the file sizes from the scan, with no extra stat calls.
+                self.progress = ProgressTracker(total_bytes, total_files)
+                # Track progress by bytes rather than by file count.
                 processed_files = 0
                 # Initialize a counter for processed files.
-                for ext, files in filtered_extensions.items():
-                    # Loop through each extension and its list of files.
-                    if not self.running:
-                        # Check the 'running' flag to see if the process should be cancelled.
-                        break
-                    subfolder_name = f"{ext.upper()} Files"
-                    # Create the folder name.
-                    subfolder_path = self.create_sub_folder_if_needed(self.target_path, subfolder_name)
-                    # Create the subfolder.
-                    for filename in files:
-                        # Loop through each file in the current extension's list.
-                        if not self.running:
-                            # Check the 'running' flag again.
-                            break
-                        source_path = os.path.join(self.target_path, filename)
-                        # Get the source path of the file.
-                        dest_path = os.path.join(subfolder_path, filename)
-                        # Get the destination path of the file.
-                        try:
-                            # Use a try-except block to handle file-specific errors.
-                            if not os.path.exists(source_path):
-                                # Skip if the file no longer exists.
-                                continue
-                            if os.path.exists(dest_path):
-                                # Handle file name conflicts.
-                                base, extension = os.path.splitext(filename)
-                                # Split the name and extension.
-                                counter = 1
-                                # Start the counter for renaming.
-                                while os.path.exists(dest_path):
-                                    # Find a unique file name.
-                                    new_filename = f"{base}_{counter}{extension}"
-                                    # Create the new file name.
-                                    dest_path = os.path.join(subfolder_path, new_filename)
-                                    # Update the destination path.
-                                    counter += 1
-                                    # Increment the counter.
-                            shutil.move(source_path, dest_path)
-                            # Move the file.
-                            processed_files += 1
-                            # Increment the processed files counter.
-                            progress = int((processed_files / total_files) * 100)
-                            # Calculate the percentage progress.
-                            self.progress_updated.emit(progress)
-                            # Update the GUI's progress bar.
-                            status_message = f"Moving {filename}... ({processed_files}/{total_files})"
-                            # Create a detailed status message.
-                            self.status_updated.emit(status_message)
-                            # Update the GUI's status label.
-                            time.sleep(0.05)
-                            # Pause briefly to allow the GUI to update smoothly.
-                        except Exception as e:
-                            # If an error occurs with a specific file, report it.
-                            error_message = f"Failed to move {filename}: {str(e)}"
-                            self.error_occurred.emit(error_message)
-                            return
-                            # Stop the thread.
+                failed_files = 0
+                # Initialize a counter for files that could not be moved.
+                self.status_updated.emit(f"Creating {len(plan)} folder(s)...")
+                # Tell the user what is happening before the moves start.
+                folder_paths, folder_failures = self.create_target_folders(plan)
+                # Create all destination folders in one pass before moving anything.
+                for subfolder_name, e in folder_failures.items():
+                    # Without its folder, none of that folder's files can be moved.
+                    if not self.retry_policy.continue_on_error:
+                        self.error_occurred.emit(f"Failed to create '{subfolder_name}': {str(e)}")
+                        return
+                        # Stop the thread.
+                    for filename in plan[subfolder_name]:
+                        self.record_error(os.path.join(self.target_path, filename), "create folder", e)
+                        # Report every file that was skipped because of it.
+                        self.progress.finish_file(self.file_stats[filename].st_size)
+                        # Count the skipped file as done.
+                    failed_files += len(plan[subfolder_name])
+                operations = self.order_moves({name: plan[name] for name in folder_paths})
+                # Order the moves so the disk works through them with as little seeking as possible.
+                QUEUE_DEPTH.set(len(operations))
+                outcomes = adaptive_map(
+                    self.move_concurrency,
+                    lambda operation: self.move_one(folder_paths[operation[0]], operation[1]),
+                    operations, should_continue=lambda: self.running and not self.fatal_error,
+                    congested=lambda outcome: outcome == "busy", initializer=self.worker_thread_started)
+                # Move the files, as many at once as the file system rewards.
+                if self.fatal_error:
+                    self.error_occurred.emit(self.fatal_error)
+                    return
+                    # Stop the thread.
+                processed_files = outcomes.count("moved")
+                failed_files += outcomes.count("failed") + outcomes.count("busy")
+                QUEUE_DEPTH.set(0)
+                # Moves skipped by a cancel never happen.
+                self.report_progress(force=True)
+                # Update the progress bar and status line.
                 #
-                if self.running:
-                    # If the organization finished without being cancelled.
-                    success_message = f"Successfully organized {processed_files} files!"
-                    self.finished.emit(success_message, processed_files)
-                    # Send a success message.
-                else:
-                    # If the user cancelled the operation.
-                    self.finished.emit("Organization cancelled.", processed_files)
-                    # Send a cancellation message.
+                self.finish_moves(processed_files, failed_files, folder_paths)
+                # Flush if requested and report the outcome.
             #
             #
             else:
@@ -326,11 +5595,473 @@ class FileOrganizerWorker(QThread):
                 # Report the error to the GUI.
         #
         #
+        except MoveCancelled:
+            # A single file's copy was cancelled between chunks.
+            self.finished.emit("Organization cancelled.", 0)
         except Exception as e:
             # Catch any unexpected, top-level errors.
             error_message = f"An error occurred: {str(e)}"
             self.error_occurred.emit(error_message)
             # Report the general error.
+        finally:
+            restore_thread_priority(previous_priority)
+            # The thread may be a scheduler pool thread that runs other jobs next.
+            if self.sniffer:
+                self.sniffer.save_cache()
+                # Keep the detected types for the next run, saved once per run.
+    #
+    #
+    def run_flatten(self):
+        # Undo an organization: move the files in the folder's '<EXT> Files'
+        # subfolders back into it and remove the subfolders that end up empty.
+        # Each folder is listed once, names are checked against the same index
+        # forward moves use, and the renames run in inode order, as many at once
+        # as the file system rewards.
+        #
+        self.status_updated.emit("Looking for organized folders...")
+        with os.scandir(self.target_path) as entries:
+            folder_paths = {entry.name: entry.path for entry in entries
+                            if entry.is_dir(follow_symlinks=False) and is_extension_folder(entry.name)}
+        # Only the organizer's own folders; a symlinked folder is left alone.
+        for folder_path in folder_paths.values():
+            if not os.path.exists(os.path.join(folder_path, PACK_INDEX_NAME)):
+                continue
+            self.status_updated.emit(f"Unpacking the small files in '{os.path.basename(folder_path)}'...")
+            try:
+                _, errors = SmallFilePack(folder_path).unpack(lambda: self.running)
+                # Packed files come back into their folder first, then move out with the rest.
+            except (OSError, ValueError, KeyError) as e:
+                errors = [error_entry(os.path.join(folder_path, PACK_INDEX_NAME), "unpack", e)]
+                # An unreadable index: the pack stays as it is.
+            for entry in errors:
+                self.error_report.append(entry)
+                count_error(entry)
+        operations = []
+        # (folder path, file name, size), folder by folder in inode order.
+        for folder_name in sorted(folder_paths):
+            with os.scandir(folder_paths[folder_name]) as entries:
+                files = [entry for entry in entries
+                         if entry.is_file() and not is_pack_file(entry.name) and not is_partial_copy(entry.name)]
+                # What is left of a pack stays with its folder.
+            stats = adaptive_map(self.scan_concurrency, self.stat_entry, files, initializer=self.worker_thread_started)
+            # Stat the files, in parallel where that is faster.
+            operations.extend((folder_paths[folder_name], entry.name, st.st_size)
+                              for entry, st in sorted(((entry, st) for entry, st in zip(files, stats) if st is not None),
+                                                      key=lambda item: item[1].st_ino))
+        if not operations:
+            self.status_updated.emit("No organized folders to flatten.")
+            self.finished.emit("No '<EXT> Files' folders with files were found.", 0)
+            return
+        self.progress = ProgressTracker(sum(size for _, _, size in operations), len(operations))
+        self.prepare_folder(self.target_path)
+        # Index the names already in the folder, so clashes are renamed like forward moves.
+        QUEUE_DEPTH.set(len(operations))
+        outcomes = adaptive_map(
+            self.move_concurrency,
+            lambda operation: self.move_one(self.target_path, operation[1],
+                                            os.path.join(operation[0], operation[1]), operation[2]),
+            operations, should_continue=lambda: self.running and not self.fatal_error,
+            congested=lambda outcome: outcome == "busy", initializer=self.worker_thread_started)
+        QUEUE_DEPTH.set(0)
+        if self.fatal_error:
+            self.error_occurred.emit(self.fatal_error)
+            return
+        removed = 0
+        for folder_name, folder_path in list(folder_paths.items()):
+            try:
+                os.rmdir(folder_path)
+                # Only succeeds if the folder is empty now.
+                KNOWN_DIRECTORIES.invalidate(folder_path)
+                del folder_paths[folder_name]
+                removed += 1
+            except OSError:
+                pass
+                # Files that failed to move, or anything else in it, keep the folder.
+        self.status_updated.emit(f"Removed {removed} empty folder(s).")
+        self.report_progress(force=True)
+        self.finish_moves(outcomes.count("moved"), outcomes.count("failed") + outcomes.count("busy"),
+                          folder_paths, action="flattened")
+    #
+    #
+    def run_upload(self, plan):
+        # Organize into an object store: upload every planned file under its
+        # folder's key prefix, then remove the local file. Each folder is listed
+        # once, so names already in the bucket get a number like local clashes.
+        #
+        total_files = sum(len(files) for files in plan.values())
+        if total_files == 0:
+            self.status_updated.emit("No files match the criteria to organize.")
+            self.finished.emit("No files found to organize.", 0)
+            return
+        self.progress = ProgressTracker(sum(self.file_stats[filename].st_size
+                                            for files in plan.values() for filename in files), total_files)
+        self.status_updated.emit(f"Listing {len(plan)} folder(s) in the bucket...")
+        for subfolder_name in plan:
+            self.taken_names[subfolder_name] = {name_key(name)
+                                                for name in self.object_store.list_names(subfolder_name)}
+        operations = order_operations(plan, self.file_stats)
+        # Read the files in inode order; the uploads themselves can go in any order.
+        QUEUE_DEPTH.set(len(operations))
+        outcomes = adaptive_map(
+            self.move_concurrency, lambda operation: self.upload_one(*operation), operations,
+            should_continue=lambda: self.running and not self.fatal_error,
+            congested=lambda outcome: outcome == "busy", initializer=self.worker_thread_started)
+        QUEUE_DEPTH.set(0)
+        if self.fatal_error:
+            self.error_occurred.emit(self.fatal_error)
+            return
+        self.report_progress(force=True)
+        self.finish_moves(outcomes.count("moved"), outcomes.count("failed") + outcomes.count("busy"), {},
+                          action="uploaded")
+    #
+    #
+    def upload_one(self, subfolder_name, filename):
+        # Upload one planned file and remove it locally. Returns the same outcomes as move_one.
+        #
+        source_path = os.path.join(self.target_path, filename)
+        st = self.file_stats[filename]
+        key = subfolder_name.replace(os.sep, "/") + "/" + os.path.basename(self.unique_destination(subfolder_name, filename))
+        # Reserve a free name in the folder's listing.
+        self.status_text = f"Uploading {filename}... ({self.progress.done_files + 1}/{self.progress.total_files})"
+        self.current_file_bytes = 0
+        #
+        def upload_once():
+            # One attempt; a retry resumes a multipart upload, so take back what was counted.
+            self.progress.add_bytes(-self.current_file_bytes)
+            self.current_file_bytes = 0
+            self.object_store.upload_file(source_path, key, self.chunk_copied)
+        #
+        try:
+            self.wait_while_paused()
+            self.throttle()
+            started = time.perf_counter()
+            self.retry_policy.call(upload_once, should_continue=lambda: self.running)
+            current = os.stat(source_path)
+            if (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                raise OSError(errno.EBUSY, "Changed while it was being uploaded, so it was kept", source_path)
+                # The next run uploads the new version under a new name.
+            os.remove(source_path)
+            OPERATION_LATENCY.observe(time.perf_counter() - started, operation="upload")
+            FILES_MOVED.inc()
+            BYTES_MOVED.inc(st.st_size)
+            outcome = "moved"
+        except MoveCancelled:
+            outcome = "cancelled"
+            # Finished parts are kept for the next run.
+        except FileNotFoundError as e:
+            outcome = "gone" if not os.path.lexists(source_path) else "failed"
+            if outcome == "failed":
+                self.record_error(source_path, "upload", e)
+        except Exception as e:
+            if not self.retry_policy.continue_on_error:
+                self.fatal_error = f"Failed to upload {filename}: {str(e)}"
+            else:
+                self.record_error(source_path, "upload", e)
+            outcome = "busy" if RetryPolicy.is_transient(e) else "failed"
+        if outcome == "cancelled":
+            self.progress.add_bytes(-self.current_file_bytes)
+        else:
+            self.progress.finish_file(st.st_size, self.current_file_bytes)
+        self.current_file_bytes = 0
+        QUEUE_DEPTH.inc(-1)
+        self.report_progress()
+        return outcome
+    #
+    #
+    def run_spilled(self, spilled):
+        # Move the files of a plan that spilled to disk, taking the moves from the
+        # store a batch at a time. Files are moved folder by folder in inode order.
+        #
+        counts = {folder: counted for folder, counted in spilled.folder_counts().items()
+                  if counted[0] >= self.min_files_count}
+        # Leave out folders that don't meet the minimum file count.
+        total_files = sum(count for count, _ in counts.values())
+        if total_files == 0:
+            self.status_updated.emit("No files match the criteria to organize.")
+            self.finished.emit(f"No files found to organize.{self.pack_folders()}", 0)
+            return
+        self.progress = ProgressTracker(sum(size for _, size in counts.values()), total_files)
+        failed_files = 0
+        self.status_updated.emit(f"Creating {len(counts)} folder(s)...")
+        folder_paths, folder_failures = self.create_target_folders(counts)
+        for subfolder_name, e in folder_failures.items():
+            if not self.retry_policy.continue_on_error:
+                self.error_occurred.emit(f"Failed to create '{subfolder_name}': {str(e)}")
+                return
+            for filename, size in spilled.moves(subfolder_name):
+                self.record_error(os.path.join(self.target_path, filename), "create folder", e)
+                self.progress.finish_file(size)
+            failed_files += counts[subfolder_name][0]
+        moves = ((subfolder_name, filename, size) for subfolder_name in sorted(folder_paths)
+                 for filename, size in spilled.moves(subfolder_name))
+        processed_files = 0
+        while self.running and not self.fatal_error:
+            batch = list(itertools.islice(moves, SPILL_BATCH_SIZE))
+            if not batch:
+                break
+            self.file_stats = {filename: PlannedFile(size) for _, filename, size in batch}
+            # The sizes move_one counts progress with, for this batch only.
+            QUEUE_DEPTH.set(total_files - self.progress.done_files)
+            outcomes = adaptive_map(
+                self.move_concurrency, lambda move: self.move_one(folder_paths[move[0]], move[1]),
+                batch, should_continue=lambda: self.running and not self.fatal_error,
+                congested=lambda outcome: outcome == "busy", initializer=self.worker_thread_started)
+            processed_files += outcomes.count("moved")
+            failed_files += outcomes.count("failed") + outcomes.count("busy")
+        QUEUE_DEPTH.set(0)
+        self.file_stats = {}
+        if self.fatal_error:
+            self.error_occurred.emit(self.fatal_error)
+            return
+        self.report_progress(force=True)
+        self.finish_moves(processed_files, failed_files, folder_paths)
+    #
+    #
+    def move_one(self, subfolder_path, filename, source_path=None, size=None):
+        # Move one planned file and count it. Returns 'moved', 'gone' (removed
+        # since the scan), 'failed', or 'busy' (failed because the file system
+        # was overloaded, which tells the concurrency controller to back off).
+        # Files come from the target folder unless 'source_path' says otherwise.
+        #
+        source_path = source_path or os.path.join(self.target_path, filename)
+        # Get the source path of the file.
+        size = self.file_stats[filename].st_size if size is None else size
+        # The size the scan saw.
+        self.status_text = f"Moving {filename}... ({self.progress.done_files + 1}/{self.progress.total_files})"
+        # Describe the file being moved.
+        self.current_file_bytes = 0
+        try:
+            # Use a try-except block to handle file-specific errors.
+            self.wait_while_paused()
+            # Hold here while paused; the rest of the plan waits its turn.
+            self.throttle()
+            # Respect the configured files-per-second limit.
+            started = time.perf_counter()
+            outcome = "moved" if self.move_file(source_path, subfolder_path, filename) else "gone"
+            # Move the file, retrying transient errors like a briefly locked file.
+            if outcome == "moved":
+                OPERATION_LATENCY.observe(time.perf_counter() - started, operation="move")
+                FILES_MOVED.inc()
+                BYTES_MOVED.inc(size)
+        except MoveCancelled:
+            outcome = "cancelled"
+            # Stopped between chunks: the partial copy is gone and the file is still in place.
+        except Exception as e:
+            # If an error occurs with a specific file, report it.
+            if not self.retry_policy.continue_on_error:
+                self.fatal_error = f"Failed to move {filename}: {str(e)}"
+                # Stop the run after the moves already under way.
+            else:
+                self.record_error(source_path, "move", e)
+                # Record the failure and carry on with the next file.
+            outcome = "busy" if RetryPolicy.is_transient(e) else "failed"
+        if outcome == "cancelled":
+            self.progress.add_bytes(-self.current_file_bytes)
+            # Take back the chunks of the abandoned copy.
+        else:
+            self.progress.finish_file(size, self.current_file_bytes)
+            # Count the rest of the file's size, which a rename never reported in chunks.
+        self.current_file_bytes = 0
+        QUEUE_DEPTH.inc(-1)
+        self.report_progress()
+        # Update the progress bar and status line.
+        return outcome
+    #
+    #
+    @property
+    def current_file_bytes(self):
+        # How many bytes of the file being moved (by this thread) have been copied so far.
+        #
+        return getattr(self.file_state, "copied", 0)
+    #
+    #
+    @current_file_bytes.setter
+    def current_file_bytes(self, byte_count):
+        # Each moving thread keeps its own count.
+        #
+        self.file_state.copied = byte_count
+    #
+    #
+    def worker_thread_started(self):
+        # Runs in every thread of the parallel scan and move pools.
+        #
+        if self.background_mode:
+            lower_thread_priority()
+            # Priorities are per thread, so each pool thread steps aside as well.
+    #
+    #
+    def finish_moves(self, processed_files, failed_files, folder_paths, action="organized"):
+        # Flush the touched folders if requested, then send the error report and
+        # the final message of a run that moved files.
+        #
+        if self.durable:
+            # Flush every touched folder once, instead of once per move.
+            self.status_updated.emit("Flushing changes to disk...")
+            for folder_path in [self.target_path, *folder_paths.values()]:
+                # The source folder lost entries and each destination gained some.
+                try:
+                    fsync_directory(folder_path)
+                except OSError as e:
+                    self.record_error(folder_path, "fsync", e)
+                    # The moves happened, but may not survive a power cut.
+        #
+        if self.profile:
+            # Show how the concurrency controllers behaved during the run.
+            print("\n".join(self.scan_concurrency.profile_lines() + self.move_concurrency.profile_lines()),
+                  file=sys.stderr)
+        pack_note = self.pack_folders() if action == "organized" else ""
+        # Pack the small, old files now in the folders.
+        self.error_report_ready.emit(self.error_report)
+        # Send the list of failed files before the final message.
+        failure_note = f" {failed_files} file(s) could not be moved." if failed_files else ""
+        # Mention any failures in the final message.
+        peak = peak_memory_usage()
+        if peak:
+            PEAK_MEMORY.set(peak)
+        memory_note = f" Peak memory: {format_size(peak)}." if peak and self.memory_budget else ""
+        # Show how the run kept to its memory budget.
+        if self.running:
+            # If the organization finished without being cancelled.
+            success_message = f"Successfully {action} {processed_files} files!{failure_note}{pack_note}{memory_note}"
+            self.finished.emit(success_message, processed_files)
+            # Send a success message.
+        else:
+            # If the user cancelled the operation.
+            self.finished.emit(f"{'Flattening' if action == 'flattened' else 'Upload' if action == 'uploaded' else 'Organization'} cancelled."
+                               f"{failure_note}{memory_note}", processed_files)
+            # Send a cancellation message.
+    #
+    #
+    def pack_folders(self):
+        # Run the packing stage if it is enabled. Returns a note for the final message.
+        #
+        if not self.pack_max_size or not self.running or not os.path.isdir(self.target_path):
+            return ""
+        packed_files, packed_bytes, errors = pack_small_files(
+            self.target_path, self.pack_max_size, self.pack_min_age,
+            should_continue=lambda: self.running, on_status=self.status_updated.emit)
+        for entry in errors:
+            self.error_report.append(entry)
+            count_error(entry)
+        if errors:
+            self.error_report_ready.emit(self.error_report)
+            # Runs with nothing to move report nothing else.
+        return f" Packed {packed_files} small file(s) ({format_size(packed_bytes)})." if packed_files else ""
+    #
+    #
+    def run_sharded(self):
+        # Organize one huge folder with 'shards' processes. This thread lists the
+        # folder and shares the names out by hash; each shard stats, sniffs and
+        # groups its own files, then moves them. In between, this thread applies
+        # the minimum file count, creates the folders and picks every destination
+        # name from the one conflict index, so two shards never claim the same name.
+        #
+        shard_count = self.shards
+        started = time.monotonic()
+        filenames = []
+        # The accepted file names, in directory order.
+        with os.scandir(self.target_path) as entries:
+            for entry in entries:
+                if self.name_filter.accepts(entry.name) and entry.is_file():
+                    filenames.append(entry.name)
+                    # The file type comes with the listing; stat calls are left to the shards.
+        shard_names = [[] for _ in range(shard_count)]
+        for filename in filenames:
+            shard_names[shard_of(filename, shard_count)].append(filename)
+            # The same name always lands in the same shard.
+        self.status_updated.emit(f"Classifying {len(filenames)} file(s) in {shard_count} processes...")
+        context = multiprocessing.get_context("spawn")
+        # Fresh processes: forking a process that runs Qt threads is unsafe.
+        with context.Manager() as manager, ProcessPoolExecutor(shard_count, mp_context=context) as pool:
+            progress_queue = manager.Queue()
+            # Shards send (files, bytes) progress through this queue.
+            cancel_event = manager.Event()
+            # Set to stop every shard between two chunks or files.
+            resume_event = manager.Event()
+            if self.resume_event.is_set():
+                resume_event.set()
+            # Cleared to pause every shard; pause() and resume() keep it in step.
+            options = (self.detect_content, self.organize_by, self.use_exif_date)
+            groups = {}
+            # Every file's subfolder, merged from all shards: name -> [(shard, filename, size, inode)].
+            for shard, shard_groups in enumerate(pool.map(classify_shard, [self.target_path] * shard_count,
+                                                          shard_names, [options] * shard_count)):
+                for subfolder_name, files in shard_groups.items():
+                    groups.setdefault(subfolder_name, []).extend((shard, *file) for file in files)
+            SCAN_DURATION.observe(time.monotonic() - started)
+            # Listing plus the shards' classification is this mode's scan.
+            plan = {name: files for name, files in groups.items() if len(files) >= self.min_files_count}
+            # Leave out folders that don't meet the minimum file count, counted across all shards.
+            total_files = sum(len(files) for files in plan.values())
+            if total_files == 0:
+                self.status_updated.emit("No files match the criteria to organize.")
+                self.finished.emit(f"No files found to organize.{self.pack_folders()}", 0)
+                return
+            self.progress = ProgressTracker(sum(file[2] for files in plan.values() for file in files), total_files)
+            # Track progress by bytes, from the sizes the shards read.
+            failed_files = 0
+            self.status_updated.emit(f"Creating {len(plan)} folder(s)...")
+            folder_paths, folder_failures = self.create_target_folders(plan)
+            # Create all destination folders in one pass and index the names in them.
+            for subfolder_name, e in folder_failures.items():
+                if not self.retry_policy.continue_on_error:
+                    self.error_occurred.emit(f"Failed to create '{subfolder_name}': {str(e)}")
+                    return
+                for _, filename, size, _ in plan[subfolder_name]:
+                    self.record_error(os.path.join(self.target_path, filename), "create folder", e)
+                    self.progress.finish_file(size)
+                failed_files += len(plan[subfolder_name])
+            moves = [[] for _ in range(shard_count)]
+            # Each shard's moves: (inode, filename, destination, size).
+            for subfolder_name in sorted(folder_paths):
+                for shard, filename, size, inode in sorted(plan[subfolder_name], key=lambda file: file[1]):
+                    moves[shard].append((inode, filename, self.unique_destination(folder_paths[subfolder_name], filename), size))
+                    # Destinations are reserved centrally, in a fixed order.
+            futures = [
+                pool.submit(move_shard, self.target_path, [move[1:] for move in sorted(shard_moves)],
+                            self.retry_policy, self.durable, self.max_ops_per_second / shard_count,
+                            self.max_bytes_per_second / shard_count, progress_queue, cancel_event, resume_event)
+                for shard_moves in moves
+            ]
+            self.shard_resume_event = resume_event
+            # Each shard moves its files in inode order and gets an equal share of the rate limits.
+            while True:
+                if not self.running:
+                    cancel_event.set()
+                    # Pass a cancel on to every shard.
+                finished = all(future.done() for future in futures)
+                try:
+                    while True:
+                        done_files, done_bytes = progress_queue.get(timeout=0 if finished else 0.1)
+                        self.progress.add_bytes(done_bytes, done_files)
+                        # Merge each shard's progress into the overall progress.
+                except queue.Empty:
+                    pass
+                self.status_text = f"Moving files in {shard_count} processes... ({self.progress.done_files}/{total_files})"
+                self.report_progress(force=finished)
+                if finished:
+                    break
+            self.shard_resume_event = None
+            # The manager that holds it shuts down with this block.
+            processed_files = 0
+            for future in futures:
+                moved, errors = future.result()
+                processed_files += moved
+                self.error_report.extend(errors)
+                # Merge each shard's error report into this run's.
+                failed_files += len(errors)
+                for entry in errors:
+                    count_error(entry)
+            failed_paths = {entry["path"] for entry in self.error_report}
+            FILES_MOVED.inc(processed_files)
+            BYTES_MOVED.inc(sum(move[3] for shard_moves in moves for move in shard_moves
+                                if os.path.join(self.target_path, move[1]) not in failed_paths))
+            # The shards' own counts stay in their processes, so count the moves from the plan.
+        if failed_files and not self.retry_policy.continue_on_error:
+            first = self.error_report[0]
+            self.error_occurred.emit(f"Failed to move {os.path.basename(first['path'])}: {first['error']}")
+            return
+        self.finish_moves(processed_files, failed_files, folder_paths)
     #
     #
     def stop(self):
@@ -338,6 +6069,89 @@ class FileOrganizerWorker(QThread):
         #
         self.running = False
         # Set the flag to False, which will cause the main loop in run() to exit.
+        self.resume_event.set()
+        if self.shard_resume_event is not None:
+            self.shard_resume_event.set()
+        # Wake a paused run so it can see the flag; copies stop at their next chunk.
+    #
+    #
+    def pause(self):
+        # Hold the moves between two chunks or files. The plan is kept, so a
+        # resumed run carries on with the next file without scanning again.
+        #
+        if not self.resume_event.is_set():
+            return
+        self.paused_at = time.monotonic()
+        self.resume_event.clear()
+        if self.shard_resume_event is not None:
+            self.shard_resume_event.clear()
+        self.status_updated.emit("Paused.")
+    #
+    #
+    def resume(self):
+        # Carry on after pause().
+        #
+        if self.resume_event.is_set():
+            return
+        paused = time.monotonic() - self.paused_at
+        if self.progress:
+            self.progress.skip(paused)
+            # The pause is not part of the speed or the time left.
+        self.move_concurrency.exclude(paused)
+        # Nor does it make the file system look slow to the controller.
+        if self.shard_resume_event is not None:
+            self.shard_resume_event.set()
+        self.resume_event.set()
+        self.status_updated.emit("Resumed.")
+    #
+    #
+    def wait_while_paused(self):
+        # Block while the run is paused, then raise MoveCancelled if it was
+        # cancelled meanwhile (stop() also wakes a paused run).
+        #
+        self.resume_event.wait()
+        if not self.running:
+            raise MoveCancelled()
+#
+#
+class FileOrganizerWorker(QThread, OrganizerEngine):
+    # This class runs the file organization logic in a separate thread.
+    #
+    # It inherits from QThread to handle background tasks.
+    #
+    # This prevents the main GUI from freezing while files are being moved.
+    #
+    #
+    # Define signals to communicate updates back to the main GUI thread.
+    progress_updated = pyqtSignal(int)
+    # Signal that sends an integer value for the progress bar.
+    status_updated = pyqtSignal(str)
+    # Signal that sends a string for the status message label.
+    finished = pyqtSignal(str, int)
+    # Signal that sends a final message and the count of files organized.
+    error_occurred = pyqtSignal(str)
+    # Signal that sends an error message if something goes wrong.
+    error_report_ready = pyqtSignal(list)
+    # Signal that sends the list of files that failed, sent just before 'finished'.
+    concurrency_updated = pyqtSignal(str)
+    # Signal that sends the parallelism the adaptive controllers have chosen.
+    statistics_updated = pyqtSignal(object)
+    # Signal that sends a snapshot of the scan statistics, several times a second while scanning.
+    #
+    #
+    def __init__(self, *args, **kwargs):
+        # Initialize the worker thread with the user's selected path and options.
+        #
+        QThread.__init__(self)
+        # Call the constructor of the parent QThread class.
+        OrganizerEngine.__init__(self, *args, **kwargs)
+        # Set up the engine with the options.
+    #
+    #
+    def run(self):
+        # The thread's entry point: run the engine in this thread.
+        #
+        OrganizerEngine.run(self)
 #
 #
 #
@@ -364,6 +6178,10 @@ class FileOrganizerGUI(QMainWindow):
         # A list to store a history of organization actions (though not used in current version).
         self.session_organized_count = 0
         # A counter for files organized in the current session.
+        self.last_error_report = []
+        # The files that failed during the most recent organization run.
+        self.view_root = ""
+        # The folder the last linked view was built in.
         self.init_ui()
         # Call the method to build the graphical user interface.
         self.load_settings()
@@ -623,10 +6441,271 @@ class FileOrganizerGUI(QMainWindow):
         # Add the label to the grid at row 0, column 2, aligned to the right.
         options_layout.addWidget(self.min_files_spinbox, 0, 3)
         # Add the spin box to the grid at row 0, column 3.
+        organize_by_label = QLabel("Organize by:")
+        # Create a label for the organization scheme.
+        self.organize_by_combo = QComboBox()
+        # Create a drop-down list of organization schemes.
+        self.organize_by_combo.addItem("File type (PDF Files, ...)", "type")
+        # Group files into one folder per extension.
+        self.organize_by_combo.addItem("Date modified (YYYY/MM)", "date")
+        # Group files into year and month folders.
+        options_layout.addWidget(organize_by_label, 1, 2, Qt.AlignRight)
+        # Add the label to the grid at row 1, column 2, aligned to the right.
+        options_layout.addWidget(self.organize_by_combo, 1, 3)
+        # Add the drop-down list to the grid at row 1, column 3.
+        self.use_exif_date = QCheckBox("Use photo date (EXIF)")
+        # Create a checkbox for filing photos by the date they were taken.
+        self.use_exif_date.setToolTip("In date mode, files photos by the date they were taken instead of their modification date.")
+        # Add a tooltip for user guidance.
+        self.use_exif_date.setEnabled(False)
+        # Only available in date mode.
+        options_layout.addWidget(self.use_exif_date, 4, 0)
+        # Add the checkbox to the grid layout at row 4, column 0.
+        self.durable_moves = QCheckBox("Flush moves to disk (fsync)")
+        # Create a checkbox for making moves durable.
+        self.durable_moves.setToolTip("Makes sure moved files survive a crash or power cut. "
+                                      "Folders are flushed once at the end, not after every file.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(self.durable_moves, 5, 0)
+        # Add the checkbox to the grid layout at row 5, column 0.
+        self.verify_backups = QCheckBox("Verify backup before organizing")
+        # Create a checkbox for re-reading the backup before anything is moved.
+        self.verify_backups.setChecked(True)
+        # Set it to be checked by default.
+        self.verify_backups.setToolTip("Reads the backup back on all CPU cores and checks every file's size and "
+                                       "checksum. Organizing only starts if the backup is sound.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(self.verify_backups, 6, 0)
+        # Add the checkbox to the grid layout at row 6, column 0.
+        self.create_backups.toggled.connect(self.verify_backups.setEnabled)
+        # Verification only matters when backups are made.
+        self.organize_by_combo.currentIndexChanged.connect(
+            lambda: self.use_exif_date.setEnabled(self.organize_by_combo.currentData() == "date"))
+        # Enable the EXIF option only when organizing by date.
+        output_label = QLabel("Output:")
+        # Create a label for the output mode.
+        output_label.setToolTip("A view leaves the files where they are and builds the organized folders "
+                                "as links in a separate folder. Re-running it only updates what changed.")
+        # Add a tooltip for user guidance.
+        self.output_combo = QComboBox()
+        # Create a drop-down list of output modes.
+        self.output_combo.addItem("Move files", None)
+        # Move the files into the organized folders.
+        self.output_combo.addItem("Symlink view", "symlink")
+        # Build the organized folders out of symbolic links.
+        self.output_combo.addItem("Hardlink view", "hardlink")
+        # Build the organized folders out of hard links (same disk only).
+        options_layout.addWidget(output_label, 4, 2, Qt.AlignRight)
+        # Add the label to the grid at row 4, column 2, aligned to the right.
+        options_layout.addWidget(self.output_combo, 4, 3)
+        # Add the drop-down list to the grid at row 4, column 3.
+        self.detect_content = QCheckBox("Detect file type from content")
+        # Create a checkbox for content-based type detection.
+        self.detect_content.setToolTip("Reads the first few KB of each file to recognise files with a missing or wrong extension.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(self.detect_content, 1, 0)
+        # Add the checkbox to the grid layout at row 1, column 0.
+        self.continue_on_error = QCheckBox("Continue past errors")
+        # Create a checkbox for skipping files that fail instead of stopping.
+        self.continue_on_error.setChecked(True)
+        # Set the checkbox to be checked by default.
+        self.continue_on_error.setToolTip("Retries briefly locked files, skips files that still fail and lists them at the end.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(self.continue_on_error, 2, 0)
+        # Add the checkbox to the grid layout at row 2, column 0.
+        self.background_mode = QCheckBox("Background mode (low priority)")
+        # Create a checkbox for running at low priority with rate limits.
+        self.background_mode.setToolTip("Lowers the organizer's CPU and disk priority and applies the limits on the right, "
+                                        "so it does not slow down other users of the machine.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(self.background_mode, 3, 0)
+        # Add the checkbox to the grid layout at row 3, column 0.
+        max_ops_label = QLabel("Max files per second:")
+        # Create a label for the files-per-second limit.
+        self.max_ops_spinbox = QSpinBox()
+        # Create a spin box for the files-per-second limit.
+        self.max_ops_spinbox.setRange(0, 100000)
+        # 0 means no limit.
+        self.max_ops_spinbox.setSpecialValueText("Unlimited")
+        # Show 'Unlimited' instead of 0.
+        options_layout.addWidget(max_ops_label, 2, 2, Qt.AlignRight)
+        # Add the label to the grid at row 2, column 2, aligned to the right.
+        options_layout.addWidget(self.max_ops_spinbox, 2, 3)
+        # Add the spin box to the grid at row 2, column 3.
+        max_mbps_label = QLabel("Max MB per second:")
+        # Create a label for the bandwidth limit.
+        self.max_mbps_spinbox = QSpinBox()
+        # Create a spin box for the bandwidth limit.
+        self.max_mbps_spinbox.setRange(0, 100000)
+        # 0 means no limit.
+        self.max_mbps_spinbox.setSpecialValueText("Unlimited")
+        # Show 'Unlimited' instead of 0.
+        options_layout.addWidget(max_mbps_label, 3, 2, Qt.AlignRight)
+        # Add the label to the grid at row 3, column 2, aligned to the right.
+        options_layout.addWidget(self.max_mbps_spinbox, 3, 3)
+        # Add the spin box to the grid at row 3, column 3.
+        compression_label = QLabel("Backup compression:")
+        # Create a label for the backup compression level.
+        self.compression_spinbox = QSpinBox()
+        # Create a spin box for the deflate level used by backups.
+        self.compression_spinbox.setRange(0, 9)
+        # 1 is fastest, 9 is smallest.
+        self.compression_spinbox.setValue(6)
+        # Default to zlib's usual level.
+        self.compression_spinbox.setSpecialValueText("Store only")
+        # 0 stores every file uncompressed, which is the fastest backup.
+        self.compression_spinbox.setToolTip("Already-compressed files (photos, videos, archives, Office documents) "
+                                             "are always stored as is; other files are deflated at this level.")
+        # Explain the per-type policy.
+        options_layout.addWidget(compression_label, 5, 2, Qt.AlignRight)
+        # Add the label to the grid at row 5, column 2, aligned to the right.
+        options_layout.addWidget(self.compression_spinbox, 5, 3)
+        # Add the spin box to the grid at row 5, column 3.
+        self.create_backups.toggled.connect(self.compression_spinbox.setEnabled)
+        # The level only matters when backups are made.
+        backup_format_label = QLabel("Backup format:")
+        # Create a label for the archive format drop-down.
+        self.backup_format_combo = QComboBox()
+        # Create a drop-down list for the archive format.
+        self.backup_format_combo.addItem("ZIP", "zip")
+        self.backup_format_combo.addItem("TAR (streamed)", "tar")
+        self.backup_format_combo.addItem("TAR.GZ (streamed)", "tar.gz")
+        self.backup_format_combo.addItem("TAR.XZ (streamed)", "tar.xz")
+        self.backup_format_combo.addItem("Incremental store", "incremental")
+        # An incremental store only saves what changed since the last run.
+        # Tar formats stream with constant memory, whatever the folder size.
+        options_layout.addWidget(backup_format_label, 6, 2, Qt.AlignRight)
+        # Add the label to the grid at row 6, column 2, aligned to the right.
+        options_layout.addWidget(self.backup_format_combo, 6, 3)
+        # Add the drop-down list to the grid at row 6, column 3.
+        self.create_backups.toggled.connect(self.backup_format_combo.setEnabled)
+        # The format only matters when backups are made.
+        shards_label = QLabel("Processes:")
+        # Create a label for the number of organizing processes.
+        self.shards_spinbox = QSpinBox()
+        # Create a spin box for the number of processes.
+        self.shards_spinbox.setRange(1, max(2, (os.cpu_count() or 1) * 2))
+        # Up to two processes per CPU core.
+        self.shards_spinbox.setSpecialValueText("1 (single thread)")
+        # Show that 1 keeps the classic single-threaded engine.
+        self.shards_spinbox.setToolTip("For folders with a huge number of files: the files are shared out between "
+                                       "this many processes, which classify and move them in parallel.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(shards_label, 7, 2, Qt.AlignRight)
+        # Add the label to the grid at row 7, column 2, aligned to the right.
+        options_layout.addWidget(self.shards_spinbox, 7, 3)
+        # Add the spin box to the grid at row 7, column 3.
+        parallel_label = QLabel("Max parallel I/O:")
+        # Create a label for the concurrency bound.
+        self.parallel_spinbox = QSpinBox()
+        # Create a spin box for the most operations run at once.
+        self.parallel_spinbox.setRange(1, 64)
+        self.parallel_spinbox.setValue(8)
+        # A good ceiling for most network shares.
+        self.parallel_spinbox.setToolTip("Scans and moves measure their own speed and run as many operations at once "
+                                         "as the disk or share rewards, up to this limit. 1 moves files one by one.")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(parallel_label, 8, 2, Qt.AlignRight)
+        # Add the label to the grid at row 8, column 2, aligned to the right.
+        options_layout.addWidget(self.parallel_spinbox, 8, 3)
+        # Add the spin box to the grid at row 8, column 3.
+        memory_label = QLabel("Memory budget:")
+        # Create a label for the planning memory budget.
+        self.memory_spinbox = QSpinBox()
+        # Create a spin box for the budget in megabytes.
+        self.memory_spinbox.setRange(0, 65536)
+        self.memory_spinbox.setSingleStep(64)
+        self.memory_spinbox.setSuffix(" MB")
+        self.memory_spinbox.setSpecialValueText("Unlimited")
+        # 0 keeps the whole scan in memory.
+        self.memory_spinbox.setToolTip("For folders with millions of files: past this much memory, the scan and "
+                                       "plan continue in a temporary file on disk, and the preview shows only "
+                                       "what fits (the full plan is saved to a file).")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(memory_label, 9, 2, Qt.AlignRight)
+        # Add the label to the grid at row 9, column 2, aligned to the right.
+        options_layout.addWidget(self.memory_spinbox, 9, 3)
+        # Add the spin box to the grid at row 9, column 3.
+        pack_size_label = QLabel("Pack files up to:")
+        # Create a label for the small-file packing threshold.
+        self.pack_size_spinbox = QSpinBox()
+        # Create a spin box for the largest file that is packed, in kilobytes.
+        self.pack_size_spinbox.setRange(0, 1024 * 1024)
+        self.pack_size_spinbox.setSingleStep(16)
+        self.pack_size_spinbox.setSuffix(" KB")
+        self.pack_size_spinbox.setSpecialValueText("Off")
+        # 0 leaves every file as it is.
+        self.pack_size_spinbox.setToolTip("After organizing, files up to this size that are old enough are packed "
+                                          "into one archive per '<EXT> Files' folder, with an index for reading "
+                                          "single files back (the list-pack and extract-pack commands).")
+        # Add a tooltip for user guidance.
+        options_layout.addWidget(pack_size_label, 10, 2, Qt.AlignRight)
+        # Add the label to the grid at row 10, column 2, aligned to the right.
+        options_layout.addWidget(self.pack_size_spinbox, 10, 3)
+        # Add the spin box to the grid at row 10, column 3.
+        pack_age_label = QLabel("Pack when older than:")
+        # Create a label for the packing age threshold.
+        self.pack_age_spinbox = QSpinBox()
+        # Create a spin box for the age in days.
+        self.pack_age_spinbox.setRange(0, 3650)
+        self.pack_age_spinbox.setValue(30)
+        self.pack_age_spinbox.setSuffix(" days")
+        # Only files not modified for this long are packed.
+        options_layout.addWidget(pack_age_label, 11, 2, Qt.AlignRight)
+        # Add the label to the grid at row 11, column 2, aligned to the right.
+        options_layout.addWidget(self.pack_age_spinbox, 11, 3)
+        # Add the spin box to the grid at row 11, column 3.
+        self.background_mode.toggled.connect(self.max_ops_spinbox.setEnabled)
+        # The limits only apply in background mode.
+        self.background_mode.toggled.connect(self.max_mbps_spinbox.setEnabled)
+        #
+        self.max_ops_spinbox.setEnabled(False)
+        # Start with the limits disabled, like the checkbox.
+        self.max_mbps_spinbox.setEnabled(False)
+        #
         options_layout.setColumnStretch(1, 1)
         # Add a stretchable space between the widgets.
         folder_layout.addLayout(options_layout)
         # Add the options layout to the folder group's vertical layout.
+        #
+        filter_layout = QGridLayout()
+        # Create a grid layout for the file name filters.
+        exclude_label = QLabel("Exclude:")
+        # Create a label for the exclude patterns.
+        self.exclude_edit = QLineEdit(DEFAULT_EXCLUDE_PATTERNS)
+        # Create a text field for the exclude patterns, filled with sensible defaults.
+        self.exclude_edit.setToolTip("Files matching any of these patterns are never moved, e.g. '*.part; .*'. "
+                                     "Separate patterns with ';'.")
+        # Add a tooltip for user guidance.
+        filter_layout.addWidget(exclude_label, 0, 0)
+        # Add the label to the grid at row 0, column 0.
+        filter_layout.addWidget(self.exclude_edit, 0, 1)
+        # Add the text field to the grid at row 0, column 1.
+        include_label = QLabel("Include only:")
+        # Create a label for the include patterns.
+        self.include_edit = QLineEdit()
+        # Create a text field for the include patterns.
+        self.include_edit.setPlaceholderText("All files (e.g. *.jpg; *.png to organize only images)")
+        # Set placeholder text for when the field is empty.
+        filter_layout.addWidget(include_label, 1, 0)
+        # Add the label to the grid at row 1, column 0.
+        filter_layout.addWidget(self.include_edit, 1, 1)
+        # Add the text field to the grid at row 1, column 1.
+        backup_target_label = QLabel("Backup to:")
+        # Create a label for the backup destination.
+        self.backup_target_edit = QLineEdit()
+        # Create a text field for the backup destination.
+        self.backup_target_edit.setPlaceholderText("Next to the folder (or another folder, a file, or '| command')")
+        # Set placeholder text for when the field is empty.
+        self.backup_target_edit.setToolTip("Start with '|' to stream the backup into a command, "
+                                           "e.g. '| ssh backup-host \"cat > photos.tar.gz\"'.")
+        # Explain pipe targets.
+        filter_layout.addWidget(backup_target_label, 2, 0)
+        # Add the label to the grid at row 2, column 0.
+        filter_layout.addWidget(self.backup_target_edit, 2, 1)
+        # Add the text field to the grid at row 2, column 1.
+        folder_layout.addLayout(filter_layout)
+        # Add the filter layout to the folder group's vertical layout.
         main_layout.addWidget(folder_group)
         # Add the folder group box to the main layout.
         #
@@ -666,14 +6745,27 @@ class FileOrganizerGUI(QMainWindow):
         preview_layout.addLayout(stats_layout)
         # Add the statistics layout to the preview group's layout.
         #
+        self.preview_tabs = QTabWidget()
+        # Create tabs for the plan and the detailed statistics.
         self.preview_text = QTextEdit()
         # Create a multi-line text edit widget for the preview text.
         self.preview_text.setReadOnly(True)
         # Make the text edit read-only.
         self.preview_text.setPlaceholderText("Click 'Preview Organization' to see the plan...")
         # Set placeholder text.
-        preview_layout.addWidget(self.preview_text)
-        # Add the text edit to the preview layout.
+        self.preview_tabs.addTab(self.preview_text, "Plan")
+        # The plan is the first tab.
+        self.statistics_text = QTextEdit()
+        # Create a text area for the detailed statistics.
+        self.statistics_text.setReadOnly(True)
+        # Make the text edit read-only.
+        self.statistics_text.setPlaceholderText("Bytes per type, file sizes, ages and folder sizes appear here "
+                                                "while a folder is scanned.")
+        # Set placeholder text.
+        self.preview_tabs.addTab(self.statistics_text, "Statistics")
+        # The statistics are the second tab.
+        preview_layout.addWidget(self.preview_tabs)
+        # Add the tabs to the preview layout.
         #
         main_layout.addWidget(preview_group, stretch=1)
         # Add the preview group box to the main layout, with a stretch factor
@@ -726,6 +6818,33 @@ class FileOrganizerGUI(QMainWindow):
         # Initially, disable the button.
         button_layout.addWidget(self.organize_btn)
         # Add the button to the layout.
+        self.flatten_btn = QPushButton("↩️ Flatten Folders")
+        # Create the flatten button, which undoes an organization.
+        self.flatten_btn.setToolTip("Move the files in this folder's '<EXT> Files' folders back into it "
+                                    "and remove the folders that end up empty.")
+        # Add a tooltip for user guidance.
+        self.flatten_btn.clicked.connect(self.flatten_folders)
+        # Connect the button's signal to the 'flatten_folders' method.
+        self.flatten_btn.setEnabled(False)
+        # Initially, disable the button.
+        button_layout.addWidget(self.flatten_btn)
+        # Add the button to the layout.
+        self.pause_btn = QPushButton("⏸️ Pause")
+        # Create the pause button, which holds a run without losing its place.
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        # Connect the button's signal to the 'toggle_pause' method.
+        self.pause_btn.setEnabled(False)
+        # Only enabled while a run is in progress.
+        button_layout.addWidget(self.pause_btn)
+        # Add the button to the layout.
+        self.cancel_btn = QPushButton("⏹️ Cancel")
+        # Create the cancel button.
+        self.cancel_btn.clicked.connect(self.cancel_run)
+        # Connect the button's signal to the 'cancel_run' method.
+        self.cancel_btn.setEnabled(False)
+        # Only enabled while a run is in progress.
+        button_layout.addWidget(self.cancel_btn)
+        # Add the button to the layout.
         self.clear_btn = QPushButton("🗑️ Clear")
         # Create the clear button.
         self.clear_btn.setObjectName("clearBtn")
@@ -812,6 +6931,8 @@ class FileOrganizerGUI(QMainWindow):
             # Enable the preview button.
             self.organize_btn.setEnabled(True)
             # Enable the organize button.
+            self.flatten_btn.setEnabled(True)
+            # Only a folder can be flattened.
             self.preview_organization()
             # Immediately run a preview for the selected folder.
             self.status_bar.showMessage(f"Selected folder: {self.selected_path}", 5000)
@@ -839,6 +6960,8 @@ class FileOrganizerGUI(QMainWindow):
             # Enable the preview button.
             self.organize_btn.setEnabled(True)
             # Enable the organize button.
+            self.flatten_btn.setEnabled(False)
+            # A single file has no folders to flatten.
             self.preview_organization()
             # Immediately run a preview for the selected file.
             self.status_bar.showMessage(f"Selected file: {self.selected_path}", 5000)
@@ -862,6 +6985,8 @@ class FileOrganizerGUI(QMainWindow):
         # Get the minimum files value from the spin box.
         self.preview_text.clear()
         # Clear the preview text area.
+        self.statistics_text.clear()
+        # Clear the statistics of any earlier scan.
         self.total_files_label.setText("Total files: 0")
         # Reset the stats labels.
         self.file_types_label.setText("File types: 0")
@@ -869,17 +6994,20 @@ class FileOrganizerGUI(QMainWindow):
         self.folders_created_label.setText("Folders to create: 0")
         #
         #
+        worker = self.make_worker()
+        # Create a temporary worker instance to classify the files.
+        #
         if os.path.isfile(self.selected_path):
             # If the selected path is a file.
             file_name = os.path.basename(self.selected_path)
             # Get the file name.
-            file_extension = file_name.split('.')[-1].lower()
+            file_extension = worker.detect_extension(self.selected_path)
             # Get the file extension.
             if file_extension:
                 # If the file has an extension.
                 preview_text = f"Organization Plan:\n" + "—"*20 + "\n"
                 # Create a header for the preview text.
-                preview_text += f"-> Move '{file_name}' to new folder: '{file_extension.upper()} Files'\n"
+                preview_text += f"-> Move '{file_name}' to new folder: '{worker.subfolder_for_file(self.selected_path, file_extension)}'\n"
                 # Add the organization plan for the single file.
                 self.preview_text.setText(preview_text)
                 # Display the preview text.
@@ -891,7 +7019,7 @@ class FileOrganizerGUI(QMainWindow):
                 #
             else:
                 # If the file has no extension.
-                self.preview_text.setText("File has no extension, cannot be organized.")
+                self.preview_text.setText("File has no recognizable type, cannot be organized.")
                 # Display a message.
             self.status_label.setText("Preview generated for a single file.")
             # Display a status message.
@@ -901,94 +7029,28 @@ class FileOrganizerGUI(QMainWindow):
             # If the selected path is a folder.
             try:
                 #
-                worker = FileOrganizerWorker(self.selected_path)
-                # Create a temporary worker instance to get file extensions.
-                extensions = worker.get_file_extensions(self.selected_path)
-                # Get the dictionary of files grouped by extension.
-                total_files = sum(len(files) for files in extensions.values())
-                # Count the total number of files.
-                file_types = len(extensions)
-                # Count the number of unique file types.
-                #
-                filtered_extensions = {
-                    ext: files for ext, files in extensions.items()
-                    if len(files) >= min_files
-                }
-                # Filter extensions based on the minimum file count.
-                #
-                folders_to_create = len(filtered_extensions)
-                # Count how many folders will be created.
-                preview_text = f"📁 {os.path.basename(self.selected_path)}\n"
-                # Start the preview text with the folder name.
-                #
-                if not filtered_extensions:
-                    # If no folders will be created based on the filter.
-                    preview_text += f"└── (No folders will be created based on current settings.)"
-                    # Add a message to the preview.
-                    self.preview_text.setText(preview_text)
-                    # Display the text.
-                    self.total_files_label.setText(f"Total files: {total_files}")
-                    # Update the stats labels.
-                    self.file_types_label.setText(f"File types: {file_types}")
-                    #
-                    self.folders_created_label.setText(f"Folders to create: {folders_to_create}")
-                    #
-                    self.status_label.setText("Preview generated. No files to organize with current settings.")
-                    #
-                    return
-                    # Exit the method.
-                #
-                # Sort the extensions for a consistent and readable preview.
-                sorted_extensions = sorted(extensions.items())
-                #
-                for i, (ext, files) in enumerate(sorted_extensions):
-                    # Loop through the sorted extensions.
-                    is_last_ext = (i == len(sorted_extensions) - 1)
-                    # Check if this is the last extension to format the output correctly.
-                    ext_folder_name = f"{ext.upper()} Files"
-                    # Create the folder name, e.g., 'PDF Files'.
-                    #
-                    if len(files) >= min_files:
-                        # If the extension meets the minimum file count.
-                        ext_folder_prefix = "└── " if is_last_ext else "├── "
-                        # Choose the appropriate prefix for the folder line.
-                        preview_text += f"{ext_folder_prefix}📂 {ext_folder_name}\n"
-                        # Add the folder line to the preview.
-                        #
-                        sorted_files = sorted(files)
-                        # Sort the files within the folder for a clean preview.
-                        for j, filename in enumerate(sorted_files):
-                            # Loop through each file in the folder.
-                            is_last_file = (j == len(sorted_files) - 1)
-                            # Check if this is the last file for formatting.
-                            #
-                            if is_last_ext:
-                                # If this is the last extension.
-                                file_prefix = "    └── " if is_last_file else "    ├── "
-                                # Use a shorter prefix for the last folder.
-                            else:
-                                # If there are more extensions after this one.
-                                file_prefix = "│   └── " if is_last_file else "│   ├── "
-                                # Use a prefix with a vertical line.
-                            #
-                            preview_text += f"{file_prefix}{filename}\n"
-                            # Add the file name line to the preview.
-                    else:
-                        # If the extension does not meet the minimum file count.
-                        ext_prefix = "└── " if is_last_ext else "├── "
-                        # Choose the appropriate prefix.
-                        preview_text += f"{ext_prefix} 🚫 Skipping '{ext_folder_name}' ({len(files)} file(s), less than min {min_files})\n"
-                        # Add a message indicating the folder will be skipped.
-                #
-                self.preview_text.setText(preview_text)
-                # Display the final preview text.
-                self.total_files_label.setText(f"Total files: {total_files}")
-                # Update the statistics labels.
-                self.file_types_label.setText(f"File types: {file_types}")
-                #
-                self.folders_created_label.setText(f"Folders to create: {folders_to_create}")
-                #
-                self.status_label.setText("Preview generated. Ready to organize.")
+                worker.statistics_updated.connect(self.show_statistics)
+                # Show the statistics live while the folder is scanned.
+                with ThreadPoolExecutor(max_workers=1) as runner:
+                    scan = runner.submit(worker.scan_within_budget, self.selected_path)
+                    # Scan and group in the background so large folders don't freeze the window.
+                    while not scan.done():
+                        QApplication.processEvents()
+                        time.sleep(0.02)
+                groups = scan.result()
+                # Group the files by the subfolder they would go into.
+                QApplication.processEvents()
+                # Deliver the last statistics sent by the scan.
+                self.show_statistics(worker.statistics.snapshot())
+                # The final totals, gathered during the scan itself.
+                if isinstance(groups, SpilledPlan):
+                    with groups:
+                        self.show_plan_preview({folder: count for folder, (count, _) in groups.folder_counts().items()},
+                                               groups.files, min_files, worker.memory_budget)
+                        # Read the plan back from disk, one folder at a time.
+                else:
+                    self.show_plan_preview({folder: len(files) for folder, files in groups.items()},
+                                           lambda folder: sorted(groups[folder]), min_files, worker.memory_budget)
                 #
             except Exception as e:
                 # If an error occurs during preview generation.
@@ -1000,6 +7062,43 @@ class FileOrganizerGUI(QMainWindow):
             # Display a status message.
     #
     #
+    def show_plan_preview(self, counts, files_of, min_files, memory_budget):
+        # Show the preview tree for a scanned folder. With a memory budget, only as
+        # much of the tree as fits in a quarter of it is shown, and the full plan
+        # is written to a text file instead.
+        #
+        root_name = os.path.basename(self.selected_path)
+        if not any(count >= min_files for count in counts.values()):
+            # If no folders will be created based on the filter.
+            self.preview_text.setText(f"📁 {root_name}\n└── (No folders will be created based on current settings.)")
+            self.status_label.setText("Preview generated. No files to organize with current settings.")
+            return
+        lines = []
+        # The lines to show.
+        shown_bytes = 0
+        # Roughly how much memory they take.
+        for line in plan_preview_lines(root_name, counts, files_of, min_files):
+            shown_bytes += len(line) * 4
+            # Python and the text widget each keep a copy, in up to two bytes per character.
+            if memory_budget and shown_bytes > memory_budget // 4:
+                plan_path = os.path.join(tempfile.gettempdir(), f"organizer-plan-{datetime.now():%Y%m%d_%H%M%S}.txt")
+                with open(plan_path, "w", encoding="utf-8") as f:
+                    for full_line in plan_preview_lines(root_name, counts, files_of, min_files):
+                        f.write(full_line + "\n")
+                        # Stream the whole tree to the file, a line at a time.
+                total_lines = 1 + len(counts) + sum(count for count in counts.values() if count >= min_files)
+                # The root, one line per folder and one per file in the folders that are created.
+                lines.append(f"… {total_lines - len(lines):,} more line(s) not shown to stay within "
+                             f"the memory budget. The full plan is in {plan_path}")
+                break
+            lines.append(line)
+        self.preview_text.setText("\n".join(lines) + "\n")
+        # Display the final preview text.
+        peak = peak_memory_usage()
+        memory_note = f" Peak memory: {format_size(peak)}." if peak and memory_budget else ""
+        self.status_label.setText(f"Preview generated. Ready to organize.{memory_note}")
+    #
+    #
     def organize_files(self):
         # This method starts the file organization process in a separate thread.
         #
@@ -1010,35 +7109,144 @@ class FileOrganizerGUI(QMainWindow):
             return
             # Exit the method.
         #
+        view_mode = self.output_combo.currentData()
+        # None moves the files, otherwise a linked view is built.
+        if view_mode:
+            # A view needs a separate folder to be built in.
+            view_root = QFileDialog.getExistingDirectory(self, "Select Folder for the Organized View",
+                                                         self.settings.value("viewRoot", ""))
+            # Ask where to build the view, starting from the last one used.
+            if not view_root:
+                # The user cancelled the dialog.
+                return
+            self.view_root = view_root
+            # Remember the view folder for the worker.
+            self.settings.setValue("viewRoot", view_root)
+            # Offer the same folder next time, so the view is refreshed rather than rebuilt.
+            action_note = f"This action will build a {view_mode} view in:\n{view_root}\n\nNo files will be moved."
+        else:
+            action_note = "This action will move files."
         reply = QMessageBox.question(self, "Confirm Organization",
-                                     f"Are you sure you want to organize:\n{self.selected_path}?\n\nThis action will move files.",
+                                     f"Are you sure you want to organize:\n{self.selected_path}?\n\n{action_note}",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         # Ask the user for confirmation before proceeding.
         if reply == QMessageBox.Yes:
             # If the user confirms.
-            if self.create_backups.isChecked():
+            if self.create_backups.isChecked() and not view_mode:
+                # Check if the backup option is selected. A view moves nothing, so needs no backup.
                 # Check if the backup option is selected.
                 if not self.create_backup():
                     # If the backup fails, stop the organization process.
                     return
-            self.set_ui_enabled(False)
-            # Disable GUI elements to prevent user interaction during the process.
-            self.progress_bar.setValue(0)
-            # Reset the progress bar.
-            min_files = self.min_files_spinbox.value()
-            # Get the minimum files value.
-            self.worker = FileOrganizerWorker(self.selected_path, min_files)
-            # Create a new instance of the worker thread.
-            self.worker.progress_updated.connect(self.update_progress)
-            # Connect the worker's progress signal to the GUI's update method.
-            self.worker.status_updated.connect(self.update_status)
-            # Connect the worker's status signal to the GUI's update method.
-            self.worker.finished.connect(self.organization_finished)
-            # Connect the worker's finished signal to the GUI's handler.
-            self.worker.error_occurred.connect(self.organization_error)
-            # Connect the worker's error signal to the GUI's handler.
-            self.worker.start()
-            # Start the worker thread.
+            self.start_worker(self.make_worker())
+            # Run the organization in the background.
+    #
+    #
+    def flatten_folders(self):
+        # Undo an organization: move the files in the selected folder's
+        # '<EXT> Files' folders back into it, in a separate thread.
+        #
+        reply = QMessageBox.question(self, "Confirm Flatten",
+                                     f"Move the files in the '<EXT> Files' folders of:\n{self.selected_path}\n"
+                                     "back into it and remove the folders that end up empty?\n\n"
+                                     "Files whose names are taken get a number, as when organizing.",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        # Ask the user for confirmation before proceeding.
+        if reply != QMessageBox.Yes:
+            return
+        if self.create_backups.isChecked() and not self.create_backup():
+            # Back up first if requested, and stop if the backup fails.
+            return
+        self.start_worker(self.make_worker(flatten=True))
+        # Run the flattening in the background.
+    #
+    #
+    def start_worker(self, worker):
+        # Start a worker thread with its signals connected to the GUI.
+        #
+        self.set_ui_enabled(False)
+        # Disable GUI elements to prevent user interaction during the process.
+        self.progress_bar.setValue(0)
+        # Reset the progress bar.
+        self.last_error_report = []
+        # Forget the failures of any previous run.
+        self.worker = worker
+        # Keep the worker thread alive while it runs.
+        self.worker.progress_updated.connect(self.update_progress)
+        # Connect the worker's progress signal to the GUI's update method.
+        self.worker.status_updated.connect(self.update_status)
+        # Connect the worker's status signal to the GUI's update method.
+        self.worker.finished.connect(self.organization_finished)
+        # Connect the worker's finished signal to the GUI's handler.
+        self.worker.error_occurred.connect(self.organization_error)
+        # Connect the worker's error signal to the GUI's handler.
+        self.worker.error_report_ready.connect(self.store_error_report)
+        # Connect the worker's error report signal to the GUI's handler.
+        self.worker.concurrency_updated.connect(self.status_bar.showMessage)
+        # Show the parallelism the worker settles on in the status bar.
+        self.worker.statistics_updated.connect(self.show_statistics)
+        # Keep the statistics live while the worker scans.
+        self.worker.start()
+        # Start the worker thread.
+    #
+    #
+    def toggle_pause(self):
+        # Pause the running worker between two chunks, or let it carry on.
+        #
+        if not self.worker or not self.worker.isRunning():
+            return
+        if self.worker.resume_event.is_set():
+            self.worker.pause()
+            self.pause_btn.setText("▶️ Resume")
+        else:
+            self.worker.resume()
+            self.pause_btn.setText("⏸️ Pause")
+    #
+    #
+    def cancel_run(self):
+        # Cancel the running worker. A copy in progress stops at its next chunk and
+        # is removed; the worker's 'finished' signal then re-enables the GUI.
+        #
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.cancel_btn.setEnabled(False)
+            self.pause_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+    #
+    #
+    def make_worker(self, flatten=False):
+        # Create a worker thread configured with the options currently set in the GUI.
+        # With 'flatten', the worker undoes an organization instead.
+        #
+        background = self.background_mode.isChecked()
+        # Whether to run at low priority with rate limits.
+        return FileOrganizerWorker(
+            self.selected_path, self.min_files_spinbox.value(), self.detect_content.isChecked(),
+            RetryPolicy(continue_on_error=self.continue_on_error.isChecked()),
+            # Decide how failed files are handled.
+            background_mode=background,
+            max_ops_per_second=self.max_ops_spinbox.value() if background else 0,
+            max_bytes_per_second=self.max_mbps_spinbox.value() * 1024 * 1024 if background else 0,
+            organize_by=self.organize_by_combo.currentData(),
+            use_exif_date=self.use_exif_date.isChecked(),
+            view_mode=self.output_combo.currentData(),
+            view_root=self.view_root,
+            durable=self.durable_moves.isChecked(),
+            name_filter=NameFilter(split_patterns(self.include_edit.text()), split_patterns(self.exclude_edit.text())),
+            # Compile the file name filters once for the whole scan.
+            shards=self.shards_spinbox.value(),
+            # Share huge folders out between several processes.
+            max_parallel=self.parallel_spinbox.value(),
+            # The most file operations the adaptive controllers may run at once.
+            profile="--profile" in sys.argv,
+            # Print the controllers' decisions when started with --profile.
+            memory_budget=self.memory_spinbox.value() * 1024 * 1024,
+            # Spill the scan to disk past this many bytes.
+            flatten=flatten,
+            pack_max_size=self.pack_size_spinbox.value() * 1024,
+            pack_min_age=self.pack_age_spinbox.value() * 86400,
+            # Pack small, old files into per-folder archives after organizing.
+        )
     #
     #
     def create_backup(self):
@@ -1050,49 +7258,45 @@ class FileOrganizerGUI(QMainWindow):
             # Update the status label.
             QApplication.processEvents()
             # Force the GUI to update immediately.
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            # Get the current date and time as a formatted string.
-            #
-            if os.path.isfile(self.selected_path):
-                # If a single file was selected.
-                file_name = os.path.basename(self.selected_path)
-                # Get the file name.
-                parent_dir = os.path.dirname(self.selected_path)
-                # Get the parent directory.
-                archive_path = os.path.join(parent_dir, f"{os.path.splitext(file_name)[0]}_backup_{timestamp}.zip")
-                # Create the full path for the backup ZIP file.
-                #
-                with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    # Open a new ZIP file in write mode.
-                    zipf.write(self.selected_path, file_name)
-                    # Write the file into the ZIP archive.
-                #
-                self.status_bar.showMessage(f"Backup created for '{file_name}' at {archive_path}", 5000)
-                # Display a success message in the status bar.
+            policy = CompressionPolicy(level=self.compression_spinbox.value())
+            # Store already-compressed types and deflate the rest at the chosen level.
             #
+            def show_backup_progress(report):
+                # Keep the window responsive while large folders are archived.
+                if report.files % 50 == 0:
+                    self.status_label.setText(f"Creating backup... {report.files} file(s)")
+                    QApplication.processEvents()
             #
-            elif os.path.isdir(self.selected_path):
-                # If a folder was selected.
-                backup_name = f"{os.path.basename(self.selected_path)}_backup_{timestamp}"
-                # Create a name for the backup folder.
-                parent_dir = os.path.dirname(self.selected_path)
-                # Get the parent directory.
-                archive_path = os.path.join(parent_dir, backup_name)
-                # Create the full path for the backup.
-                #
-                with zipfile.ZipFile(archive_path + '.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    # Open a new ZIP file.
-                    for root, _, files in os.walk(self.selected_path):
-                        # Walk through all directories and files in the selected folder.
-                        for file in files:
-                            # Loop through each file.
-                            file_path = os.path.join(root, file)
-                            # Get the full path to the file.
-                            zipf.write(file_path, os.path.relpath(file_path, os.path.dirname(self.selected_path)))
-                            # Write the file to the ZIP archive, preserving its relative path.
-                #
-                self.status_bar.showMessage(f"Backup created for folder at {archive_path}.zip", 5000)
-                # Display a success message.
+            report = create_backup_archive(self.selected_path, policy, self.backup_format_combo.currentData(),
+                                           self.backup_target_edit.text(), show_backup_progress)
+            # Write the backup in the chosen format, by default next to the selected file or folder.
+            summary = report.summary(policy)
+            # Describe what compression did and saved.
+            if self.verify_backups.isChecked() and report.file_path:
+                # Read the backup back before anything is moved.
+                self.status_label.setText(f"Verifying backup of {report.files} file(s)...")
+                verify_started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=1) as runner:
+                    verification = runner.submit(verify_backup, report)
+                    # Verify in the background so the window stays responsive.
+                    while not verification.done():
+                        QApplication.processEvents()
+                        time.sleep(0.05)
+                problems = verification.result()
+                if problems:
+                    # Never organize on top of a backup that cannot be restored.
+                    box = QMessageBox(QMessageBox.Critical, "Backup Verification Failed",
+                                      f"The backup at {report.archive_path} failed verification "
+                                      f"({len(problems)} problem(s)). Nothing was organized.", QMessageBox.Ok, self)
+                    box.setDetailedText("\n".join(problems[:1000]))
+                    # List the first problems for the curious.
+                    box.exec_()
+                    return False
+                summary += f", verified in {format_duration(time.perf_counter() - verify_started)}"
+            self.status_label.setText(summary)
+            # Show the summary until organizing starts.
+            self.status_bar.showMessage(f"Backup created at {report.archive_path}", 5000)
+            # Display a success message in the status bar.
             #
             return True
             # Return True to indicate a successful backup.
@@ -1121,6 +7325,8 @@ class FileOrganizerGUI(QMainWindow):
         # Clear the preview text area.
         self.preview_text.setPlaceholderText("Click 'Preview Organization' to see the plan...")
         # Restore the placeholder text.
+        self.statistics_text.clear()
+        # Clear the statistics too.
         self.total_files_label.setText("Total files: 0")
         # Reset the statistics labels.
         self.file_types_label.setText("File types: 0")
@@ -1137,6 +7343,9 @@ class FileOrganizerGUI(QMainWindow):
         # Disable the organize button.
         self.set_ui_enabled(True)
         # Re-enable all other UI elements.
+        self.flatten_btn.setEnabled(False)
+        # Nothing is selected to flatten.
+        # Re-enable all other UI elements.
         self.status_bar.showMessage("Selection cleared.", 3000)
         # Display a status message.
     #
@@ -1155,13 +7364,39 @@ class FileOrganizerGUI(QMainWindow):
         # Update the status label's text.
     #
     #
+    def show_statistics(self, snapshot):
+        # A slot method to show a snapshot of the scan statistics, sent while scanning.
+        #
+        min_files = self.min_files_spinbox.value()
+        typed = {extension: totals for extension, totals in snapshot["extensions"].items() if extension}
+        # Files without a type are not organized.
+        self.total_files_label.setText(f"Total files: {sum(files for files, _ in typed.values())}")
+        # Update the statistics labels from the running totals.
+        self.file_types_label.setText(f"File types: {len(typed)}")
+        #
+        self.folders_created_label.setText(
+            f"Folders to create: {sum(1 for files, _ in snapshot['groups'].values() if files >= min_files)}")
+        #
+        self.statistics_text.setPlainText(format_statistics(snapshot, min_files))
+        # Show the detailed statistics.
+    #
+    #
     def organization_finished(self, message, file_count):
         # This method is called when the worker thread successfully finishes.
         #
         self.session_organized_count += file_count
         # Add the number of files organized to the session counter.
-        QMessageBox.information(self, "Success", message)
-        # Show a success message box.
+        if self.last_error_report:
+            # Some files failed, so show them alongside the result.
+            report_box = QMessageBox(QMessageBox.Warning, "Finished with Errors", message, QMessageBox.Ok, self)
+            # Create a warning message box.
+            report_box.setDetailedText(format_error_report(self.last_error_report))
+            # List every failed file under 'Show Details...'.
+            report_box.exec_()
+            # Show the message box.
+        else:
+            QMessageBox.information(self, "Success", message)
+            # Show a success message box.
         self.status_label.setText("Organization complete!")
         # Update the status label.
         self.progress_bar.setValue(100)
@@ -1172,6 +7407,13 @@ class FileOrganizerGUI(QMainWindow):
         # Run a new preview to reflect the changes.
     #
     #
+    def store_error_report(self, error_report):
+        # A slot method to receive the list of failed files from the worker thread.
+        #
+        self.last_error_report = error_report
+        # Keep it until the run's final message is shown.
+    #
+    #
     def organization_error(self, message):
         # This method is called if the worker thread reports an error.
         #
@@ -1193,12 +7435,57 @@ class FileOrganizerGUI(QMainWindow):
         # Enable or disable the browse file button.
         self.organize_btn.setEnabled(enabled)
         # Enable or disable the organize button.
+        self.flatten_btn.setEnabled(enabled and bool(self.selected_path) and os.path.isdir(self.selected_path))
+        # Enable or disable the flatten button, which only applies to folders.
+        self.pause_btn.setEnabled(not enabled)
+        self.pause_btn.setText("⏸️ Pause")
+        self.cancel_btn.setEnabled(not enabled)
+        # Pause and cancel only apply while a run is in progress.
         self.preview_btn.setEnabled(enabled)
         # Enable or disable the preview button.
         self.min_files_spinbox.setEnabled(enabled)
         # Enable or disable the spin box.
         self.create_backups.setEnabled(enabled)
         # Enable or disable the checkbox.
+        self.detect_content.setEnabled(enabled)
+        # Enable or disable the content detection checkbox.
+        self.continue_on_error.setEnabled(enabled)
+        # Enable or disable the continue past errors checkbox.
+        self.background_mode.setEnabled(enabled)
+        # Enable or disable the background mode checkbox.
+        self.organize_by_combo.setEnabled(enabled)
+        # Enable or disable the organization scheme drop-down.
+        self.output_combo.setEnabled(enabled)
+        # Enable or disable the output mode drop-down.
+        self.durable_moves.setEnabled(enabled)
+        # Enable or disable the fsync checkbox.
+        self.compression_spinbox.setEnabled(enabled and self.create_backups.isChecked())
+        # Enable or disable the backup compression level.
+        self.backup_format_combo.setEnabled(enabled and self.create_backups.isChecked())
+        # Enable or disable the backup format drop-down.
+        self.backup_target_edit.setEnabled(enabled)
+        # Enable or disable the backup destination.
+        self.verify_backups.setEnabled(enabled and self.create_backups.isChecked())
+        # Enable or disable the backup verification checkbox.
+        self.shards_spinbox.setEnabled(enabled)
+        # Enable or disable the process count.
+        self.parallel_spinbox.setEnabled(enabled)
+        # Enable or disable the concurrency bound.
+        self.memory_spinbox.setEnabled(enabled)
+        # Enable or disable the memory budget.
+        self.pack_size_spinbox.setEnabled(enabled)
+        self.pack_age_spinbox.setEnabled(enabled)
+        # Enable or disable the packing thresholds.
+        self.exclude_edit.setEnabled(enabled)
+        # Enable or disable the exclude patterns.
+        self.include_edit.setEnabled(enabled)
+        # Enable or disable the include patterns.
+        self.use_exif_date.setEnabled(enabled and self.organize_by_combo.currentData() == "date")
+        # Enable or disable the EXIF checkbox, which only applies in date mode.
+        self.max_ops_spinbox.setEnabled(enabled and self.background_mode.isChecked())
+        # Enable or disable the limit spin boxes, which only apply in background mode.
+        self.max_mbps_spinbox.setEnabled(enabled and self.background_mode.isChecked())
+        #
         self.menuBar().setEnabled(enabled)
         # Enable or disable the menu bar.
         self.clear_btn.setText("Cancel" if not enabled else "🗑️ Clear")
@@ -1218,6 +7505,47 @@ class FileOrganizerGUI(QMainWindow):
         # Load the state of the backup checkbox.
         self.min_files_spinbox.setValue(self.settings.value("minFiles", 2, type=int))
         # Load the value of the minimum files spin box.
+        self.detect_content.setChecked(self.settings.value("detectContent", False, type=bool))
+        # Load the state of the content detection checkbox.
+        self.continue_on_error.setChecked(self.settings.value("continueOnError", True, type=bool))
+        # Load the state of the continue past errors checkbox.
+        self.background_mode.setChecked(self.settings.value("backgroundMode", False, type=bool))
+        # Load the state of the background mode checkbox.
+        self.max_ops_spinbox.setValue(self.settings.value("maxOpsPerSecond", 0, type=int))
+        # Load the files-per-second limit.
+        self.max_mbps_spinbox.setValue(self.settings.value("maxMBPerSecond", 0, type=int))
+        # Load the bandwidth limit.
+        organize_by_index = self.organize_by_combo.findData(self.settings.value("organizeBy", "type"))
+        # Find the saved organization scheme in the drop-down.
+        self.organize_by_combo.setCurrentIndex(max(0, organize_by_index))
+        # Select it, falling back to the first scheme.
+        self.use_exif_date.setChecked(self.settings.value("useExifDate", False, type=bool))
+        # Load the state of the EXIF checkbox.
+        self.output_combo.setCurrentIndex(max(0, self.output_combo.findData(self.settings.value("outputMode", None))))
+        # Load the output mode, falling back to moving files.
+        self.durable_moves.setChecked(self.settings.value("durableMoves", False, type=bool))
+        # Load the state of the fsync checkbox.
+        self.compression_spinbox.setValue(self.settings.value("backupCompression", 6, type=int))
+        # Load the backup compression level.
+        self.backup_format_combo.setCurrentIndex(max(0, self.backup_format_combo.findData(self.settings.value("backupFormat", "zip"))))
+        # Load the backup format, falling back to ZIP.
+        self.backup_target_edit.setText(self.settings.value("backupTarget", ""))
+        # Load the backup destination.
+        self.verify_backups.setChecked(self.settings.value("verifyBackups", True, type=bool))
+        # Load the state of the verification checkbox.
+        self.shards_spinbox.setValue(self.settings.value("shardCount", 1, type=int))
+        # Load the number of organizing processes.
+        self.parallel_spinbox.setValue(self.settings.value("maxParallel", 8, type=int))
+        # Load the concurrency bound.
+        self.memory_spinbox.setValue(self.settings.value("memoryBudget", 0, type=int))
+        # Load the memory budget.
+        self.pack_size_spinbox.setValue(self.settings.value("packMaxSize", 0, type=int))
+        self.pack_age_spinbox.setValue(self.settings.value("packMinAge", 30, type=int))
+        # Load the packing thresholds.
+        self.exclude_edit.setText(self.settings.value("excludePatterns", DEFAULT_EXCLUDE_PATTERNS))
+        # Load the exclude patterns.
+        self.include_edit.setText(self.settings.value("includePatterns", ""))
+        # Load the include patterns.
     #
     #
     def save_settings(self):
@@ -1229,6 +7557,45 @@ class FileOrganizerGUI(QMainWindow):
         # Save the state of the backup checkbox.
         self.settings.setValue("minFiles", self.min_files_spinbox.value())
         # Save the value of the minimum files spin box.
+        self.settings.setValue("detectContent", self.detect_content.isChecked())
+        # Save the state of the content detection checkbox.
+        self.settings.setValue("continueOnError", self.continue_on_error.isChecked())
+        # Save the state of the continue past errors checkbox.
+        self.settings.setValue("backgroundMode", self.background_mode.isChecked())
+        # Save the state of the background mode checkbox.
+        self.settings.setValue("maxOpsPerSecond", self.max_ops_spinbox.value())
+        # Save the files-per-second limit.
+        self.settings.setValue("maxMBPerSecond", self.max_mbps_spinbox.value())
+        # Save the bandwidth limit.
+        self.settings.setValue("organizeBy", self.organize_by_combo.currentData())
+        # Save the organization scheme.
+        self.settings.setValue("useExifDate", self.use_exif_date.isChecked())
+        # Save the state of the EXIF checkbox.
+        self.settings.setValue("outputMode", self.output_combo.currentData())
+        # Save the output mode.
+        self.settings.setValue("durableMoves", self.durable_moves.isChecked())
+        # Save the state of the fsync checkbox.
+        self.settings.setValue("backupCompression", self.compression_spinbox.value())
+        # Save the backup compression level.
+        self.settings.setValue("backupFormat", self.backup_format_combo.currentData())
+        # Save the backup format.
+        self.settings.setValue("backupTarget", self.backup_target_edit.text())
+        # Save the backup destination.
+        self.settings.setValue("verifyBackups", self.verify_backups.isChecked())
+        # Save the state of the verification checkbox.
+        self.settings.setValue("shardCount", self.shards_spinbox.value())
+        # Save the number of organizing processes.
+        self.settings.setValue("maxParallel", self.parallel_spinbox.value())
+        # Save the concurrency bound.
+        self.settings.setValue("memoryBudget", self.memory_spinbox.value())
+        # Save the memory budget.
+        self.settings.setValue("packMaxSize", self.pack_size_spinbox.value())
+        self.settings.setValue("packMinAge", self.pack_age_spinbox.value())
+        # Save the packing thresholds.
+        self.settings.setValue("excludePatterns", self.exclude_edit.text())
+        # Save the exclude patterns.
+        self.settings.setValue("includePatterns", self.include_edit.text())
+        # Save the include patterns.
     #
     #
     def closeEvent(self, event):
@@ -1244,6 +7611,290 @@ class FileOrganizerGUI(QMainWindow):
             # Wait for the thread to finish before the application closes.
         super().closeEvent(event)
         # Call the parent class's close event method.
+def run_benchmark_ordering(arguments):
+    # Time moves in scan order and optimized order.
+    #
+    print("\n".join(benchmark_move_ordering(arguments.files, directory=arguments.dir, copy_to=arguments.copy_to)))
+    return 0
+#
+#
+def run_benchmark_faults(arguments):
+    # Organize a generated folder under injected latency and errors.
+    #
+    print("\n".join(benchmark_faults(arguments.files, arguments.latency, arguments.fault, arguments.seed,
+                                     arguments.parallel, arguments.with_backup, arguments.retry_delay)))
+    return 0
+#
+#
+def run_backup_command(arguments):
+    # Back up a folder without the GUI.
+    #
+    policy = CompressionPolicy(level=arguments.level)
+    report = create_backup_archive(arguments.source, policy, arguments.format, arguments.output)
+    print(report.summary(policy), file=sys.stderr)
+    # Report on stderr, since stdout may be carrying the archive.
+    problems = verify_backup(report) if arguments.verify else []
+    # Optionally read the archive back and check every member.
+    print("\n".join(problems), file=sys.stderr)
+    return 1 if problems else 0
+#
+#
+def run_restore_command(arguments):
+    # Restore one incremental backup run.
+    #
+    print(f"Restored {restore_backup_run(arguments.run, arguments.destination)} file(s) to {arguments.destination}")
+    return 0
+#
+#
+def run_engine_headless(engine):
+    # Run an engine in this thread, printing its messages and error report.
+    # Returns the exit status.
+    #
+    engine.finished.connect(lambda message, count: print(message))
+    engine.error_occurred.connect(lambda message: print(message, file=sys.stderr))
+    engine.run()
+    if engine.error_report:
+        print(format_error_report(engine.error_report), file=sys.stderr)
+        # List the files that stayed where they were.
+    return 1 if engine.error_report else 0
+#
+#
+def run_flatten_command(arguments):
+    # Undo an organization without the GUI.
+    #
+    return run_engine_headless(OrganizerEngine(arguments.folder, max_parallel=arguments.parallel, flatten=True))
+#
+#
+def run_coordinate_command(arguments):
+    # Share folders out between worker processes.
+    #
+    host, _, port = arguments.listen.rpartition(":")
+    token = os.environ.get("ORGANIZER_TOKEN") or secrets.token_hex(16)
+    # Without a shared token, only the workers started here can join.
+    options = {"min_files_count": arguments.min_files, "max_parallel": arguments.parallel}
+    log = lambda message: print(message, file=sys.stderr)
+    coordinator = OrganizeCoordinator(arguments.roots, options, (host or "127.0.0.1", int(port or 0)), token, log=log)
+    log(f"Coordinator listening on {coordinator.address[0]}:{coordinator.address[1]}")
+    address = f"{coordinator.address[0]}:{coordinator.address[1]}"
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", address],
+                                env=dict(os.environ, ORGANIZER_TOKEN=token))
+               for _ in range(arguments.workers)]
+    results = coordinator.serve(lambda progress: log(format_distributed_progress(progress)))
+    for worker in workers:
+        worker.wait()
+    for root, result in sorted(results.items()):
+        print(f"{root}: {result.get('message') or result.get('error')}")
+        if result.get("errors"):
+            print(format_error_report(result["errors"]), file=sys.stderr)
+    return 1 if any(result["type"] == "failed" or result.get("errors") for result in results.values()) else 0
+#
+#
+def run_worker_command(arguments):
+    # Organize folders for a coordinator.
+    #
+    host, _, port = arguments.address.rpartition(":")
+    run_distributed_worker((host, int(port)), os.environ.get("ORGANIZER_TOKEN", ""))
+    return 0
+#
+#
+def run_upload_command(arguments):
+    # Organize a folder into an S3-compatible bucket.
+    #
+    store = ObjectStoreDestination(
+        arguments.endpoint, arguments.bucket, os.environ.get("AWS_ACCESS_KEY_ID", ""),
+        os.environ.get("AWS_SECRET_ACCESS_KEY", ""), os.environ.get("AWS_REGION", "us-east-1"),
+        arguments.prefix, arguments.part_size * 1024 * 1024, state_dir=arguments.state_dir)
+    # Unfinished multipart uploads are resumed from the state folder.
+    engine = OrganizerEngine(arguments.folder, arguments.min_files, max_parallel=arguments.parallel, object_store=store)
+    status = run_engine_headless(engine)
+    store.pool.close()
+    print(f"{store.pool.opened} connection(s) used.", file=sys.stderr)
+    return status
+#
+#
+def run_serve_object_store_command(arguments):
+    # Serve a folder as a local S3 stand-in until interrupted.
+    #
+    server = serve_object_store(arguments.root, arguments.listen, os.environ.get("AWS_ACCESS_KEY_ID", "local"),
+                                os.environ.get("AWS_SECRET_ACCESS_KEY", "local-secret"))
+    print(f"Object store at http://{server.server_address[0]}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+#
+#
+def run_pack_command(arguments):
+    # Pack the small files of an organized folder.
+    #
+    packed_files, packed_bytes, errors = pack_small_files(
+        arguments.folder, arguments.pack_max_size * 1024, arguments.pack_min_age * 86400,
+        on_status=lambda message: print(message, file=sys.stderr))
+    # Sizes are in kilobytes and ages in days.
+    print(f"Packed {packed_files} file(s) ({format_size(packed_bytes)}).")
+    if errors:
+        print(format_error_report(errors), file=sys.stderr)
+    return 1 if errors else 0
+#
+#
+def run_list_pack_command(arguments):
+    # List the members of a folder's pack.
+    #
+    pack = SmallFilePack(arguments.folder)
+    for name, entry in sorted(pack.members.items()):
+        modified = datetime.fromtimestamp(entry["mtime_ns"] / 1e9).strftime("%Y-%m-%d %H:%M")
+        print(f"{entry['size']:>12}  {modified}  {name}")
+    return 0
+#
+#
+def run_extract_pack_command(arguments):
+    # Read single members back, into a folder or (with --output -) to standard output.
+    #
+    pack = SmallFilePack(arguments.folder)
+    for name in arguments.names:
+        if arguments.output == "-":
+            sys.stdout.buffer.write(pack.read(name))
+        else:
+            print(f"Extracted {pack.extract(name, arguments.output)}", file=sys.stderr)
+    return 0
+#
+#
+def run_scheduler_command(arguments):
+    # Organize folders headless, on their schedules or each once.
+    #
+    options = {"min_files_count": arguments.min_files, "memory_budget": arguments.memory_budget * 1024 * 1024,
+               "pack_max_size": arguments.pack_max_size * 1024, "pack_min_age": arguments.pack_min_age * 86400}
+    # The memory budget is in megabytes; past it, each run's plan spills to disk.
+    # With a pack size (KB), each run then packs small files older than the pack age (days).
+    if arguments.once:
+        jobs = [ScheduledJob(folder, "@daily", options) for folder in arguments.folders]
+    elif len(arguments.jobs) % 2:
+        raise SystemExit("schedule: expected pairs of a cron expression and a folder")
+    else:
+        jobs = [ScheduledJob(folder, schedule, options)
+                for schedule, folder in zip(arguments.jobs[::2], arguments.jobs[1::2])]
+    if arguments.metrics_port:
+        serve_metrics(arguments.metrics_port)
+        # Prometheus can scrape http://127.0.0.1:<port>/metrics while the scheduler runs.
+    scheduler = OrganizerScheduler(jobs, state_dir=arguments.state_dir, metrics_textfile=arguments.metrics_textfile)
+    if arguments.once:
+        scheduler.run_once()
+        return 0
+    try:
+        scheduler.serve_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+#
+#
+def build_argument_parser():
+    # The command line: without a command the GUI starts; each command runs
+    # one headless mode (see the README for examples).
+    #
+    parser = argparse.ArgumentParser(prog="Main(ui).py", description="Organize files by type into subfolders.")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the concurrency controllers' decisions after each GUI run")
+    parser.set_defaults(command=None)
+    commands = parser.add_subparsers(title="commands", metavar="COMMAND")
+    state_dir = os.path.join(os.path.expanduser("~"), ".file-organizer")
+    # Where the scan cache, lock files and upload state live by default.
+    #
+    command = commands.add_parser("benchmark-ordering", help="time moves in scan order and optimized order")
+    command.add_argument("--files", type=int, default=2000)
+    command.add_argument("--dir", help="where to create the test folder (default: the temporary folder)")
+    command.add_argument("--copy-to", help="a folder on another disk, to time copies as well")
+    command.set_defaults(command=run_benchmark_ordering)
+    #
+    command = commands.add_parser("benchmark-faults", help="organize a generated folder under injected faults")
+    command.add_argument("--files", type=int, default=2000)
+    command.add_argument("--latency", type=parse_latency, default={}, help="e.g. rename=5,stat=1 (milliseconds)")
+    command.add_argument("--fault", type=parse_fault, action="append", default=[],
+                         help="operation:ERRNO:probability[:repeat], e.g. rename:EBUSY:0.1:2")
+    command.add_argument("--seed", type=int, default=1)
+    command.add_argument("--parallel", type=int, default=8)
+    command.add_argument("--with-backup", action="store_true")
+    command.add_argument("--retry-delay", type=float, default=0.25)
+    command.set_defaults(command=run_benchmark_faults)
+    #
+    command = commands.add_parser("backup", help="back up a file or folder")
+    command.add_argument("source")
+    command.add_argument("--format", default="zip", choices=sorted(ARCHIVE_FORMATS) + ["incremental"])
+    command.add_argument("--output", help="a file, a folder, '-' for standard output or '| command'")
+    command.add_argument("--level", type=int, default=6)
+    command.add_argument("--verify", action="store_true", help="read the backup back and check every member")
+    command.set_defaults(command=run_backup_command)
+    #
+    command = commands.add_parser("restore", help="restore one incremental backup run")
+    command.add_argument("run", help="<store>/runs/<run>.json")
+    command.add_argument("destination")
+    command.set_defaults(command=run_restore_command)
+    #
+    command = commands.add_parser("flatten", help="move organized files back into their parent folder")
+    command.add_argument("folder")
+    command.add_argument("--parallel", type=int, default=8)
+    command.set_defaults(command=run_flatten_command)
+    #
+    command = commands.add_parser("coordinate", help="share folders out between worker processes")
+    command.add_argument("roots", nargs="+", metavar="folder")
+    command.add_argument("--listen", default="127.0.0.1:0")
+    command.add_argument("--workers", type=int, default=0, help="how many local workers to start")
+    command.add_argument("--min-files", type=int, default=1)
+    command.add_argument("--parallel", type=int, default=8)
+    command.set_defaults(command=run_coordinate_command)
+    #
+    command = commands.add_parser("worker", help="organize folders for a coordinator (with ORGANIZER_TOKEN set)")
+    command.add_argument("address", help="host:port")
+    command.set_defaults(command=run_worker_command)
+    #
+    command = commands.add_parser("upload", help="organize a folder into an S3-compatible bucket")
+    command.add_argument("folder")
+    command.add_argument("--endpoint", required=True)
+    command.add_argument("--bucket", required=True)
+    command.add_argument("--prefix", default="")
+    command.add_argument("--part-size", type=int, default=8, help="megabytes")
+    command.add_argument("--state-dir", default=state_dir)
+    command.add_argument("--min-files", type=int, default=1)
+    command.add_argument("--parallel", type=int, default=4)
+    command.set_defaults(command=run_upload_command)
+    #
+    command = commands.add_parser("serve-object-store", help="serve a folder as a local S3 stand-in")
+    command.add_argument("root")
+    command.add_argument("--listen", default="127.0.0.1:9000")
+    command.set_defaults(command=run_serve_object_store_command)
+    #
+    command = commands.add_parser("pack", help="pack the small files of an organized folder")
+    command.add_argument("folder")
+    command.add_argument("--pack-max-size", type=int, default=64, help="kilobytes")
+    command.add_argument("--pack-min-age", type=float, default=30, help="days")
+    command.set_defaults(command=run_pack_command)
+    #
+    command = commands.add_parser("list-pack", help="list the members of a folder's pack")
+    command.add_argument("folder")
+    command.set_defaults(command=run_list_pack_command)
+    #
+    command = commands.add_parser("extract-pack", help="read single files back from a folder's pack")
+    command.add_argument("folder")
+    command.add_argument("names", nargs="+", metavar="name")
+    command.add_argument("--output", help="a folder, or '-' for standard output")
+    command.set_defaults(command=run_extract_pack_command)
+    #
+    scheduling = argparse.ArgumentParser(add_help=False)
+    # The options shared by scheduled and one-off runs.
+    scheduling.add_argument("--min-files", type=int, default=1)
+    scheduling.add_argument("--memory-budget", type=int, default=0, help="megabytes (0 means unlimited)")
+    scheduling.add_argument("--pack-max-size", type=int, default=0, help="kilobytes (0 turns packing off)")
+    scheduling.add_argument("--pack-min-age", type=float, default=30, help="days")
+    scheduling.add_argument("--state-dir", default=state_dir)
+    scheduling.add_argument("--metrics-port", help="port or host:port to serve Prometheus metrics on")
+    scheduling.add_argument("--metrics-textfile", help="a file to write the metrics to after each run")
+    command = commands.add_parser("schedule", parents=[scheduling], help="organize folders on cron schedules")
+    command.add_argument("jobs", nargs="+", metavar="CRON FOLDER", help="pairs of a cron expression and a folder")
+    command.set_defaults(command=run_scheduler_command, once=False)
+    command = commands.add_parser("run-once", parents=[scheduling], help="organize each folder once")
+    command.add_argument("folders", nargs="+", metavar="folder")
+    command.set_defaults(command=run_scheduler_command, once=True)
+    return parser
 #
 #
 #
@@ -1253,6 +7904,12 @@ class FileOrganizerGUI(QMainWindow):
 if __name__ == "__main__":
     # This block of code runs only when the script is executed directly.
     #
+    multiprocessing.freeze_support()
+    # Lets frozen Windows builds start the organizing processes.
+    arguments = build_argument_parser().parse_args()
+    if arguments.command:
+        sys.exit(arguments.command(arguments))
+        # A command runs headless and never loads Qt.
     app = QApplication(sys.argv)
     # Create the QApplication instance. This is a required step for all PyQt5 applications.
     organizer_gui = FileOrganizerGUI()
@@ -1260,4 +7917,4 @@ if __name__ == "__main__":
     organizer_gui.show()
     # Show the main window on the screen.
     sys.exit(app.exec_())
-    # Start the application's event loop and exit when it's done.
\ No newline at end of file
+    # Start the application's event loop and exit when it's done.
@@ -0,0 +1,22 @@
+# Shared fixtures for the tests. The application is a single script whose
+# name is not a valid module name, so it is loaded from its path.
+#
+import importlib.util
+import os
+import sys
+
+import pytest
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Main(ui).py")
+
+
+@pytest.fixture(scope="session")
+def organizer():
+    # The application module, imported without the GUI (and without PyQt5).
+    spec = importlib.util.spec_from_file_location("file_organizer", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    # Shard processes and pickled objects look the module up by name.
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,138 @@
+# Retry and error-report behaviour of the engine under injected faults.
+#
+import errno
+import os
+
+import pytest
+
+
+def make_files(folder, count, extension="txt", size=2048):
+    # Create 'count' files of known content and return {name: content}.
+    contents = {}
+    for index in range(count):
+        name = f"file{index}.{extension}"
+        contents[name] = bytes([index % 256]) * size
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(contents[name])
+    return contents
+
+
+def organize(organizer, folder, faults=(), continue_on_error=True, **options):
+    # Run the engine on 'folder' under the given faults; returns the engine,
+    # the file system wrapper and the messages it reported.
+    messages = []
+    policy = organizer.RetryPolicy(base_delay=0.001, continue_on_error=continue_on_error)
+    with organizer.FaultyFileSystem(str(folder), seed=3, faults=faults) as file_system:
+        engine = organizer.OrganizerEngine(str(folder), retry_policy=policy, **options)
+        engine.finished.connect(lambda message, count: messages.append(message))
+        engine.error_occurred.connect(messages.append)
+        engine.run()
+    return engine, file_system, messages
+
+
+def locate(folder, contents):
+    # Map every expected file to where it ended up ('moved' or 'left'),
+    # checking that nothing was lost, duplicated or damaged on the way.
+    places = {}
+    for directory, _, filenames in os.walk(folder):
+        for filename in filenames:
+            assert filename in contents, f"unexpected file {filename} in {directory}"
+            assert filename not in places, f"{filename} exists twice"
+            with open(os.path.join(directory, filename), "rb") as f:
+                assert f.read() == contents[filename], f"{filename} was damaged"
+            places[filename] = "left" if directory == str(folder) else "moved"
+    assert set(places) == set(contents), "files were lost"
+    return places
+
+
+def test_transient_rename_errors_are_retried(organizer, tmp_path):
+    contents = make_files(tmp_path, 40)
+    engine, file_system, messages = organize(organizer, tmp_path, [("rename", errno.EBUSY, 0.3, 2)])
+    assert file_system.injected[("rename", "EBUSY")] > 0
+    assert engine.error_report == []
+    assert set(locate(tmp_path, contents).values()) == {"moved"}
+    assert messages[-1] == "Successfully organized 40 files!"
+
+
+def test_permanent_errors_are_reported_and_files_stay(organizer, tmp_path):
+    contents = make_files(tmp_path, 40)
+    engine, file_system, _ = organize(organizer, tmp_path, [("rename", errno.EIO, 0.2, None)])
+    places = locate(tmp_path, contents)
+    reported = {os.path.basename(entry["path"]): entry for entry in engine.error_report}
+    assert reported and len(reported) == file_system.injected[("rename", "EIO")]
+    assert {name for name, place in places.items() if place == "left"} == set(reported)
+    for entry in reported.values():
+        assert (entry["operation"], entry["errno"], entry["attempts"]) == ("move", errno.EIO, 1)
+        # A permanent error is not retried.
+
+
+def test_transient_errors_give_up_after_the_last_attempt(organizer, tmp_path):
+    contents = make_files(tmp_path, 20)
+    engine, _, _ = organize(organizer, tmp_path, [("rename", errno.EBUSY, 0.2, None)])
+    places = locate(tmp_path, contents)
+    assert engine.error_report
+    for entry in engine.error_report:
+        assert entry["errno"] == errno.EBUSY
+        assert entry["attempts"] == organizer.RetryPolicy().max_attempts
+        assert places[os.path.basename(entry["path"])] == "left"
+
+
+def test_stat_errors_are_reported_and_the_scan_continues(organizer, tmp_path):
+    contents = make_files(tmp_path, 40)
+    engine, file_system, messages = organize(organizer, tmp_path, [("stat", errno.EIO, 0.1, None)])
+    places = locate(tmp_path, contents)
+    assert file_system.injected[("stat", "EIO")] > 0
+    assert engine.error_report
+    assert {entry["operation"] for entry in engine.error_report} == {"stat"}
+    assert {name for name, place in places.items() if place == "left"} == \
+        {os.path.basename(entry["path"]) for entry in engine.error_report}
+    assert "moved" in places.values()
+    assert messages[-1].startswith("Successfully organized")
+
+
+def test_failed_copies_leave_no_partial_files(organizer, tmp_path):
+    # EXDEV turns every move into a chunked copy; ENOSPC cuts some copies short.
+    contents = make_files(tmp_path, 30, size=64 * 1024)
+    engine, file_system, _ = organize(organizer, tmp_path,
+                                      [("rename", errno.EXDEV, 1.0, None), ("write", errno.ENOSPC, 0.2, None)])
+    places = locate(tmp_path, contents)
+    # No '.organizer-partial' copy may be left behind (locate rejects unknown files).
+    assert file_system.injected[("write", "ENOSPC")] > 0
+    assert {name for name, place in places.items() if place == "left"} == \
+        {os.path.basename(entry["path"]) for entry in engine.error_report}
+    assert {entry["errno"] for entry in engine.error_report} == {errno.ENOSPC}
+
+
+def test_a_source_that_cannot_be_removed_is_not_copied_twice(organizer, tmp_path, monkeypatch):
+    contents = make_files(tmp_path, 3, extension="pdf")
+    source = str(tmp_path / "file0.pdf")
+    real_remove = os.remove
+    failures = []
+
+    def remove(path):
+        # The first two attempts to delete one source after its copy fail.
+        if path == source and len(failures) < 2:
+            failures.append(path)
+            raise OSError(errno.EBUSY, "Device or resource busy", path)
+        real_remove(path)
+
+    monkeypatch.setattr(os, "remove", remove)
+    engine, _, _ = organize(organizer, tmp_path, [("rename", errno.EXDEV, 1.0, None)])
+    assert len(failures) == 2
+    assert engine.error_report == []
+    assert sorted(os.listdir(tmp_path / "PDF Files")) == sorted(contents)
+    locate(tmp_path, contents)
+
+
+def test_without_continue_on_error_the_run_stops(organizer, tmp_path):
+    contents = make_files(tmp_path, 40)
+    engine, _, messages = organize(organizer, tmp_path, [("rename", errno.EIO, 0.2, None)], continue_on_error=False)
+    assert any(message.startswith("Failed to move") for message in messages)
+    places = locate(tmp_path, contents)
+    assert "left" in places.values()
+
+
+@pytest.mark.parametrize("code", [errno.EBUSY, errno.ESTALE, errno.ETIMEDOUT])
+def test_transient_errnos(organizer, code):
+    assert organizer.RetryPolicy.is_transient(OSError(code, os.strerror(code)))
+    assert not organizer.RetryPolicy.is_transient(OSError(errno.EIO, os.strerror(errno.EIO)))